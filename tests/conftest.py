@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+import vdbbench.datasets
+from vdbbench.datasets import Dataset
+from vdbbench.distance import DistanceMetric
+
+
+@pytest.fixture
+def dataset(monkeypatch) -> Dataset:
+    """A small Euclidean dataset registered in DATASETS as "test"."""
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(1000, 8)).astype(np.float32)
+    test = rng.normal(size=(500, 8)).astype(np.float32)
+    metric = DistanceMetric.Euclidean
+    dists = metric.many_to_many(test, train)
+    neighbors = np.argsort(dists, axis=-1, kind="stable")[:, :100]
+    distances = np.take_along_axis(dists, neighbors, axis=-1)
+    dataset = Dataset(metric, train, test, distances, neighbors)
+    monkeypatch.setattr(vdbbench.datasets, "DATASETS", {"test": lambda: dataset})
+    monkeypatch.setattr(vdbbench.datasets, "_loaded_datasets", {})
+    return dataset
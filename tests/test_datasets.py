@@ -0,0 +1,151 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+import vdbbench.datasets
+import vdbbench.groundtruth
+from vdbbench.datasets import download_file, load_dataset, load_from_bigann
+from vdbbench.distance import DistanceMetric
+
+CONTENT = bytes(range(256)) * 64
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    files: dict[str, bytes] = {}
+    # How range requests are answered: "range" as requested, "wrong_range" from the start of the file
+    # regardless of the requested range, or "ignore" with the whole file
+    mode = "range"
+    ranges: list[str | None] = []
+
+    def do_GET(self):
+        content = self.files.get(self.path)
+        if content is None:
+            self._send(404, b"", {})
+            return
+        requested = self.headers.get("Range")
+        type(self).ranges.append(requested)
+        if requested is None or self.mode == "ignore":
+            self._send(200, content, {})
+            return
+        first, _, last = requested.removeprefix("bytes=").partition("-")
+        first = 0 if self.mode == "wrong_range" else int(first)
+        last = int(last) if last else len(content) - 1
+        self._send(
+            206,
+            content[first : last + 1],
+            {"Content-Range": f"bytes {first}-{last}/{len(content)}"},
+        )
+
+    def _send(self, status: int, body: bytes, headers: dict):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        pass
+
+
+@pytest.fixture
+def url(monkeypatch):
+    monkeypatch.setattr(FileHandler, "files", {"/file": CONTENT})
+    monkeypatch.setattr(FileHandler, "mode", "range")
+    monkeypatch.setattr(FileHandler, "ranges", [])
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/file"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_verifies_checksum(url, tmp_path):
+    path = tmp_path / "file"
+    download_file(url, path, hashlib.sha256(CONTENT).hexdigest())
+    assert path.read_bytes() == CONTENT
+
+
+def test_download_rejects_checksum_mismatch(url, tmp_path):
+    path = tmp_path / "file"
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        download_file(url, path, hashlib.sha256(b"other").hexdigest())
+    assert not path.exists()
+    assert not (tmp_path / "file.part").exists()
+
+
+def test_download_resumes_part_file(url, tmp_path):
+    path = tmp_path / "file"
+    (tmp_path / "file.part").write_bytes(CONTENT[:1000])
+    download_file(url, path, hashlib.sha256(CONTENT).hexdigest())
+    assert path.read_bytes() == CONTENT
+    assert FileHandler.ranges == ["bytes=1000-"]
+
+
+@pytest.mark.parametrize("mode", ["wrong_range", "ignore"])
+def test_download_restarts_when_range_is_not_honored(url, tmp_path, mode):
+    FileHandler.mode = mode
+    path = tmp_path / "file"
+    (tmp_path / "file.part").write_bytes(CONTENT[:1000])
+    download_file(url, path, hashlib.sha256(CONTENT).hexdigest())
+    assert path.read_bytes() == CONTENT
+
+
+def test_download_prefix(url, tmp_path):
+    path = tmp_path / "file"
+    (tmp_path / "file.part").write_bytes(CONTENT[:10])
+    download_file(url, path, size=100)
+    assert path.read_bytes() == CONTENT[:100]
+    assert FileHandler.ranges == ["bytes=10-99"]
+
+
+def test_bigann_subset_computes_ground_truth_once(url, tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(1000, 4)).astype(np.float32)
+    test = rng.normal(size=(20, 4)).astype(np.float32)
+    for path, vectors in [("/base.fbin", train), ("/query.fbin", test)]:
+        FileHandler.files[path] = (
+            np.array(vectors.shape, dtype=np.uint32).tobytes() + vectors.tobytes()
+        )
+    # The published ground truth is not served, so downloading it would fail
+    root = url.rsplit("/", 1)[0]
+    monkeypatch.setattr(
+        vdbbench.datasets,
+        "DATASETS",
+        {
+            "bigann": lambda max_vectors=None, stride=1: load_from_bigann(
+                "bigann",
+                f"{root}/base.fbin",
+                f"{root}/query.fbin",
+                f"{root}/ground_truth.ibin",
+                DistanceMetric.Euclidean,
+                max_vectors=max_vectors,
+                stride=stride,
+            )
+        },
+    )
+    monkeypatch.setattr(vdbbench.datasets, "DOWNLOAD_DIR", tmp_path / "datasets")
+    monkeypatch.setattr(
+        vdbbench.datasets, "GROUND_TRUTH_DIR", tmp_path / "ground_truth"
+    )
+    computed = []
+    compute_ground_truth = vdbbench.groundtruth.compute_ground_truth
+    monkeypatch.setattr(
+        vdbbench.groundtruth,
+        "compute_ground_truth",
+        lambda *args, **kwargs: computed.append(args)
+        or compute_ground_truth(*args, **kwargs),
+    )
+    for _ in range(2):
+        monkeypatch.setattr(vdbbench.datasets, "_loaded_datasets", {})
+        dataset = load_dataset("bigann", max_vectors=200, dataset_args={"stride": 2})
+        np.testing.assert_array_equal(dataset.train, train[::2][:200])
+    assert len(computed) == 1
+    expected = np.argsort(
+        DistanceMetric.Euclidean.many_to_many(test, train[::2][:200]), axis=-1
+    )[:, :100]
+    np.testing.assert_array_equal(dataset.neighbors, expected)
@@ -0,0 +1,54 @@
+import numpy as np
+
+import vdbbench.datasets
+from vdbbench.datasets import Dataset, attribute_limit
+from vdbbench.distance import DistanceMetric
+from vdbbench.groundtruth import compute_ground_truth
+
+
+def brute_force(
+    train: np.ndarray, test: np.ndarray, metric: DistanceMetric, k: int
+) -> np.ndarray:
+    dists = metric.many_to_many(test, train)
+    return np.argsort(dists, axis=-1, kind="stable")[:, :k]
+
+
+def test_workers_merge_to_the_single_process_result():
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(3000, 8)).astype(np.float32)
+    test = rng.normal(size=(50, 8)).astype(np.float32)
+    metric = DistanceMetric.Euclidean
+    single = compute_ground_truth(train, test, metric, k=10, block_size=64, workers=1)
+    parallel = compute_ground_truth(train, test, metric, k=10, block_size=64, workers=3)
+    np.testing.assert_array_equal(parallel[1], single[1])
+    np.testing.assert_allclose(parallel[0], single[0])
+    np.testing.assert_array_equal(single[1], brute_force(train, test, metric, 10))
+
+
+def test_rows_search_only_the_given_train_vectors():
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(1000, 8)).astype(np.float32)
+    test = rng.normal(size=(50, 8)).astype(np.float32)
+    rows = np.flatnonzero(rng.random(1000) < 0.3)
+    _, neighbors = compute_ground_truth(
+        train, test, DistanceMetric.Angular, k=10, block_size=64, workers=1, rows=rows
+    )
+    expected = rows[brute_force(train[rows], test, DistanceMetric.Angular, 10)]
+    np.testing.assert_array_equal(neighbors, expected)
+
+
+def test_filtered_dataset_neighbors_match_the_filter(tmp_path, monkeypatch):
+    monkeypatch.setattr(vdbbench.datasets, "GROUND_TRUTH_DIR", tmp_path)
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(2000, 8)).astype(np.float32)
+    test = rng.normal(size=(50, 8)).astype(np.float32)
+    metric = DistanceMetric.Euclidean
+    distances, neighbors = compute_ground_truth(train, test, metric, k=10, workers=1)
+    dataset = Dataset(metric, train, test, distances, neighbors)
+    filtered = dataset.filtered(0.2)
+    matching = np.flatnonzero(dataset.attributes < attribute_limit(0.2))
+    np.testing.assert_array_equal(
+        filtered.neighbors, matching[brute_force(train[matching], test, metric, 10)]
+    )
+    assert filtered.train is dataset.train
+    assert dataset.filtered(0.2) is filtered
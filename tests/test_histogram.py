@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from vdbbench.histogram import Histogram
+
+
+def test_percentiles_have_bounded_relative_error():
+    values = np.random.default_rng(0).lognormal(-5, 1, size=10000)
+    histogram = Histogram(3)
+    histogram.record_many(values)
+    for percentile in [1, 25, 50, 90, 99, 99.9]:
+        expected = np.percentile(values, percentile, method="inverted_cdf")
+        assert histogram.percentile(percentile) == pytest.approx(expected, rel=1e-3)
+    assert histogram.count == 10000
+    assert histogram.mean == pytest.approx(np.mean(values))
+    assert histogram.std == pytest.approx(np.std(values))
+    assert (histogram.min, histogram.max) == (np.min(values), np.max(values))
+
+
+def test_merged_histograms_match_one_histogram_of_all_values():
+    rng = np.random.default_rng(0)
+    # Values of different ranges, so the merged histograms have different numbers of buckets
+    parts = [rng.uniform(0, 0.001, 1000), rng.lognormal(-3, 2, 1000), [5.0]]
+    merged = Histogram(3)
+    for part in parts:
+        histogram = Histogram(3)
+        histogram.record_many(part)
+        merged.merge(histogram)
+    combined = Histogram(3)
+    combined.record_many(np.concatenate(parts))
+    np.testing.assert_array_equal(merged.counts, combined.counts)
+    summary = merged.summary()
+    expected = combined.summary()
+    assert summary.pop("histogram")["counts"] == expected.pop("histogram")["counts"]
+    assert summary == pytest.approx(expected)
+
+
+def test_merge_rejects_different_precision():
+    with pytest.raises(ValueError, match="different precision"):
+        Histogram(3).merge(Histogram(2))
+
+
+def test_round_trips_through_dict():
+    histogram = Histogram(2)
+    histogram.record_many(np.random.default_rng(0).exponential(0.01, 1000))
+    restored = Histogram.from_dict(histogram.to_dict())
+    assert restored.summary() == histogram.summary()
+    empty = Histogram.from_dict(Histogram(2).to_dict())
+    assert empty.count == 0
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from vdbbench.benchmarks.local.hnsw import HNSWIndex
+from vdbbench.benchmarks.local.query_local_hnsw import QueryLocalHNSW
+from vdbbench.distance import DistanceMetric
+
+
+def test_search_finds_most_neighbors():
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(500, 8)).astype(np.float32)
+    queries = rng.normal(size=(20, 8)).astype(np.float32)
+    index = HNSWIndex(DistanceMetric.Euclidean, m=8, ef_construction=50)
+    index.build(train)
+    results = index.search(queries, 10, ef=50)
+    expected = np.argsort(
+        DistanceMetric.Euclidean.many_to_many(queries, train), axis=1
+    )[:, :10]
+    recall = np.mean([len(set(r) & set(e)) / 10 for r, e in zip(results, expected)])
+    assert recall > 0.9
+
+
+def test_search_rejects_ef_below_k():
+    index = HNSWIndex(DistanceMetric.Euclidean)
+    index.build(np.random.default_rng(0).normal(size=(50, 8)).astype(np.float32))
+    with pytest.raises(ValueError, match="ef"):
+        index.search(np.zeros((1, 8), dtype=np.float32), 10, ef=5)
+
+
+def test_search_raises_on_short_results():
+    index = HNSWIndex(DistanceMetric.Euclidean)
+    index.build(np.random.default_rng(0).normal(size=(5, 8)).astype(np.float32))
+    with pytest.raises(ValueError, match="Found only 5 of 10"):
+        index.search(np.zeros((1, 8), dtype=np.float32), 10, ef=10)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"k": 200},
+        {"*num_candidates": [50, 200], "k": 100},
+        {"k": 20, "~num_candidates": {"min": 10, "max": 200, "target_recall": 0.9}},
+    ],
+)
+def test_validate_config_rejects_num_candidates_below_k(query):
+    benchmark = QueryLocalHNSW(data={"dataset": "test"}, query=query)
+    with pytest.raises(ValueError, match="num_candidates"):
+        benchmark.validate_config()
+
+
+def test_validate_config_accepts_num_candidates_of_k():
+    QueryLocalHNSW(data={"dataset": "test"}, query={"k": 160}).validate_config()
@@ -0,0 +1,55 @@
+import json
+
+from vdbbench.benchmarks.elasticsearch.ingest_elasticsearch import IngestElasticsearch
+from vdbbench.benchmarks.elasticsearch.query_elasticsearch_standin import (
+    QueryElasticsearchStandin,
+)
+
+
+class IngestElasticsearchStandin(IngestElasticsearch, QueryElasticsearchStandin):
+    pass
+
+
+def run_ingest(group: dict, journal_path=None) -> dict:
+    benchmark = IngestElasticsearchStandin(
+        deploy={}, data={"dataset": "test", "m": 8}, group=group
+    )
+    benchmark.validate_config()
+    return benchmark.run(benchmark.deploy(), journal_path)["data"][0]
+
+
+def test_ingest_reports_load_and_replica_results(dataset):
+    result = run_ingest({"*replica_count": [0, 2]})
+    load_result = result["load_result"]
+    assert load_result["docs"] == 1000
+    assert load_result["bulk_requests"] >= 1
+    assert load_result["estimated_memory_bytes"] == 1000 * 4 * (8 + 2 * 8)
+    groups = result["groups"]
+    assert [g["queries"] for g in groups] == [[], []]
+    assert (
+        groups[1]["prepare_result"]["estimated_memory_bytes"]
+        == 3 * (load_result["estimated_memory_bytes"])
+    )
+
+
+def test_ingest_resumes_from_journal(dataset, tmp_path, monkeypatch):
+    journal_path = tmp_path / "journal.jsonl"
+    first = run_ingest({"*replica_count": [0, 2]}, journal_path)
+    lines = journal_path.read_text().splitlines()
+    assert len(lines) == 2
+    # Drop the last group configuration, as if the run was interrupted before it completed
+    journal_path.write_text(lines[0] + "\n")
+    loads = []
+    load_data_config = IngestElasticsearchStandin._load_data_config
+    monkeypatch.setattr(
+        IngestElasticsearchStandin,
+        "_load_data_config",
+        lambda self, data_config: loads.append(data_config)
+        or load_data_config(self, data_config),
+    )
+    resumed = run_ingest({"*replica_count": [0, 2]}, journal_path)
+    assert len(loads) == 1
+    assert resumed["groups"][0] == json.loads(json.dumps(first["groups"][0]))
+    loads.clear()
+    run_ingest({"*replica_count": [0, 2]}, journal_path)
+    assert not loads
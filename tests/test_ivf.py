@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from vdbbench.benchmarks.local.ivf import IVFFlatIndex
+from vdbbench.distance import DistanceMetric
+
+
+def build_index(metric: DistanceMetric) -> tuple[IVFFlatIndex, np.ndarray]:
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(2000, 8)).astype(np.float32)
+    index = IVFFlatIndex(metric, n_lists=32, kmeans_iterations=5)
+    index.build(train)
+    return index, train
+
+
+@pytest.mark.parametrize(
+    "metric",
+    [DistanceMetric.Euclidean, DistanceMetric.Angular, DistanceMetric.InnerProduct],
+)
+def test_probing_every_list_is_exact(metric):
+    index, train = build_index(metric)
+    queries = np.random.default_rng(1).normal(size=(50, 8)).astype(np.float32)
+    dists = metric.many_to_many(queries, train)
+    expected = np.argsort(dists, axis=1, kind="stable")[:, :10]
+    assert np.array_equal(index.search(queries, 10, nprobe=32), expected)
+
+
+def test_batch_matches_single_queries():
+    index, _ = build_index(DistanceMetric.Euclidean)
+    queries = np.random.default_rng(1).normal(size=(50, 8)).astype(np.float32)
+    batch = index.search(queries, 10, nprobe=2)
+    single = np.concatenate(
+        [index.search(q[np.newaxis], 10, nprobe=2) for q in queries]
+    )
+    assert np.array_equal(batch, single)
+
+
+def test_small_lists_probe_enough_lists_for_k():
+    index, _ = build_index(DistanceMetric.Euclidean)
+    queries = np.random.default_rng(1).normal(size=(20, 8)).astype(np.float32)
+    results = index.search(queries, 500, nprobe=1)
+    assert results.shape == (20, 500)
+    assert all(len(set(row)) == 500 for row in results.tolist())
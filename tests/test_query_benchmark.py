@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from vdbbench.benchmarks.test.query_simulated import QuerySimulated
+from vdbbench.histogram import Histogram
+
+
+def run_queries(query: dict, **kwargs) -> dict:
+    benchmark = QuerySimulated(
+        deploy={}, data={"dataset": "test"}, group={}, query=query
+    )
+    benchmark.validate_config()
+    result = benchmark.run(benchmark.deploy(), **kwargs)
+    return result["data"][0]["groups"][0]["queries"][0]
+
+
+def test_unsaturated_poisson_schedule_is_not_saturated(dataset):
+    # The realized rate of a finite Poisson schedule varies by more than SATURATION_TOLERANCE
+    for _ in range(10):
+        result = run_queries(
+            {
+                "k": 10,
+                "batch_size": 1,
+                "target_qps": 1000,
+                "arrival": "poisson",
+                "warmup": 0,
+                "latency_distribution": "constant",
+                "latency": 0.0005,
+                "concurrency": 4,
+            }
+        )
+        assert result["saturated"] is False
+
+
+def test_overloaded_schedule_is_saturated(dataset):
+    result = run_queries(
+        {
+            "k": 10,
+            "batch_size": 1,
+            "target_qps": 2000,
+            "warmup": 0,
+            "latency_distribution": "constant",
+            "latency": 0.005,
+        }
+    )
+    assert result["saturated"] is True
+
+
+def test_open_loop_latency_includes_queueing_delay(dataset):
+    # Batches sent late behind a slow server count the wait from their scheduled start
+    query = {
+        "k": 10,
+        "batch_size": 1,
+        "warmup": 0,
+        "latency_distribution": "constant",
+        "latency": 0.01,
+    }
+    open_loop = run_queries(query | {"target_qps": 200})
+    closed_loop = run_queries(query)
+    assert sum(open_loop["late"]) > 0
+    assert open_loop["latency"]["max"] > 0.4
+    assert closed_loop["latency"]["max"] < 0.1
+
+
+def test_writes_are_rejected_without_write(dataset):
+    benchmark = QuerySimulated(
+        deploy={}, data={"dataset": "test"}, group={}, query={"*write_qps": [100]}
+    )
+    with pytest.raises(ValueError, match="does not support writes"):
+        benchmark.validate_config()
+
+
+def test_process_scoring_matches_deferred_scoring(dataset):
+    query = {"k": 10, "warmup": 0, "latency": 0.0001, "recall": 0.8}
+    deferred = run_queries(query | {"scoring": "deferred"})
+    process = run_queries(query | {"scoring": "process"})
+    assert process["query_config"]["scoring_workers"] >= 1
+    assert process["recall"]["mean"] == pytest.approx(deferred["recall"]["mean"])
+
+
+def test_raw_samples_are_saved_per_round_beside_the_journal(dataset, tmp_path):
+    query = {"k": 10, "warmup": 0, "rounds": 2, "raw_samples": True}
+    result = run_queries(query, journal_path=tmp_path / "journal.jsonl")
+    paths = [Path(p) for p in result["raw_samples"]]
+    assert [p.parent for p in paths] == [tmp_path / "journal_samples"] * 2
+    assert [p.stem.rsplit("_", 1)[1] for p in paths] == ["0", "1"]
+    for path in paths:
+        with np.load(path) as samples:
+            assert len(samples["recall"]) == len(dataset.test)
+    # Runs of the same configuration have different run ids instead of overwriting each other
+    repeated = run_queries(query, samples_dir=tmp_path / "journal_samples")
+    assert not set(result["raw_samples"]) & set(repeated["raw_samples"])
+    assert len(list((tmp_path / "journal_samples").iterdir())) == 4
+
+
+def test_raw_samples_require_a_samples_dir(dataset):
+    with pytest.raises(ValueError, match="raw_samples"):
+        run_queries({"k": 10, "warmup": 0, "raw_samples": True})
+
+
+def test_ci_width_is_infinite_with_too_few_samples():
+    benchmark = QuerySimulated()
+    latency = Histogram(3)
+    assert benchmark._calc_ci_width(latency, 99) == np.inf
+    latency.record_many(np.full(50, 0.01))
+    assert benchmark._calc_ci_width(latency, 99) == np.inf
+    latency.record_many(np.random.default_rng(0).uniform(0.01, 0.02, 5000))
+    assert 0 < benchmark._calc_ci_width(latency, 99) < 0.1
@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import pytest
+
+from vdbbench.benchmarks.elasticsearch.query_elasticsearch import QueryElasticsearch
+from vdbbench.benchmarks.elasticsearch.query_elasticsearch_standin import (
+    QueryElasticsearchStandin,
+)
+
+
+def test_encoded_msearch_body_is_ndjson():
+    queries = np.random.default_rng(0).normal(size=(3, 4)).astype(np.float32)
+    body = QueryElasticsearch().encode_queries(queries, k=5, num_candidates=50)
+    assert body.endswith(b"\n")
+    lines = body.decode().splitlines()
+    assert len(lines) == 6
+    for i, query in enumerate(queries):
+        assert json.loads(lines[2 * i]) == {}
+        search = json.loads(lines[2 * i + 1])
+        assert search["size"] == 5
+        assert search["knn"]["k"] == 5
+        assert search["knn"]["num_candidates"] == 50
+        assert "filter" not in search["knn"]
+        np.testing.assert_array_equal(
+            np.array(search["knn"]["query_vector"], dtype=np.float32), query
+        )
+
+
+def test_encoded_msearch_body_filters_by_selectivity():
+    queries = np.zeros((1, 4), dtype=np.float32)
+    body = QueryElasticsearch().encode_queries(queries, selectivity=0.25)
+    search = json.loads(body.decode().splitlines()[1])
+    assert search["knn"]["filter"] == {"range": {"attribute": {"lt": 250}}}
+
+
+def test_writes_insert_held_back_vectors(dataset, tmp_path, monkeypatch):
+    monkeypatch.setattr("vdbbench.datasets.GROUND_TRUTH_DIR", tmp_path)
+    benchmark = QueryElasticsearchStandin(
+        deploy={},
+        data={"dataset": "test", "attributes": True, "write_holdout": 100},
+        query={"k": 10, "warmup": 0, "write_qps": 1000, "write_batch_size": 10},
+    )
+    benchmark.validate_config()
+    result = benchmark.run(benchmark.deploy())
+    (query_result,) = result["data"][0]["groups"][0]["queries"]
+    written = sum(query_result["writes"])
+    assert written > 0
+    index = benchmark.standin.indices[benchmark.INDEX_NAME]
+    ids = sorted(int(i) for i in index.documents)
+    assert ids == list(range(900 + min(written, 100)))
+    attributes = [index.documents[str(i)]["attribute"] for i in ids]
+    assert attributes == dataset.attributes[: len(ids)].tolist()
+
+
+def test_writes_need_held_back_vectors():
+    benchmark = QueryElasticsearchStandin(
+        data={"dataset": "test"}, query={"write_qps": 100}
+    )
+    with pytest.raises(ValueError, match="write_holdout"):
+        benchmark.validate_config()
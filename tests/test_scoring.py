@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from vdbbench.datasets import Dataset
+from vdbbench.distance import DistanceMetric
+from vdbbench.scoring import score_batch
+
+K = 10
+
+
+def make_dataset(metric: DistanceMetric) -> Dataset:
+    rng = np.random.default_rng(0)
+    if metric is DistanceMetric.Hamming:
+        train = rng.integers(0, 2, size=(500, 32)).astype(np.float32)
+        test = rng.integers(0, 2, size=(20, 32)).astype(np.float32)
+    else:
+        train = rng.normal(size=(500, 8)).astype(np.float32)
+        test = rng.normal(size=(20, 8)).astype(np.float32)
+    dists = metric.many_to_many(test, train)
+    neighbors = np.argsort(dists, axis=-1, kind="stable")[:, :K]
+    distances = np.take_along_axis(dists, neighbors, axis=-1)
+    return Dataset(metric, train, test, distances, neighbors)
+
+
+@pytest.mark.parametrize("metric", list(DistanceMetric))
+def test_exact_neighbors_score_perfectly(metric):
+    dataset = make_dataset(metric)
+    recall, relative_error, *_ = score_batch(dataset, 0, dataset.neighbors, K)
+    assert np.all(recall == 1)
+    assert np.allclose(relative_error, 0, atol=1e-5)
+
+
+@pytest.mark.parametrize("metric", list(DistanceMetric))
+def test_farthest_neighbor_lowers_recall(metric):
+    dataset = make_dataset(metric)
+    farthest = np.argmax(metric.many_to_many(dataset.test, dataset.train), axis=-1)
+    neighbor_ids = dataset.neighbors.copy()
+    neighbor_ids[:, -1] = farthest
+    recall, relative_error, *_ = score_batch(dataset, 0, neighbor_ids, K)
+    assert np.all(recall == (K - 1) / K)
+    assert np.all(relative_error > 0)
+
+
+@pytest.mark.parametrize("metric", list(DistanceMetric))
+def test_exact_neighbors_rank_perfectly(metric):
+    dataset = make_dataset(metric)
+    _, _, metrics = score_batch(dataset, 0, dataset.neighbors, K, recall_at=[1, 5])
+    for name in ["recall@1", "recall@5", "ndcg@1", "ndcg@5", "mrr"]:
+        assert np.all(metrics[name] == 1), name
+
+
+@pytest.mark.parametrize(
+    "metric", [m for m in DistanceMetric if m is not DistanceMetric.Hamming]
+)
+def test_reversed_neighbors_rank_lower(metric):
+    # Hamming distances tie too often for the order of the neighbors to matter
+    dataset = make_dataset(metric)
+    reversed_ids = dataset.neighbors[:, ::-1]
+    _, _, metrics = score_batch(dataset, 0, reversed_ids, K, recall_at=[5])
+    assert np.all(metrics["recall@5"] == 1)
+    assert np.all(metrics["ndcg@5"] < 1)
+    assert np.all(metrics["mrr"] <= 1 / 2)
@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+import pytest
+
+from vdbbench.benchmarks.elasticsearch.ingest import encode_bulk_payload
+from vdbbench.benchmarks.elasticsearch.query_elasticsearch import QueryElasticsearch
+from vdbbench.benchmarks.elasticsearch.standin import ElasticsearchStandin
+from vdbbench.datasets import attribute_limit
+from vdbbench.distance import DistanceMetric
+from vdbbench.groundtruth import compute_ground_truth
+
+
+@pytest.fixture
+def standin():
+    standin = ElasticsearchStandin()
+    yield standin
+    standin.server.server_close()
+
+
+def create_index(standin: ElasticsearchStandin, similarity: str, dims: int):
+    mappings = {
+        "properties": {
+            "id": {"type": "keyword"},
+            "vec": {"type": "dense_vector", "dims": dims, "similarity": similarity},
+        }
+    }
+    standin.handle("PUT", "/vdbbench", {}, json.dumps({"mappings": mappings}).encode())
+
+
+def search_ids(standin: ElasticsearchStandin, body: bytes) -> list[list[int]]:
+    response = standin.handle("POST", "/vdbbench/_msearch", {}, body)
+    return [
+        [int(hit["fields"]["id"][0]) for hit in r["hits"]["hits"]]
+        for r in response["responses"]
+    ]
+
+
+@pytest.mark.parametrize(
+    "similarity, metric",
+    [
+        ("l2_norm", DistanceMetric.Euclidean),
+        ("cosine", DistanceMetric.Angular),
+        ("max_inner_product", DistanceMetric.InnerProduct),
+    ],
+)
+def test_msearch_returns_exact_neighbors(standin, similarity, metric):
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(300, 8)).astype(np.float32)
+    test = rng.normal(size=(20, 8)).astype(np.float32)
+    create_index(standin, similarity, 8)
+    standin.handle(
+        "POST",
+        "/vdbbench/_bulk",
+        {"refresh": "true"},
+        encode_bulk_payload(train, range(300)),
+    )
+    body = QueryElasticsearch().encode_queries(test, k=10)
+    _, neighbors = compute_ground_truth(train, test, metric, k=10, workers=1)
+    assert search_ids(standin, body) == neighbors.tolist()
+
+
+@pytest.mark.parametrize("filter_type", ["range", "keyword"])
+def test_filtered_msearch_searches_matching_documents(standin, filter_type):
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(300, 8)).astype(np.float32)
+    test = rng.normal(size=(20, 8)).astype(np.float32)
+    attributes = rng.integers(0, 1000, size=300)
+    create_index(standin, "l2_norm", 8)
+    standin.handle(
+        "POST",
+        "/vdbbench/_bulk",
+        {"refresh": "true"},
+        encode_bulk_payload(train, range(300), attributes),
+    )
+    body = QueryElasticsearch().encode_queries(
+        test, k=10, filter_type=filter_type, selectivity=0.3
+    )
+    matching = np.flatnonzero(attributes < attribute_limit(0.3))
+    _, neighbors = compute_ground_truth(
+        train[matching], test, DistanceMetric.Euclidean, k=10, workers=1
+    )
+    assert search_ids(standin, body) == matching[neighbors].tolist()
+
+
+def test_bulk_updates_and_deletes_documents(standin):
+    rng = np.random.default_rng(0)
+    train = rng.normal(size=(10, 4)).astype(np.float32)
+    create_index(standin, "l2_norm", 4)
+    standin.handle("POST", "/vdbbench/_bulk", {}, encode_bulk_payload(train, range(10)))
+    assert standin.handle("GET", "/vdbbench/_count", {}, b"")["count"] == 0
+    response = standin.handle(
+        "POST",
+        "/vdbbench/_bulk",
+        {"refresh": "true"},
+        b'{"delete":{"_id":3}}\n'
+        + encode_bulk_payload(-train[:1], [0])
+        + b'{"delete":{"_id":42}}\n',
+    )
+    assert [next(iter(item.values()))["result"] for item in response["items"]] == [
+        "deleted",
+        "updated",
+        "not_found",
+    ]
+    assert standin.handle("GET", "/vdbbench/_count", {}, b"")["count"] == 9
+    body = QueryElasticsearch().encode_queries(-train[:1], k=1)
+    assert search_ids(standin, body) == [[0]]
@@ -10,7 +10,9 @@ import typer
 import yaml
 
 from vdbbench import benchmarks
-from vdbbench.runner import retry_execute_runner
+from vdbbench.benchmarks.benchmark import Benchmark
+from vdbbench.benchmarks.query_benchmark import QueryBenchmark
+from vdbbench.runner import get_journal_path, retry_execute_runner
 from vdbbench.terraform import destroy_all_terraform
 
 logger = logging.getLogger(__name__)
@@ -46,6 +48,20 @@ def run(
             readable=True,
         ),
     ] = None,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume",
+            help="Resume from the result journal left on the runner by an earlier run of the same configuration.",
+        ),
+    ] = False,
+    local: Annotated[
+        bool,
+        typer.Option(
+            "--local",
+            help="Run the benchmark in this process instead of on a runner instance, for benchmarks that need no cloud resources.",
+        ),
+    ] = False,
     args: Annotated[
         Optional[list[str]],
         typer.Argument(
@@ -79,23 +95,63 @@ def run(
                     current = current.setdefault(part, {})
                 current[key_parts[-1]] = yaml.unsafe_load(value)
     logger.info(f"Running benchmark for {benchmark_name}")
-    if not os.environ.get("TF_VAR_project"):
+    if not local and not os.environ.get("TF_VAR_project"):
         logger.error("Environment variables are not set. Run `. setup.sh` to set them.")
         return
     if benchmark_name in benchmarks.BENCHMARKS:
         benchmark = benchmarks.BENCHMARKS[benchmark_name](**config["config"])
         deploy_result = benchmark.deploy()
-        results = retry_execute_runner(benchmark_name, config, deploy_result)
+        output_file = get_output_file(benchmark_name)
+        if local:
+            results = run_local(
+                benchmark_name,
+                benchmark,
+                config,
+                deploy_result,
+                resume,
+                samples_dir=output_file.with_name(f"{output_file.stem}_samples"),
+            )
+            save_results(output_file, results)
+            return
+        results = retry_execute_runner(
+            benchmark_name,
+            config,
+            deploy_result,
+            samples_dir=output_file.with_name(f"{output_file.stem}_samples"),
+            journal_file=output_file.with_suffix(".jsonl"),
+            resume=resume,
+        )
         logger.info(results)
-        save_results(benchmark_name, results)
+        save_results(output_file, results)
     else:
         logger.error(f"Unknown benchmark: {benchmark_name}")
 
 
-def save_results(name: str, results: dict):
+def run_local(
+    name: str,
+    benchmark: Benchmark,
+    config: dict,
+    deploy_result: dict,
+    resume: bool,
+    samples_dir: Path | None = None,
+) -> dict:
+    journal_path = Path(get_journal_path(name, config))
+    if not resume:
+        journal_path.unlink(missing_ok=True)
+    if isinstance(benchmark, QueryBenchmark):
+        return benchmark.run(
+            deploy_result, journal_path=journal_path, samples_dir=samples_dir
+        )
+    return benchmark.run(deploy_result)
+
+
+def get_output_file(name: str) -> Path:
     output_path = Path("results")
     output_path.mkdir(exist_ok=True)
-    output_file = output_path / f"{name}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    return output_path / f"{name}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+
+
+def save_results(output_file: Path, results: dict):
     output_file.write_text(json.dumps(results, indent=2))
     logger.info(f"Results saved to {output_file}")
 
@@ -143,7 +199,14 @@ def run_bench(name: str, config_path: Path):
     config = json.loads(config_path.read_text())
     benchmark = benchmarks.BENCHMARKS[name](**config["config"])
     try:
-        result = benchmark.run(config["deploy_outputs"])
+        if isinstance(benchmark, QueryBenchmark) and config.get("journal_path"):
+            result = benchmark.run(
+                config["deploy_outputs"],
+                journal_path=Path(config["journal_path"]),
+                samples_dir=Path(config["samples_path"]),
+            )
+        else:
+            result = benchmark.run(config["deploy_outputs"])
     except Exception as e:
         result = {
             "status": "failure",
@@ -1,11 +1,19 @@
 from typing import Callable
 
 from vdbbench.benchmarks.benchmark import Benchmark
+from vdbbench.benchmarks.elasticsearch.ingest_elasticsearch import IngestElasticsearch
 from vdbbench.benchmarks.elasticsearch.load_dataset_elasticsearch import (
     LoadDatasetElasticsearch,
 )
 from vdbbench.benchmarks.elasticsearch.query_elasticsearch import QueryElasticsearch
+from vdbbench.benchmarks.elasticsearch.query_elasticsearch_standin import (
+    QueryElasticsearchStandin,
+)
 from vdbbench.benchmarks.elasticsearch.test_elasticsearch import TestElasticsearch
+from vdbbench.benchmarks.local.query_local_bruteforce import QueryLocalBruteforce
+from vdbbench.benchmarks.local.query_local_hnsw import QueryLocalHNSW
+from vdbbench.benchmarks.local.query_local_ivf import QueryLocalIVF
+from vdbbench.benchmarks.test.query_simulated import QuerySimulated
 from vdbbench.benchmarks.test.test_query import TestQuery
 from vdbbench.benchmarks.weaviate.query_weaviate_serverless import (
     QueryWeaviateServerless,
@@ -15,6 +23,12 @@ BENCHMARKS: dict[str, Callable[..., Benchmark]] = {
     "elasticsearch-test": TestElasticsearch,
     "elasticsearch-load": LoadDatasetElasticsearch,
     "elasticsearch-query": QueryElasticsearch,
+    "elasticsearch-ingest": IngestElasticsearch,
+    "elasticsearch-standin-query": QueryElasticsearchStandin,
     "weaviate-serverless-query": QueryWeaviateServerless,
     "test-query": TestQuery,
+    "simulated-query": QuerySimulated,
+    "local-bruteforce-query": QueryLocalBruteforce,
+    "local-ivf-query": QueryLocalIVF,
+    "local-hnsw-query": QueryLocalHNSW,
 }
@@ -9,14 +9,19 @@ def create_elasticsearch_client(
     """Creates an Elasticsearch client from the configuration.
 
     Args:
-        deploy_output: The output from the Terraform module for the Elasticsearch deployment.
+        deploy_output: The output from the Terraform module for the Elasticsearch deployment,
+            optionally with an elasticsearch_port other than 9200.
 
     Returns:
         An Elasticsearch client.
     """
     return Elasticsearch(
         hosts=[
-            {"host": host, "port": 9200, "scheme": "http"}
+            {
+                "host": host,
+                "port": deploy_output.get("elasticsearch_port", 9200),
+                "scheme": "http",
+            }
             for host in deploy_output["elasticsearch_instance_names"]
         ]
     )
@@ -0,0 +1,138 @@
+import logging
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from vdbbench.benchmarks.elasticsearch.common import create_elasticsearch_client
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def encode_bulk_payload(
+    vectors: np.ndarray, ids: Iterable[int], attributes: np.ndarray | None = None
+) -> bytes:
+    """Encodes vectors as a _bulk NDJSON payload of index actions for the given ids.
+
+    The actions do not name the index, which is given by the path of the _bulk request instead.
+    Values are written with the shortest representation that round-trips in the dtype of vectors,
+    which for float32 is about half the size of json.dumps of the float64 values.
+    With attributes given, the attribute of each vector is also written to the "attribute" field,
+    and as a string to the "attribute_keyword" field.
+    """
+    lines = []
+    ids = np.asarray(ids).tolist()
+    if attributes is None:
+        for i, vec in zip(ids, vectors.astype(str).tolist()):
+            lines.append(
+                b'{"index":{"_id":%d}}\n{"id":%d,"vec":[%s]}\n'
+                % (i, i, ",".join(vec).encode())
+            )
+    else:
+        for i, vec, a in zip(ids, vectors.astype(str).tolist(), attributes.tolist()):
+            lines.append(
+                b'{"index":{"_id":%d}}\n{"id":%d,"attribute":%d,"attribute_keyword":"%d","vec":[%s]}\n'
+                % (i, i, a, a, ",".join(vec).encode())
+            )
+    return b"".join(lines)
+
+
+def bulk_ingest(
+    deploy_output: dict,
+    index: str,
+    vectors: np.ndarray,
+    workers: int = 4,
+    chunk_bytes: int = BULK_CHUNK_BYTES,
+    attributes: np.ndarray | None = None,
+) -> dict:
+    """Indexes vectors with concurrent _bulk requests of about chunk_bytes each.
+
+    Each worker thread has its own client, and repeatedly takes the next chunk of vectors, encodes it
+    into a payload with encode_bulk_payload, and sends it, so encoding overlaps with the requests of the
+    other workers. The number of vectors per chunk is estimated from the encoded size of the first vector.
+
+    Args:
+        deploy_output: The output from the Terraform module for the Elasticsearch deployment.
+        index: The name of the index, which must exist.
+        vectors: The vectors to index, with ids from 0 in the "id" field and "vec" field.
+        workers: The number of worker threads.
+        chunk_bytes: The target size of each _bulk payload.
+        attributes: The attribute of each vector to index with it, if any.
+
+    Returns:
+        The ingest time in seconds, the number of documents and payload bytes, and the rates derived from them.
+
+    Raises:
+        ValueError: If workers is less than 1.
+        RuntimeError: If any document fails to be indexed.
+    """
+    if workers < 1:
+        raise ValueError("Expected at least 1 ingest worker")
+    n = vectors.shape[0]
+    first_payload = encode_bulk_payload(
+        vectors[:1], [0], None if attributes is None else attributes[:1]
+    )
+    rows_per_chunk = max(1, chunk_bytes // len(first_payload))
+    starts = iter(range(0, n, rows_per_chunk))
+    starts_lock = threading.Lock()
+    # Set when a worker fails, so that the others stop instead of loading the rest
+    failed = threading.Event()
+    progress = {"docs": 0, "bytes": 0, "requests": 0, "logged": 0}
+    progress_lock = threading.Lock()
+
+    def run_worker():
+        try:
+            load_chunks()
+        except Exception:
+            failed.set()
+            raise
+
+    def load_chunks():
+        es = create_elasticsearch_client(deploy_output).options(request_timeout=1000)
+        while not failed.is_set():
+            with starts_lock:
+                start = next(starts, None)
+            if start is None:
+                return
+            end = min(start + rows_per_chunk, n)
+            payload = encode_bulk_payload(
+                vectors[start:end],
+                range(start, end),
+                None if attributes is None else attributes[start:end],
+            )
+            response = es.bulk(
+                index=index, body=payload, filter_path=["errors", "items.*.error"]
+            )
+            if response["errors"]:
+                raise RuntimeError(f"Failed to index documents: {response['items'][0]}")
+            with progress_lock:
+                progress["docs"] += end - start
+                progress["bytes"] += len(payload)
+                progress["requests"] += 1
+                if progress["docs"] - progress["logged"] >= n / 10:
+                    progress["logged"] = progress["docs"]
+                    logger.info(f"Loading: {progress['docs']}/{n}")
+
+    logger.info(
+        f"Loading {n} vectors with {workers} worker(s) in chunks of {rows_per_chunk}"
+    )
+    start_time = perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(run_worker) for _ in range(workers)]:
+            future.result()
+    ingest_time = perf_counter() - start_time
+    logger.info(
+        f"Loaded {n} vectors in {ingest_time:.1f} s ({n / ingest_time:.1f} docs/s)"
+    )
+    return {
+        "ingest_time": ingest_time,
+        "docs": progress["docs"],
+        "bytes": progress["bytes"],
+        "bulk_requests": progress["requests"],
+        "docs_per_second": progress["docs"] / ingest_time,
+        "mb_per_second": progress["bytes"] / ingest_time / 1e6,
+    }
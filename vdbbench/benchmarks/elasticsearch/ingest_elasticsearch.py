@@ -0,0 +1,88 @@
+from time import perf_counter
+
+from vdbbench.benchmarks.elasticsearch.ingest import BULK_CHUNK_BYTES
+from vdbbench.benchmarks.elasticsearch.query_elasticsearch import QueryElasticsearch
+from vdbbench.datasets import Dataset
+
+
+class IngestElasticsearch(QueryElasticsearch):
+    """Measures the cost of building an Elasticsearch index, without running queries.
+
+    Each data configuration creates the index and reports the time of each phase of the build in its
+    load_result: the bulk ingest (with its throughput), the refresh, the force merge, and the wait for a
+    green status, followed by the size of the index. Each group configuration then allocates replicas
+    and reports the time until the index is green again, with the size including replicas, in its
+    prepare_result. Starred keys sweep any of these parameters, such as "*chunk_bytes",
+    "*ingest_workers", "*refresh_interval", "*m" or "*shard_count".
+
+    The in-memory size is an estimate of the off-heap memory needed by the HNSW index, which is not
+    reported by the stats: num_vectors * 4 * dims bytes for the float vectors and num_vectors * 2 * m * 4
+    bytes for the neighbor lists of the bottom layer of the graph, per copy.
+    """
+
+    RUNS_QUERIES = False
+
+    def load_data(
+        self,
+        dataset: Dataset,
+        shard_count: int = 3,
+        ef_construction: int = 100,
+        m: int = 16,
+        ingest_workers: int = 4,
+        chunk_bytes: int = BULK_CHUNK_BYTES,
+        refresh_interval: str | int = -1,
+        max_num_segments: int = 1,
+        attributes: bool = False,
+    ) -> dict:
+        es = self.es
+        name = self.INDEX_NAME
+        self.dims = dataset.dims
+        self.m = m
+        result = self._build_index(
+            dataset,
+            shard_count,
+            ef_construction,
+            m,
+            ingest_workers,
+            chunk_bytes,
+            attributes,
+            refresh_interval,
+        )
+
+        self.logger.info("Forcing merge index")
+        start_time = perf_counter()
+        es.options(request_timeout=3000).indices.forcemerge(
+            index=name, max_num_segments=max_num_segments
+        )
+        result["forcemerge_time"] = perf_counter() - start_time
+
+        self.logger.info("Waiting for the index status to be green")
+        start_time = perf_counter()
+        es.cluster.health(wait_for_status="green", index=name)
+        result["green_time"] = perf_counter() - start_time
+        return result | self._get_index_size()
+
+    def prepare_group(self, replica_count: int = 2) -> dict:
+        self.logger.info("Scaling replicas to the desired count")
+        start_time = perf_counter()
+        self.es.indices.put_settings(
+            index=self.INDEX_NAME,
+            body={"index": {"number_of_replicas": replica_count}},
+        )
+        self.es.cluster.health(
+            wait_for_status="green", index=self.INDEX_NAME, timeout="1h"
+        )
+        return {"replica_time": perf_counter() - start_time} | self._get_index_size()
+
+    def _get_index_size(self) -> dict:
+        stats = self.es.indices.stats(
+            index=self.INDEX_NAME, metric=["docs", "store", "segments"]
+        )["_all"]
+        docs = stats["primaries"]["docs"]["count"]
+        copies = stats["total"]["docs"]["count"] // max(docs, 1)
+        return {
+            "primary_store_bytes": stats["primaries"]["store"]["size_in_bytes"],
+            "total_store_bytes": stats["total"]["store"]["size_in_bytes"],
+            "segment_count": stats["primaries"]["segments"]["count"],
+            "estimated_memory_bytes": docs * 4 * (self.dims + 2 * self.m) * copies,
+        }
@@ -1,17 +1,24 @@
 from __future__ import annotations
 
+import json
 import logging
+from time import perf_counter
+from typing import Literal
 
 import numpy as np
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 
 from vdbbench.benchmarks.elasticsearch.common import (
     create_elasticsearch_client,
     wait_for_elasticsearch_cluster,
 )
+from vdbbench.benchmarks.elasticsearch.ingest import (
+    BULK_CHUNK_BYTES,
+    bulk_ingest,
+    encode_bulk_payload,
+)
 from vdbbench.benchmarks.query_benchmark import QueryBenchmark
-from vdbbench.datasets import Dataset
+from vdbbench.datasets import Dataset, attribute_limit
 from vdbbench.distance import DistanceMetric
 from vdbbench.terraform import DatabaseDeployment, apply_terraform
 
@@ -19,6 +26,9 @@ from vdbbench.terraform import DatabaseDeployment, apply_terraform
 class QueryElasticsearch(QueryBenchmark):
     INDEX_NAME = "vdbbench"
     es: Elasticsearch
+    deploy_output: dict
+    # The attributes of the loaded vectors, if they were indexed
+    attributes: np.ndarray | None = None
 
     def run_deploy(
         self, node_count: int = 3, machine_type: str = "n2-standard-2"
@@ -29,6 +39,19 @@ class QueryElasticsearch(QueryBenchmark):
             machine_type=machine_type,
         )
 
+    def validate_config(self):
+        super().validate_config()
+        filtered = any(k.lstrip("*~") == "selectivity" for k in self.query_config)
+        attributes = self.data_config.get(
+            "attributes", self.data_config.get("*attributes", False)
+        )
+        if filtered and not (
+            all(attributes) if isinstance(attributes, list) else attributes
+        ):
+            raise ValueError(
+                "Filtered queries need the attributes to be indexed, set data.attributes to true"
+            )
+
     def init(self, deploy_output: dict):
         for logger_name in ("elasticsearch", "elastic_transport.transport"):
             logging.getLogger(logger_name).setLevel(logging.WARNING)
@@ -37,6 +60,12 @@ class QueryElasticsearch(QueryBenchmark):
         es = create_elasticsearch_client(deploy_output).options(request_timeout=1000)
         wait_for_elasticsearch_cluster(es)
         self.es = es
+        self.deploy_output = deploy_output
+
+    def init_worker(self):
+        self.es = create_elasticsearch_client(self.deploy_output).options(
+            request_timeout=1000
+        )
 
     def load_data(
         self,
@@ -44,13 +73,80 @@ class QueryElasticsearch(QueryBenchmark):
         shard_count: int = 3,
         ef_construction: int = 100,
         m: int = 16,
+        ingest_workers: int = 4,
+        chunk_bytes: int = BULK_CHUNK_BYTES,
+        attributes: bool = False,
     ) -> dict:
+        result = self._build_index(
+            dataset,
+            shard_count,
+            ef_construction,
+            m,
+            ingest_workers,
+            chunk_bytes,
+            attributes,
+        )
+
+        self.logger.info("Waiting for the index status to be green")
+        start_time = perf_counter()
+        self.es.cluster.health(wait_for_status="green", index=self.INDEX_NAME)
+        result["green_time"] = perf_counter() - start_time
+        return result
+
+    def _build_index(
+        self,
+        dataset: Dataset,
+        shard_count: int,
+        ef_construction: int,
+        m: int,
+        ingest_workers: int,
+        chunk_bytes: int,
+        attributes: bool,
+        refresh_interval: str | int = -1,
+    ) -> dict:
+        """Replaces the index with one of the train vectors of dataset, indexed with bulk_ingest and refreshed.
+
+        Returns:
+            The result of bulk_ingest, with the refresh time.
+        """
         es = self.es
         name = self.INDEX_NAME
         data = dataset.train
+        self.attributes = dataset.attributes if attributes else None
+        self._create_index(dataset, shard_count, ef_construction, m, refresh_interval)
+
+        self.logger.info(f"Loading {len(data)} vectors into the index")
+        result = bulk_ingest(
+            self.deploy_output,
+            name,
+            data,
+            ingest_workers,
+            chunk_bytes,
+            self.attributes,
+        )
+
+        self.logger.info("Refreshing index")
+        start_time = perf_counter()
+        es.indices.refresh(index=name)
+        result["refresh_time"] = perf_counter() - start_time
+        return result
+
+    def _create_index(
+        self,
+        dataset: Dataset,
+        shard_count: int,
+        ef_construction: int,
+        m: int,
+        refresh_interval: str | int = -1,
+    ):
+        """Replaces the index with an empty one for the vectors of dataset, without replicas."""
+        es = self.es
+        name = self.INDEX_NAME
         metric = {
             DistanceMetric.Euclidean: "l2_norm",
+            DistanceMetric.SquaredEuclidean: "l2_norm",
             DistanceMetric.Angular: "cosine",
+            DistanceMetric.InnerProduct: "max_inner_product",
         }[dataset.metric]
 
         es.indices.delete(index=name, ignore_unavailable=True)
@@ -61,7 +157,7 @@ class QueryElasticsearch(QueryBenchmark):
             settings={
                 "number_of_shards": shard_count,
                 "number_of_replicas": 0,
-                "refresh_interval": -1,
+                "refresh_interval": refresh_interval,
             },
             mappings={
                 "properties": {
@@ -69,6 +165,8 @@ class QueryElasticsearch(QueryBenchmark):
                         "type": "keyword",
                         "store": "true",
                     },
+                    "attribute": {"type": "integer"},
+                    "attribute_keyword": {"type": "keyword"},
                     "vec": {
                         "type": "dense_vector",
                         "element_type": "float",
@@ -85,77 +183,135 @@ class QueryElasticsearch(QueryBenchmark):
             },
         )
 
-        self.logger.info(f"Loading {len(data)} vectors into the index")
-
-        def chunked():
-            for i, vec in enumerate(data):
-                if i % (len(data) // 10 + 1) == 0:
-                    self.logger.info(f"Loading: {i}/{len(data)}")
-                yield {
-                    "_index": name,
-                    "_id": i,
-                    "_source": {
-                        "id": i,
-                        "vec": vec.tolist(),
-                    },
-                }
-
-        bulk(
-            es,
-            chunked(),
-            chunk_size=1000,
-        )
-
-        self.logger.info("Refreshing index")
-        es.indices.refresh(index=name)
-
-        self.logger.info("Waiting for the index status to be green")
-        es.cluster.health(wait_for_status="green", index=name)
-
-    def prepare_group(self, replica_count: int = 2):
+    def prepare_group(
+        self, replica_count: int = 2, refresh_interval: str | int | None = None
+    ):
         if replica_count > 0:
             self.logger.info("Scaling replicas to the desired count")
             self.es.indices.put_settings(
                 index=self.INDEX_NAME,
                 body={"index": {"number_of_replicas": replica_count}},
             )
+        if refresh_interval is not None:
+            self.logger.info(f"Setting the refresh interval to {refresh_interval}")
+            self.es.indices.put_settings(
+                index=self.INDEX_NAME,
+                body={"index": {"refresh_interval": refresh_interval}},
+            )
 
-    def prepare_query(self):
+    def prepare_query(self, forcemerge: bool = True):
         self.logger.info("Clearing cache")
         self.es.indices.clear_cache(index=self.INDEX_NAME)
-        self.logger.info("Forcing merge index")
-        self.es.indices.forcemerge(index=self.INDEX_NAME, max_num_segments=1, request_timeout=3000)
+        if forcemerge:
+            self.logger.info("Forcing merge index")
+            self.es.indices.forcemerge(
+                index=self.INDEX_NAME, max_num_segments=1, request_timeout=3000
+            )
 
-    def query(
-        self, queries: np.ndarray, k: int = 10, num_candidates: int = 160
-    ) -> list[list[int]]:
-        body = []
+    @staticmethod
+    def _get_filter(
+        filter_type: Literal["range", "keyword"], selectivity: float | None
+    ) -> dict | None:
+        """Builds the filter of the knn clause matching the given fraction of the loaded vectors.
 
+        A "range" filter is a range query on the integer "attribute" field, and a "keyword" filter is a terms
+        query on the "attribute_keyword" field listing every matching value, as an access control filter would.
+        """
+        if selectivity is None:
+            return None
+        limit = attribute_limit(selectivity)
+        if filter_type == "range":
+            return {"range": {"attribute": {"lt": limit}}}
+        if filter_type == "keyword":
+            return {"terms": {"attribute_keyword": [str(v) for v in range(limit)]}}
+        raise ValueError(f"Unknown filter_type: {filter_type}")
+
+    def encode_queries(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        num_candidates: int = 160,
+        filter_type: Literal["range", "keyword"] = "range",
+        selectivity: float | None = None,
+    ) -> bytes:
+        header = b"{}\n"
+        knn_filter = self._get_filter(filter_type, selectivity)
+        lines = []
         for query in queries:
-            body.append({})
-            body.append(
-                {
-                    "knn": {
-                        "field": "vec",
-                        "query_vector": query.tolist(),
-                        "k": k,
-                        "num_candidates": num_candidates,
+            knn = {
+                "field": "vec",
+                "query_vector": query.tolist(),
+                "k": k,
+                "num_candidates": num_candidates,
+            }
+            if knn_filter is not None:
+                knn["filter"] = knn_filter
+            lines.append(header)
+            lines.append(
+                json.dumps(
+                    {
+                        "knn": knn,
+                        "size": k,
+                        "_source": False,
+                        "docvalue_fields": ["id"],
+                        "stored_fields": "_none_",
                     },
-                    "size": k,
-                    "_source": False,
-                    "docvalue_fields": ["id"],
-                    "stored_fields": "_none_",
-                }
+                    separators=(",", ":"),
+                ).encode()
+                + b"\n"
+            )
+        return b"".join(lines)
+
+    def query(
+        self,
+        queries: np.ndarray | bytes,
+        k: int = 10,
+        num_candidates: int = 160,
+        filter_type: Literal["range", "keyword"] = "range",
+        selectivity: float | None = None,
+    ) -> list[list[int]]:
+        # Pre-encoded NDJSON bodies are sent as is by the transport
+        if isinstance(queries, bytes):
+            body = queries
+        else:
+            with self.span("encode"):
+                body = self.encode_queries(
+                    queries, k, num_candidates, filter_type, selectivity
+                )
+
+        with self.span("request"):
+            res = self.es.msearch(
+                index=self.INDEX_NAME,
+                body=body,
+                filter_path=["took", "responses.hits.hits.fields.id"],
+                request_timeout=100,
             )
+        self.record_span("server", res["took"] / 1000)
+
+        with self.span("parse"):
+            return [
+                [int(hit["fields"]["id"][0]) for hit in r["hits"]["hits"]]
+                for r in res["responses"]
+            ]
 
-        res = self.es.msearch(
+    def write(
+        self,
+        ids: np.ndarray,
+        vectors: np.ndarray | None,
+        attributes: np.ndarray | None,
+        refresh: Literal["false", "true", "wait_for"] = "false",
+    ):
+        if vectors is None:
+            body = b"".join(b'{"delete":{"_id":%d}}\n' % i for i in ids.tolist())
+        else:
+            body = encode_bulk_payload(
+                vectors, ids, None if self.attributes is None else attributes
+            )
+        response = self.es.bulk(
             index=self.INDEX_NAME,
             body=body,
-            filter_path=["responses.hits.hits.fields.id"],
-            request_timeout=100,
+            refresh=refresh,
+            filter_path=["errors", "items.*.error"],
         )
-
-        return [
-            [int(hit["fields"]["id"][0]) for hit in r["hits"]["hits"]]
-            for r in res["responses"]
-        ]
+        if response["errors"]:
+            raise RuntimeError(f"Failed to write documents: {response['items'][0]}")
@@ -0,0 +1,36 @@
+from vdbbench.benchmarks.elasticsearch.query_elasticsearch import QueryElasticsearch
+from vdbbench.benchmarks.elasticsearch.standin import ElasticsearchStandin
+from vdbbench.terraform import DatabaseDeployment, apply_terraform
+
+
+class QueryElasticsearchStandin(QueryElasticsearch):
+    """The Elasticsearch query benchmark against a local stand-in server instead of a cluster.
+
+    The stand-in is started on a free port of the machine that runs the benchmark, so the whole
+    client path of QueryElasticsearch, from encoding to the transport to parsing, can be tested
+    and profiled without deploying Elasticsearch. Its searches are exact, so recall should be 1.
+    """
+
+    standin: ElasticsearchStandin
+
+    def run_deploy(
+        self, runner: bool = False, latency: float = 0.0, query_latency: float = 0.0
+    ) -> dict:
+        output = apply_terraform(DatabaseDeployment.RUNNER_ONLY) if runner else {}
+        return output | {
+            "standin_latency": latency,
+            "standin_query_latency": query_latency,
+        }
+
+    def init(self, deploy_output: dict):
+        self.standin = ElasticsearchStandin(
+            latency=deploy_output["standin_latency"],
+            query_latency=deploy_output["standin_query_latency"],
+        ).start()
+        super().init(
+            deploy_output
+            | {
+                "elasticsearch_instance_names": ["127.0.0.1"],
+                "elasticsearch_port": self.standin.port,
+            }
+        )
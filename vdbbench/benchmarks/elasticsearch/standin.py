@@ -0,0 +1,621 @@
+import json
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from vdbbench.distance import DistanceMetric
+from vdbbench.groundtruth import compute_ground_truth
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_METRICS = {
+    "l2_norm": DistanceMetric.Euclidean,
+    "cosine": DistanceMetric.Angular,
+    "dot_product": DistanceMetric.InnerProduct,
+    "max_inner_product": DistanceMetric.InnerProduct,
+}
+
+
+class StandinError(Exception):
+    def __init__(self, status: int, error_type: str, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.error_type = error_type
+        self.reason = reason
+
+
+class StandinColumn(NamedTuple):
+    """The values of a source field across a snapshot, as float64 if all are numbers and as strings otherwise."""
+
+    values: np.ndarray
+    present: np.ndarray
+
+    @property
+    def numeric(self) -> bool:
+        return self.values.dtype.kind == "f"
+
+
+class StandinSnapshot(NamedTuple):
+    ids: list[str]
+    sources: list[dict]
+    vectors: np.ndarray
+    columns: dict[str, StandinColumn]
+
+
+class StandinIndex:
+    """An index of the stand-in server, searched exactly by brute force.
+
+    Documents become searchable when the index is refreshed, as in Elasticsearch, which replaces the
+    snapshot of ids, sources, vectors and source field columns that searches read.
+    Vectors are kept apart from the sources, parsed directly from _bulk bodies into float32 arrays.
+    """
+
+    def __init__(self, settings: dict, mappings: dict):
+        self.settings = settings.get("index", settings)
+        properties = mappings.get("properties", {})
+        self.vector_field = next(
+            (k for k, v in properties.items() if v.get("type") == "dense_vector"),
+            None,
+        )
+        similarity = (
+            properties[self.vector_field].get("similarity", "cosine")
+            if self.vector_field
+            else "cosine"
+        )
+        self.metric = SIMILARITY_METRICS[similarity]
+        self.vector_pattern = (
+            re.compile(
+                rb'"%s"\s*:\s*\[([^\]]*)\]' % re.escape(self.vector_field.encode())
+            )
+            if self.vector_field
+            else None
+        )
+        self.documents: dict[str, dict] = {}
+        self.vectors: dict[str, np.ndarray] = {}
+        self.snapshot = StandinSnapshot([], [], np.empty((0, 0), dtype=np.float32), {})
+
+    def parse_sources(self, lines: list[bytes]) -> tuple[list[dict], np.ndarray]:
+        """Parses the document source lines of a _bulk body.
+
+        The vector field of each source is cut out of the JSON and parsed into a single float32 array
+        for all the sources, so that vectors never become lists of Python floats.
+
+        Returns:
+            The sources without the vector field, and their vectors with shape (len(lines), dims),
+            or (len(lines), 0) if the index has no vector field.
+        """
+        if self.vector_pattern is None:
+            return [json.loads(line) for line in lines], np.empty(
+                (len(lines), 0), dtype=np.float32
+            )
+        sources = []
+        vector_texts = []
+        for line in lines:
+            match = self.vector_pattern.search(line)
+            if match is None:
+                raise StandinError(
+                    400,
+                    "document_parsing_exception",
+                    f"Document is missing the [{self.vector_field}] vector",
+                )
+            vector_texts.append(match[1])
+            # Replace the vector with null, so that only the rest of the source is parsed as JSON
+            source = json.loads(
+                line[: match.start(1) - 1] + b"null" + line[match.end() :]
+            )
+            del source[self.vector_field]
+            sources.append(source)
+        vectors = np.fromstring(b",".join(vector_texts), dtype=np.float32, sep=",")
+        if lines and vectors.shape[0] % len(lines):
+            raise StandinError(
+                400,
+                "document_parsing_exception",
+                "Documents have vectors with different numbers of dimensions",
+            )
+        return sources, vectors.reshape(len(lines), -1)
+
+    def refresh(self):
+        ids = list(self.documents)
+        sources = list(self.documents.values())
+        vectors = np.empty((0, 0), dtype=np.float32)
+        if self.vector_field is not None and ids:
+            vectors = self.metric.normalize(np.stack([self.vectors[i] for i in ids]))
+        fields = {field for source in sources for field in source}
+        columns = {
+            field: _to_column([source.get(field) for source in sources])
+            for field in fields
+        }
+        self.snapshot = StandinSnapshot(ids, sources, vectors, columns)
+
+    def knn(
+        self,
+        snapshot: StandinSnapshot,
+        query_vectors: np.ndarray,
+        k: int,
+        filter: dict | list | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """Finds the k nearest documents in a snapshot of the index to each of a batch of query vectors.
+
+        All queries are scored together in blocked matrix products. If a filter is given, only the
+        matching documents are searched, which are found once for the whole batch.
+
+        Returns:
+            For each query, the position in the snapshot and score of each neighbor, in decreasing order of score.
+        """
+        vectors = snapshot.vectors
+        positions = None
+        if filter is not None:
+            positions = np.flatnonzero(_compile_filter(filter)(snapshot))
+            vectors = vectors[positions]
+        if not vectors.shape[0] or not k:
+            return [[] for _ in range(query_vectors.shape[0])]
+        dists, neighbors = compute_ground_truth(
+            vectors,
+            self.metric.normalize(query_vectors),
+            self.metric,
+            k,
+            workers=1,
+            normalized=True,
+        )
+        if positions is not None:
+            neighbors = positions[neighbors]
+        return [
+            [(int(n), self._score(d)) for d, n in zip(query_dists, query_neighbors)]
+            for query_dists, query_neighbors in zip(dists, neighbors)
+        ]
+
+    def _score(self, dist: float) -> float:
+        # The scores of Elasticsearch's similarities, which are larger for closer vectors
+        dist = float(dist)
+        if self.metric is DistanceMetric.Euclidean:
+            return 1 / (1 + dist**2)
+        if self.metric is DistanceMetric.Angular:
+            return (2 - dist) / 2
+        dot = -dist
+        return dot + 1 if dot >= 0 else 1 / (1 - dot)
+
+
+class ElasticsearchStandin:
+    """A local HTTP server implementing the subset of the Elasticsearch API used by the benchmarks.
+
+    It supports creating, deleting, inspecting, counting and getting stats of indices, _bulk indexing, refresh,
+    forcemerge, cache clearing, settings updates, cluster health, and kNN _search and _msearch.
+    kNN searches are exact and ignore num_candidates, and support term, terms, range and bool filters. Every search and multi-search request is delayed
+    by latency seconds, plus query_latency seconds for each search in it.
+
+    Args:
+        port: The port to listen on, or 0 to pick a free port.
+        latency: The delay added to each search request, in seconds.
+        query_latency: The delay added for each search in a request, in seconds.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, query_latency: float = 0.0):
+        self.latency = latency
+        self.query_latency = query_latency
+        self.indices: dict[str, StandinIndex] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "ElasticsearchStandin":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Elasticsearch stand-in listening on port {self.port}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, method: str, path: str, params: dict, body: bytes) -> dict:
+        parts = [p for p in path.split("/") if p]
+        if not parts:
+            return {
+                "name": "vdbbench-standin",
+                "cluster_name": "vdbbench-standin",
+                "version": {"number": "8.12.1"},
+                "tagline": "You Know, for Search",
+            }
+        if parts[0] == "_bulk":
+            return self._bulk(None, body, params)
+        if parts[0] == "_cluster" and parts[1:2] == ["health"]:
+            return {"cluster_name": "vdbbench-standin", "status": "green"}
+        if parts[0] == "_msearch":
+            return self._msearch(None, body)
+        index_name = parts[0]
+        action = parts[1] if len(parts) > 1 else None
+        if action is None:
+            if method == "PUT":
+                return self._create_index(index_name, body)
+            if method == "DELETE":
+                return self._delete_index(index_name, params)
+            if method in ("GET", "HEAD"):
+                index = self._get_index(index_name)
+                return {index_name: {"settings": {"index": index.settings}}}
+        elif action == "_bulk":
+            return self._bulk(index_name, body, params)
+        elif action == "_refresh":
+            with self.lock:
+                self._get_index(index_name).refresh()
+            return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        elif action in ("_forcemerge", "_cache"):
+            self._get_index(index_name)
+            return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        elif action == "_settings":
+            settings = json.loads(body)
+            self._get_index(index_name).settings.update(
+                {k: str(v) for k, v in settings.get("index", settings).items()}
+            )
+            return {"acknowledged": True}
+        elif action == "_count":
+            return {"count": len(self._get_index(index_name).snapshot.ids)}
+        elif action == "_stats":
+            return self._stats(index_name)
+        elif action == "_search":
+            time.sleep(self.latency + self.query_latency)
+            start_time = time.perf_counter()
+            (response,) = self._search(
+                [(index_name, json.loads(body or b"{}"))], params
+            )
+            return {"took": _took_since(start_time)} | response
+        elif action == "_msearch":
+            return self._msearch(index_name, body)
+        raise StandinError(
+            400, "illegal_argument_exception", f"Unsupported request {method} {path}"
+        )
+
+    def _get_index(self, name: str) -> StandinIndex:
+        if name not in self.indices:
+            raise StandinError(
+                404, "index_not_found_exception", f"no such index [{name}]"
+            )
+        return self.indices[name]
+
+    def _create_index(self, name: str, body: bytes) -> dict:
+        with self.lock:
+            if name in self.indices:
+                raise StandinError(
+                    400,
+                    "resource_already_exists_exception",
+                    f"index [{name}] already exists",
+                )
+            request = json.loads(body or b"{}")
+            settings = request.get("settings", {})
+            settings = {
+                "number_of_shards": "1",
+                "number_of_replicas": "1",
+            } | {k: str(v) for k, v in settings.get("index", settings).items()}
+            self.indices[name] = StandinIndex(settings, request.get("mappings", {}))
+        return {"acknowledged": True, "shards_acknowledged": True, "index": name}
+
+    def _delete_index(self, name: str, params: dict) -> dict:
+        with self.lock:
+            if name not in self.indices:
+                if params.get("ignore_unavailable") == "true":
+                    return {"acknowledged": True}
+                self._get_index(name)
+            del self.indices[name]
+        return {"acknowledged": True}
+
+    def _stats(self, name: str) -> dict:
+        index = self._get_index(name)
+        snapshot = index.snapshot
+        primaries = {
+            "docs": {"count": len(snapshot.ids)},
+            "store": {"size_in_bytes": snapshot.vectors.nbytes},
+            "segments": {"count": 1 if snapshot.ids else 0},
+        }
+        copies = 1 + int(index.settings["number_of_replicas"])
+        total = {
+            stat: {key: value * copies for key, value in values.items()}
+            for stat, values in primaries.items()
+        }
+        stats = {"primaries": primaries, "total": total}
+        return {"_all": stats, "indices": {name: stats}}
+
+    def _bulk(self, default_index: str | None, body: bytes, params: dict) -> dict:
+        start_time = time.perf_counter()
+        lines = iter(line for line in body.splitlines() if line.strip())
+        actions = []
+        for action_line in lines:
+            ((op_type, meta),) = json.loads(action_line).items()
+            actions.append(
+                (op_type, meta, None if op_type == "delete" else next(lines))
+            )
+        items = []
+        refreshed = set()
+        with self.lock:
+            indices = {}
+            for op_type, meta, _ in actions:
+                index_name = meta.get("_index", default_index)
+                indices[index_name] = self._get_index(index_name)
+            parsed = {}
+            for index_name, index in indices.items():
+                source_lines = [
+                    source_line
+                    for _, meta, source_line in actions
+                    if source_line is not None
+                    and meta.get("_index", default_index) == index_name
+                ]
+                sources, vectors = index.parse_sources(source_lines)
+                parsed[index_name] = iter(zip(sources, vectors))
+            for op_type, meta, _ in actions:
+                index_name = meta.get("_index", default_index)
+                index = indices[index_name]
+                refreshed.add(index)
+                doc_id = str(meta.get("_id", len(index.documents)))
+                if op_type == "delete":
+                    result = "deleted" if doc_id in index.documents else "not_found"
+                    index.documents.pop(doc_id, None)
+                    index.vectors.pop(doc_id, None)
+                    status = 200 if result == "deleted" else 404
+                else:
+                    result = "updated" if doc_id in index.documents else "created"
+                    index.documents[doc_id], index.vectors[doc_id] = next(
+                        parsed[index_name]
+                    )
+                    status = 201 if result == "created" else 200
+                items.append(
+                    {
+                        op_type: {
+                            "_index": index_name,
+                            "_id": doc_id,
+                            "result": result,
+                            "status": status,
+                        }
+                    }
+                )
+            if params.get("refresh") in ("true", "wait_for", ""):
+                for index in refreshed:
+                    index.refresh()
+        return {"took": _took_since(start_time), "errors": False, "items": items}
+
+    def _msearch(self, default_index: str | None, body: bytes) -> dict:
+        lines = [line for line in body.splitlines() if line.strip()]
+        time.sleep(self.latency + self.query_latency * (len(lines) // 2))
+        start_time = time.perf_counter()
+        searches = [
+            (
+                json.loads(header_line).get("index", default_index),
+                json.loads(search_line),
+            )
+            for header_line, search_line in zip(lines[::2], lines[1::2])
+        ]
+        responses = [
+            response | {"status": 200} for response in self._search(searches, {})
+        ]
+        return {"took": _took_since(start_time), "responses": responses}
+
+    def _search(self, searches: list[tuple[str, dict]], params: dict) -> list[dict]:
+        """Runs searches given as index names and request bodies, returning a response for each.
+
+        kNN searches of the same index with the same filter are run as one batch by StandinIndex.knn.
+        """
+        snapshots = {}
+        for index_name, _ in searches:
+            if index_name not in snapshots:
+                snapshots[index_name] = self._get_index(index_name).snapshot
+        sizes = [
+            int(params.get("size", request.get("size", 10))) for _, request in searches
+        ]
+        batches = {}
+        for i, (index_name, request) in enumerate(searches):
+            knn = request.get("knn")
+            if knn is not None:
+                key = (index_name, json.dumps(knn.get("filter"), sort_keys=True))
+                batches.setdefault(key, []).append(i)
+        matches = [
+            [(i, 1.0) for i in range(min(size, len(snapshots[index_name].ids)))]
+            for (index_name, _), size in zip(searches, sizes)
+        ]
+        for (index_name, _), batch in batches.items():
+            knns = [searches[i][1]["knn"] for i in batch]
+            batch_matches = self._get_index(index_name).knn(
+                snapshots[index_name],
+                np.array([knn["query_vector"] for knn in knns], dtype=np.float32),
+                max(knn.get("k", sizes[i]) for knn, i in zip(knns, batch)),
+                knns[0].get("filter"),
+            )
+            for knn, i, query_matches in zip(knns, batch, batch_matches):
+                matches[i] = query_matches[: min(knn.get("k", sizes[i]), sizes[i])]
+        return [
+            self._search_response(index_name, snapshots[index_name], request, params, m)
+            for (index_name, request), m in zip(searches, matches)
+        ]
+
+    def _search_response(
+        self,
+        index_name: str,
+        snapshot: StandinSnapshot,
+        request: dict,
+        params: dict,
+        matches: list[tuple[int, float]],
+    ) -> dict:
+        docvalue_fields = params.get(
+            "docvalue_fields", request.get("docvalue_fields", [])
+        )
+        if isinstance(docvalue_fields, str):
+            docvalue_fields = docvalue_fields.split(",")
+        hits = []
+        for position, score in matches:
+            hit = {"_index": index_name, "_id": snapshot.ids[position], "_score": score}
+            if docvalue_fields:
+                source = snapshot.sources[position]
+                hit["fields"] = {
+                    field: [str(source[field])]
+                    for field in docvalue_fields
+                    if field in source
+                }
+            hits.append(hit)
+        return {
+            "timed_out": False,
+            "hits": {
+                "total": {"value": len(hits), "relation": "eq"},
+                "max_score": hits[0]["_score"] if hits else None,
+                "hits": hits,
+            },
+        }
+
+
+def _compile_filter(query: dict | list) -> Callable[[StandinSnapshot], np.ndarray]:
+    """Compiles the subset of the query DSL supported in kNN filters into a function that finds the boolean
+    mask of the documents in a snapshot matching the query, evaluated on the columns of the snapshot."""
+    if isinstance(query, list):
+        return _compile_all([_compile_filter(q) for q in query])
+    ((query_type, body),) = query.items()
+    if query_type == "match_all":
+        return lambda snapshot: np.ones(len(snapshot.ids), dtype=bool)
+    if query_type == "bool":
+        required = _compile_filter(
+            [c for occur in ("must", "filter") for c in _as_list(body.get(occur, []))]
+        )
+        excluded = _compile_any(
+            [_compile_filter(c) for c in _as_list(body.get("must_not", []))]
+        )
+        return lambda snapshot: required(snapshot) & ~excluded(snapshot)
+    ((field, condition),) = body.items()
+    if query_type == "term":
+        if isinstance(condition, dict):
+            condition = condition["value"]
+        return _compile_terms(field, [condition])
+    if query_type == "terms":
+        return _compile_terms(field, condition)
+    if query_type == "range":
+        bounds = {
+            "gt": np.greater,
+            "gte": np.greater_equal,
+            "lt": np.less,
+            "lte": np.less_equal,
+        }
+        checks = [(bounds[op], float(bound)) for op, bound in condition.items()]
+
+        def matches(snapshot: StandinSnapshot) -> np.ndarray:
+            column = snapshot.columns.get(field)
+            if column is None or not column.numeric:
+                return np.zeros(len(snapshot.ids), dtype=bool)
+            mask = column.present.copy()
+            for check, bound in checks:
+                mask &= check(column.values, bound)
+            return mask
+
+        return matches
+    raise StandinError(
+        400, "parsing_exception", f"Unsupported filter query [{query_type}]"
+    )
+
+
+def _compile_all(
+    predicates: list[Callable[[StandinSnapshot], np.ndarray]],
+) -> Callable[[StandinSnapshot], np.ndarray]:
+    def matches(snapshot: StandinSnapshot) -> np.ndarray:
+        mask = np.ones(len(snapshot.ids), dtype=bool)
+        for predicate in predicates:
+            mask &= predicate(snapshot)
+        return mask
+
+    return matches
+
+
+def _compile_any(
+    predicates: list[Callable[[StandinSnapshot], np.ndarray]],
+) -> Callable[[StandinSnapshot], np.ndarray]:
+    def matches(snapshot: StandinSnapshot) -> np.ndarray:
+        mask = np.zeros(len(snapshot.ids), dtype=bool)
+        for predicate in predicates:
+            mask |= predicate(snapshot)
+        return mask
+
+    return matches
+
+
+def _compile_terms(field: str, values: list) -> Callable[[StandinSnapshot], np.ndarray]:
+    numbers = []
+    for value in values:
+        try:
+            numbers.append(float(value))
+        except (TypeError, ValueError):
+            pass
+    strings = [str(value) for value in values]
+
+    def matches(snapshot: StandinSnapshot) -> np.ndarray:
+        column = snapshot.columns.get(field)
+        if column is None:
+            return np.zeros(len(snapshot.ids), dtype=bool)
+        if column.numeric:
+            return np.isin(column.values, numbers)
+        return column.present & np.isin(column.values, strings)
+
+    return matches
+
+
+def _to_column(values: list) -> StandinColumn:
+    present = np.array([value is not None for value in values], dtype=bool)
+    if all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in values
+        if value is not None
+    ):
+        return StandinColumn(
+            np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64,
+            ),
+            present,
+        )
+    return StandinColumn(
+        np.array(["" if value is None else str(value) for value in values], dtype=str),
+        present,
+    )
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def _took_since(start_time: float) -> int:
+    return int((time.perf_counter() - start_time) * 1000)
+
+
+def _make_handler(standin: ElasticsearchStandin) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        # Keep connections alive, like Elasticsearch
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self):
+            url = urlsplit(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                status, response = (
+                    200,
+                    standin.handle(self.command, url.path, params, body),
+                )
+            except StandinError as e:
+                status = e.status
+                response = {
+                    "error": {"type": e.error_type, "reason": e.reason},
+                    "status": e.status,
+                }
+            content = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header("X-Elastic-Product", "Elasticsearch")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(content)
+
+        do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = _handle
+
+        def log_message(self, format: str, *args):
+            logger.debug(format, *args)
+
+    return Handler
@@ -0,0 +1,193 @@
+import heapq
+import math
+
+import numpy as np
+
+from vdbbench.distance import DistanceMetric
+
+
+class HNSWIndex:
+    """A hierarchical navigable small world graph index (HNSW).
+
+    This follows Malkov and Yashunin's algorithm, with the neighbor selection heuristic and
+    levels drawn with a normalization factor of 1 / ln(m). Each node has up to 2 * m neighbors
+    on the bottom layer and up to m on the layers above.
+
+    Args:
+        metric: The distance metric.
+        m: The number of neighbors selected for each node when it is inserted.
+        ef_construction: The size of the candidate list searched when inserting a node.
+        seed: The random seed for the levels of the nodes.
+    """
+
+    def __init__(
+        self,
+        metric: DistanceMetric,
+        m: int = 16,
+        ef_construction: int = 100,
+        seed: int = 0,
+    ):
+        self.metric = metric
+        self.m = m
+        self.max_m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.rng = np.random.default_rng(seed)
+        self.entry_point = -1
+        self.max_level = -1
+
+    def build(self, vectors: np.ndarray):
+        self.vectors = self.metric.normalize(vectors)
+        n = self.vectors.shape[0]
+        self.levels = np.floor(-np.log(1 - self.rng.random(n)) / math.log(self.m))
+        self.levels = self.levels.astype(np.int64)
+        self.layer0 = np.full((n, self.max_m0), -1, dtype=np.int32)
+        self.layer0_counts = np.zeros(n, dtype=np.int32)
+        self.upper_layers: list[dict[int, np.ndarray]] = [
+            {} for _ in range(self.levels.max())
+        ]
+        for node in range(n):
+            self._insert(node)
+
+    @property
+    def memory_bytes(self) -> int:
+        return (
+            self.vectors.nbytes
+            + self.levels.nbytes
+            + self.layer0.nbytes
+            + self.layer0_counts.nbytes
+            + sum(a.nbytes for layer in self.upper_layers for a in layer.values())
+        )
+
+    def search(self, queries: np.ndarray, k: int, ef: int) -> np.ndarray:
+        """Finds the approximate k nearest neighbors of each query, searching ef candidates.
+
+        Returns:
+            The ids of the neighbors of each query in increasing order of distance, with shape (n_queries, k).
+
+        Raises:
+            ValueError: If ef is less than k, or fewer than k nodes are reached from the entry point.
+        """
+        if ef < k:
+            raise ValueError(f"Expected ef of at least k ({k}), got {ef}")
+        queries = self.metric.normalize(queries)
+        results = np.empty((queries.shape[0], k), dtype=np.int64)
+        for i, query in enumerate(queries):
+            entry = [self.entry_point]
+            entry_dists = self._distances(query, entry)
+            for level in range(self.max_level, 0, -1):
+                entry_dists, entry = self._search_layer(
+                    query, entry, entry_dists, 1, level
+                )
+            _, ids = self._search_layer(query, entry, entry_dists, ef, 0)
+            if len(ids) < k:
+                raise ValueError(f"Found only {len(ids)} of {k} neighbors")
+            results[i] = ids[:k]
+        return results
+
+    def _insert(self, node: int):
+        query = self.vectors[node]
+        level = self.levels[node]
+        if self.entry_point < 0:
+            self.entry_point = node
+            self.max_level = level
+            return
+        entry = [self.entry_point]
+        entry_dists = self._distances(query, entry)
+        for current_level in range(self.max_level, level, -1):
+            entry_dists, entry = self._search_layer(
+                query, entry, entry_dists, 1, current_level
+            )
+        for current_level in range(min(level, self.max_level), -1, -1):
+            entry_dists, entry = self._search_layer(
+                query, entry, entry_dists, self.ef_construction, current_level
+            )
+            neighbors = self._select_neighbors(entry, entry_dists, self.m)
+            self._set_neighbors(node, current_level, neighbors)
+            max_neighbors = self.max_m0 if current_level == 0 else self.m
+            for neighbor in neighbors:
+                links = self._get_neighbors(neighbor, current_level)
+                links = np.append(links, node)
+                if len(links) > max_neighbors:
+                    links = self._select_neighbors(
+                        links.tolist(),
+                        self._distances(self.vectors[neighbor], links),
+                        max_neighbors,
+                    )
+                self._set_neighbors(neighbor, current_level, links)
+        if level > self.max_level:
+            self.entry_point = node
+            self.max_level = level
+
+    def _search_layer(
+        self,
+        query: np.ndarray,
+        entry: list[int],
+        entry_dists: np.ndarray,
+        ef: int,
+        level: int,
+    ) -> tuple[np.ndarray, list[int]]:
+        """Finds the ef nearest nodes to query on a layer, in increasing order of distance."""
+        visited = set(entry)
+        candidates = list(zip(entry_dists.tolist(), entry))
+        heapq.heapify(candidates)
+        # A max-heap of the nearest nodes found, by negated distance
+        nearest = [(-d, e) for d, e in candidates]
+        heapq.heapify(nearest)
+        while len(nearest) > ef:
+            heapq.heappop(nearest)
+        while candidates:
+            dist, node = heapq.heappop(candidates)
+            if dist > -nearest[0][0] and len(nearest) >= ef:
+                break
+            neighbors = [
+                n for n in self._get_neighbors(node, level).tolist() if n not in visited
+            ]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for neighbor_dist, neighbor in zip(
+                self._distances(query, neighbors).tolist(), neighbors
+            ):
+                if len(nearest) < ef or neighbor_dist < -nearest[0][0]:
+                    heapq.heappush(candidates, (neighbor_dist, neighbor))
+                    heapq.heappush(nearest, (-neighbor_dist, neighbor))
+                    if len(nearest) > ef:
+                        heapq.heappop(nearest)
+        nearest.sort(reverse=True)
+        return np.array([-d for d, _ in nearest]), [n for _, n in nearest]
+
+    def _select_neighbors(
+        self, candidates: list[int], candidate_dists: np.ndarray, m: int
+    ) -> np.ndarray:
+        """Selects up to m neighbors among candidates with the heuristic of the HNSW paper.
+
+        A candidate is kept only if it is closer to the base node than to every candidate kept before it,
+        which favors neighbors in different directions.
+        """
+        order = np.argsort(candidate_dists, kind="stable")
+        candidates = np.asarray(candidates)[order]
+        candidate_dists = candidate_dists[order]
+        vectors = self.vectors[candidates]
+        pairwise = self.metric.many_to_many(vectors, vectors, normalized=True)
+        selected = []
+        for i in range(len(candidates)):
+            if all(pairwise[i, j] > candidate_dists[i] for j in selected):
+                selected.append(i)
+                if len(selected) == m:
+                    break
+        return candidates[selected].astype(np.int32)
+
+    def _get_neighbors(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            return self.layer0[node, : self.layer0_counts[node]]
+        return self.upper_layers[level - 1].get(node, np.empty(0, dtype=np.int32))
+
+    def _set_neighbors(self, node: int, level: int, neighbors: np.ndarray):
+        if level == 0:
+            self.layer0[node, : len(neighbors)] = neighbors
+            self.layer0_counts[node] = len(neighbors)
+        else:
+            self.upper_layers[level - 1][node] = np.asarray(neighbors, dtype=np.int32)
+
+    def _distances(self, query: np.ndarray, nodes) -> np.ndarray:
+        return self.metric.one_to_many(query, self.vectors[nodes], normalized=True)
@@ -0,0 +1,125 @@
+import numpy as np
+
+from vdbbench.distance import DistanceMetric
+from vdbbench.groundtruth import compute_ground_truth
+
+KMEANS_SAMPLES_PER_LIST = 64
+
+
+class IVFFlatIndex:
+    """An inverted file index with exact distances within each list (IVF-Flat).
+
+    The vectors are partitioned by a k-means coarse quantizer, trained with Lloyd's algorithm on a
+    sample of up to KMEANS_SAMPLES_PER_LIST vectors per list, and stored contiguously by list.
+    A query scans the vectors of the nprobe lists with the nearest centroids.
+
+    Args:
+        metric: The distance metric.
+        n_lists: The number of lists, limited to the number of vectors.
+        kmeans_iterations: The number of iterations of Lloyd's algorithm.
+        seed: The random seed for the k-means initialization.
+    """
+
+    def __init__(
+        self,
+        metric: DistanceMetric,
+        n_lists: int = 1024,
+        kmeans_iterations: int = 10,
+        seed: int = 0,
+    ):
+        self.metric = metric
+        self.n_lists = n_lists
+        self.kmeans_iterations = kmeans_iterations
+        self.rng = np.random.default_rng(seed)
+
+    def build(self, vectors: np.ndarray):
+        vectors = self.metric.normalize(vectors)
+        n_lists = min(self.n_lists, vectors.shape[0])
+        sample_size = min(vectors.shape[0], n_lists * KMEANS_SAMPLES_PER_LIST)
+        sample = vectors[np.sort(self.rng.choice(vectors.shape[0], sample_size, False))]
+        centroids = sample[self.rng.choice(sample_size, n_lists, False)]
+        for _ in range(self.kmeans_iterations):
+            assignments = self._assign(centroids, sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            centroids = sums / np.maximum(counts, 1)[:, np.newaxis]
+            # Restart empty lists at random sample vectors
+            centroids[empty] = sample[self.rng.choice(sample_size, np.sum(empty))]
+            centroids = self.metric.normalize(centroids)
+        assignments = self._assign(centroids, vectors)
+        order = np.argsort(assignments, kind="stable")
+        self.centroids = centroids
+        self.list_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]
+        )
+        self.list_vectors = vectors[order]
+        self.list_ids = order
+
+    @property
+    def memory_bytes(self) -> int:
+        return (
+            self.centroids.nbytes
+            + self.list_offsets.nbytes
+            + self.list_vectors.nbytes
+            + self.list_ids.nbytes
+        )
+
+    def search(self, queries: np.ndarray, k: int, nprobe: int) -> np.ndarray:
+        """Finds the approximate k nearest neighbors of each query.
+
+        Lists beyond nprobe are scanned if needed to find at least k candidates. The batch is scanned
+        list by list, so the distances to each list are computed for all queries probing it at once.
+
+        Returns:
+            The ids of the neighbors of each query in increasing order of distance, with shape (n_queries, k).
+        """
+        if k > len(self.list_ids):
+            raise ValueError(f"Expected k of at most {len(self.list_ids)}, got {k}")
+        queries = self.metric.normalize(queries)
+        n_queries = queries.shape[0]
+        n_lists = len(self.centroids)
+        centroid_dists = self.metric.many_to_many(
+            queries, self.centroids, normalized=True
+        )
+        lists = np.argsort(centroid_dists, axis=1, kind="stable")
+        list_sizes = np.diff(self.list_offsets)
+        enough = np.cumsum(list_sizes[lists], axis=1) >= k
+        n_probe = np.maximum(nprobe, np.argmax(enough, axis=1) + 1)
+        ranks = np.empty_like(lists)
+        np.put_along_axis(ranks, lists, np.arange(n_lists), axis=1)
+        probed = ranks < n_probe[:, np.newaxis]
+        # The k nearest candidates so far of each query, as positions in list_vectors
+        top_dists = np.full((n_queries, k), np.inf, dtype=np.float32)
+        top_positions = np.zeros((n_queries, k), dtype=np.int64)
+        for j in np.flatnonzero(probed.any(axis=0) & (list_sizes > 0)):
+            start, end = self.list_offsets[j], self.list_offsets[j + 1]
+            rows = np.flatnonzero(probed[:, j])
+            dists = np.concatenate(
+                [
+                    top_dists[rows],
+                    self.metric.many_to_many(
+                        queries[rows], self.list_vectors[start:end], normalized=True
+                    ),
+                ],
+                axis=1,
+            )
+            positions = np.concatenate(
+                [
+                    top_positions[rows],
+                    np.broadcast_to(np.arange(start, end), (len(rows), end - start)),
+                ],
+                axis=1,
+            )
+            top = np.argpartition(dists, k - 1, axis=1)[:, :k]
+            top_dists[rows] = np.take_along_axis(dists, top, axis=1)
+            top_positions[rows] = np.take_along_axis(positions, top, axis=1)
+        order = np.argsort(top_dists, axis=1, kind="stable")
+        return self.list_ids[np.take_along_axis(top_positions, order, axis=1)]
+
+    def _assign(self, centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        _, nearest = compute_ground_truth(
+            centroids, vectors, self.metric, k=1, workers=1, normalized=True
+        )
+        return nearest[:, 0]
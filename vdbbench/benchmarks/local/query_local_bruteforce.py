@@ -0,0 +1,53 @@
+import numpy as np
+
+from vdbbench.benchmarks.query_benchmark import QueryBenchmark
+from vdbbench.datasets import Dataset
+from vdbbench.distance import DistanceMetric
+from vdbbench.groundtruth import compute_ground_truth
+from vdbbench.terraform import DatabaseDeployment, apply_terraform
+
+
+class QueryLocalBruteforce(QueryBenchmark):
+    """An exact in-process backend that answers queries by brute force.
+
+    The train vectors are held in memory, converted with DistanceMetric.normalize, and each batch is
+    answered with blocked matrix multiplications and a top-k merge. This gives an exact baseline with
+    a known cost, and isolates the overhead of the harness itself.
+    """
+
+    metric: DistanceMetric
+    train: np.ndarray
+
+    def run_deploy(self, runner: bool = False) -> dict:
+        if runner:
+            return apply_terraform(DatabaseDeployment.RUNNER_ONLY)
+        return {}
+
+    def init(self, deploy_output: dict):
+        pass
+
+    def load_data(self, dataset: Dataset) -> dict:
+        self.logger.info(f"Loading {len(dataset.train)} vectors into memory")
+        self.metric = dataset.metric
+        self.train = dataset.metric.normalize(dataset.train)
+        return {"memory_bytes": self.train.nbytes}
+
+    def prepare_group(self):
+        pass
+
+    def prepare_query(self):
+        pass
+
+    def query(
+        self, queries: np.ndarray, k: int = 10, block_size: int = 16384
+    ) -> list[list[int]]:
+        _, neighbors = compute_ground_truth(
+            self.train,
+            self.metric.normalize(queries),
+            self.metric,
+            k,
+            block_size=block_size,
+            workers=1,
+            normalized=True,
+        )
+        return neighbors.tolist()
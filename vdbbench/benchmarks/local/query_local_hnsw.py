@@ -0,0 +1,54 @@
+from time import perf_counter
+
+import numpy as np
+
+from vdbbench.benchmarks.local.hnsw import HNSWIndex
+from vdbbench.benchmarks.local.query_local_bruteforce import QueryLocalBruteforce
+from vdbbench.datasets import Dataset
+
+
+class QueryLocalHNSW(QueryLocalBruteforce):
+    """An in-process HNSW backend, see HNSWIndex.
+
+    The parameters are named like those of Elasticsearch, with num_candidates as the size of the
+    candidate list searched by each query.
+    """
+
+    index: HNSWIndex
+
+    def validate_config(self):
+        super().validate_config()
+        defaults = self._get_default_args(self.query)
+        for query_config in self._produce_combinations(self.query_config):
+            k = query_config.get("k", defaults["k"])
+            search = query_config.get("~num_candidates")
+            num_candidates = (
+                search["min"]
+                if search is not None
+                else query_config.get("num_candidates", defaults["num_candidates"])
+            )
+            if num_candidates < k:
+                raise ValueError(
+                    f"Expected num_candidates of at least k ({k}), got {num_candidates}"
+                )
+
+    def load_data(
+        self,
+        dataset: Dataset,
+        ef_construction: int = 100,
+        m: int = 16,
+        seed: int = 0,
+    ) -> dict:
+        self.logger.info(f"Building an HNSW index of {len(dataset.train)} vectors")
+        start_time = perf_counter()
+        self.index = HNSWIndex(dataset.metric, m, ef_construction, seed)
+        self.index.build(dataset.train)
+        return {
+            "build_time": perf_counter() - start_time,
+            "memory_bytes": self.index.memory_bytes,
+        }
+
+    def query(
+        self, queries: np.ndarray, k: int = 10, num_candidates: int = 160
+    ) -> list[list[int]]:
+        return self.index.search(queries, k, num_candidates).tolist()
@@ -0,0 +1,34 @@
+from time import perf_counter
+
+import numpy as np
+
+from vdbbench.benchmarks.local.ivf import IVFFlatIndex
+from vdbbench.benchmarks.local.query_local_bruteforce import QueryLocalBruteforce
+from vdbbench.datasets import Dataset
+
+
+class QueryLocalIVF(QueryLocalBruteforce):
+    """An in-process IVF-Flat backend, see IVFFlatIndex."""
+
+    index: IVFFlatIndex
+
+    def load_data(
+        self,
+        dataset: Dataset,
+        n_lists: int = 1024,
+        kmeans_iterations: int = 10,
+        seed: int = 0,
+    ) -> dict:
+        self.logger.info(f"Building an IVF-Flat index of {len(dataset.train)} vectors")
+        start_time = perf_counter()
+        self.index = IVFFlatIndex(dataset.metric, n_lists, kmeans_iterations, seed)
+        self.index.build(dataset.train)
+        return {
+            "build_time": perf_counter() - start_time,
+            "memory_bytes": self.index.memory_bytes,
+        }
+
+    def query(
+        self, queries: np.ndarray, k: int = 10, nprobe: int = 8
+    ) -> list[list[int]]:
+        return self.index.search(queries, k, nprobe).tolist()
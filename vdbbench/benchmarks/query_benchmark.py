@@ -1,19 +1,35 @@
 from __future__ import annotations
 
+import contextlib
+import copy
 import dataclasses
+import hashlib
 import inspect
 import itertools
 import json
 import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
 from abc import abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
+from pathlib import Path
 from time import perf_counter
 from typing import Literal
 
 import numpy as np
 
 from vdbbench.benchmarks.benchmark import Benchmark
-from vdbbench.datasets import DATASETS, Dataset
+from vdbbench.datasets import Dataset, load_dataset
+from vdbbench.histogram import Histogram
+from vdbbench.scoring import (
+    init_scoring_process,
+    score_batch,
+    score_batch_in_process,
+)
 
 
 class QueryBenchmark(Benchmark):
@@ -28,6 +44,9 @@ class QueryBenchmark(Benchmark):
             // init arguments
         "data": {
             "dataset": <dataset name>,
+            "max_vectors": <optional number of train vectors to keep, with ground truth recomputed for them>,
+            "dataset_args": <optional arguments for parameterized datasets, such as "synthetic">,
+            "write_holdout": <optional number of train vectors at the end of the train set held back from load_data for the write stream>,
             // load_data arguments
         },
         "group": {
@@ -35,8 +54,32 @@ class QueryBenchmark(Benchmark):
         },
         "query": {
             "rounds": <number of rounds to run for each query configuration>,
+            "duration": <optional seconds to run rounds for, instead of a fixed number of rounds>,
+            "ci_width": <optional relative half-width of the latency confidence interval at which to stop early>,
+            "ci_percentile": <latency percentile whose confidence interval is checked for ci_width>,
+            "warmup": <number of warmup rounds, or "auto" to warm up until latency is stable>,
+            "warmup_window": <seconds of queries in each window compared by the auto warmup>,
+            "warmup_tolerance": <relative change of p50 and p99 latency between windows considered stable>,
             "k": <number of nearest neighbors to return for each query>,
             "batch_size": <number of queries to run in each batch>,
+            "concurrency": <number of client workers sending batches concurrently>,
+            "target_qps": <optional target queries per second, enabling the open-loop mode>,
+            "arrival": <"poisson" or "constant" arrival schedule for the open-loop mode>,
+            "max_lateness": <optional seconds behind schedule after which a batch is dropped>,
+            "histogram_digits": <significant digits kept by the latency, recall and relative error histograms>,
+            "raw_samples": <whether to also save every sample of each round to a binary sidecar file in the samples directory>,
+            "scoring": <"deferred" to score after each round's timed phase, or "process" to score in a process pool>,
+            "scoring_workers": <number of processes in the scoring process pool, by default the CPUs not used by query workers>,
+            "preencode": <whether to encode every batch with encode_queries before the round is timed>,
+            "on_error": <"raise" to stop at the first failed batch, or "count" to count failed batches and continue>,
+            "write_qps": <optional vectors per second written by a background write stream during each round>,
+            "write_batch_size": <number of vectors in each call to write>,
+            "delete_fraction": <fraction of write batches that are deleted before being written again>,
+            "timeline_window": <optional seconds per window of the timeline of each round>,
+            "selectivity": <optional fraction of train vectors matched by a filter on each query, if query supports it>,
+            "recall_at": <optional list of cutoffs of at most k to also calculate recall and relative error at>,
+            "ordered": <whether query returns neighbors in increasing order of distance, for MRR and nDCG>,
+            // write arguments
             // query and prepare_query arguments
         },
     }
@@ -44,6 +87,13 @@ class QueryBenchmark(Benchmark):
     For example, the query configuration {"*batch_size": [100, 200], "*k": [10, 20]} will result in the following configurations:
     {"batch_size": 100, "k": 10}, {"batch_size": 100, "k": 20}, {"batch_size": 200, "k": 10}, {"batch_size": 200, "k": 20}.
 
+    "query" also supports one search key per configuration, prefixed with a tilde (~), which searches for the
+    smallest value of a parameter that reaches each of a list of mean recall targets, assuming recall increases
+    with the value. For example, {"~num_candidates": {"min": 10, "max": 1280, "target_recall": [0.9, 0.99]}}
+    bisects (geometrically when min is positive) between min and max until the bracket is narrower than a
+    "tolerance" (default 0.05) relative to its upper end, reusing the results of earlier probes. Only the Pareto points found for the
+    targets are returned, each annotated with the targets it reaches under "search".
+
     load_data is called once for each data configuration.
     For each data configuration, prepare_group is called once for each group configuration.
     For each group configuration, prepare_query and query are called once for each round of queries for each query configuration.
@@ -62,8 +112,115 @@ class QueryBenchmark(Benchmark):
         prepare_group(g2)
             repeat for q1["rounds"]: prepare_query(q1) query(q1)
             repeat for q2["rounds"]: prepare_query(q2) query(q2)
+
+    With "duration" set, rounds are repeated until the duration has passed, and the round in progress
+    stops sending batches at that point. With "ci_width" set, rounds stop early once the 95% confidence
+    interval of the "ci_percentile" latency is narrower than ci_width relative to the percentile itself,
+    which is checked after each round, and otherwise continue up to "rounds" or "duration".
+    Warmup rounds are run before the rounds of each query configuration and are not scored. With "warmup"
+    set to "auto", batches are instead sent in windows of "warmup_window" seconds until the p50 and p99
+    latency of consecutive windows are within "warmup_tolerance" of each other, up to MAX_WARMUP_WINDOWS.
+
+    With "concurrency" greater than 1, each round is run by that many closed-loop client workers,
+    each sending its next batch as soon as its previous one returns.
+    Each worker is a shallow copy of the benchmark on which init_worker has been called.
+
+    With "target_qps" set, batches are instead scheduled at fixed intended send times following the
+    "arrival" schedule, and the workers send each batch at its intended time, or as soon as one is free.
+    Latency is measured from the intended send time, so queueing delay caused by a saturated database
+    (or too few workers) is included rather than hidden. Batches sent more than LATE_THRESHOLD seconds
+    behind schedule are counted as late, and those that would be sent more than "max_lateness" seconds
+    behind schedule are dropped. Sweeping a starred "*target_qps" finds the saturation point, the first
+    rate whose result is marked as saturated: a batch was dropped, or the batches were sent at a rate more
+    than SATURATION_TOLERANCE below the rate of their own schedule (scheduled_qps), which unlike target_qps
+    does not vary with the random gaps of a finite "poisson" schedule.
+
+    Query workers only record the returned neighbor ids and timings while the round is timed. Recall and
+    relative error are calculated after the timed phase of each round, or with "scoring" set to "process",
+    by a pool of forked processes while the round runs, so scoring does not delay or compete with queries.
+
+    With "preencode" set, every batch is encoded into its request payload by encode_queries before the
+    round is timed, and query receives the payload instead of the query vectors, so latency excludes
+    client-side serialization. Payloads are reused by later rounds of the same query configuration.
+
+    The time of each batch is broken down into spans. The harness records the "query" span around each
+    call to query, and query may record its own phases with span (for example, "encode", "request" and
+    "parse") and times reported by the database with record_span (for example, "server"). Each span is
+    summed within a batch and summarized in a histogram per name, so a regression can be attributed to
+    the client, the network or the database.
+
+    With "write_qps" set, a mixed read/write workload is run: while the query workers run, a write stream
+    calls write on its own worker at a constant rate, in batches of "write_batch_size". The last
+    "write_holdout" train vectors of the data configuration are held back from load_data, and each batch
+    inserts the next of them as new documents, or with probability "delete_fraction" deletes the batch
+    written last and inserts it again. The held-back vectors are written once across the rounds and query
+    configurations of a data configuration, and are then written again as updates. Recall and relative
+    error are measured against the ground truth of the vectors given to load_data, so a written vector
+    returned by a query counts as a miss, and recall is a lower bound that loosens as writes accumulate.
+    The latency of each write call is summarized in write_latency, and the number of vectors written in
+    each round in writes.
+    With "timeline_window" set (by default 1 second in the mixed workload mode), each round also reports a
+    timeline of windows with the query latency, recall and writes in each, to show degradation over time
+    and the impact of refreshes and merges.
+
+    With "selectivity" set, queries are filtered: query receives the selectivity and must only return train
+    vectors whose attribute (see Dataset.attributes) is below attribute_limit(selectivity), and recall and
+    relative error are calculated against the ground truth of the matching vectors from Dataset.filtered.
+    Sweeping a starred "*selectivity" reports recall and latency as a function of selectivity. Only
+    subclasses whose query accepts a selectivity argument support filtered queries.
+
+    With "recall_at" set, recall and relative error are also calculated at each cutoff from the same k
+    neighbors, using the cutoff closest neighbors returned, so a single pass with k set to the largest
+    cutoff replaces a query configuration per k. They are reported in rank_metrics as "recall@<cutoff>"
+    and "relative_error@<cutoff>", along with "ndcg@<cutoff>" and "mrr" (the reciprocal rank of the
+    nearest neighbor) when "ordered" is set, as the ranking metrics depend on the order of the neighbors.
+    A database whose search effort depends on k may reach a different recall at a cutoff than a query
+    for only that many neighbors would.
+
+    Subclasses that only measure loading set RUNS_QUERIES to False. Each data and group configuration is
+    then loaded and prepared once, with no query configuration, and only their results are reported.
+    Each group configuration is journaled with the load_result it was prepared after, and a data
+    configuration is only loaded again if one of its group configurations has not completed.
+
+    With "on_error" set to "count", a batch whose query raises an exception is counted as an error
+    instead of stopping the benchmark. Failed batches are excluded from latency and scoring, and the number
+    of errors in each round is reported alongside the late and dropped batches.
     """
 
+    DATA_OPTIONS = {"max_vectors", "dataset_args", "write_holdout"}
+    QUERY_OPTIONS = {
+        "batch_size",
+        "rounds",
+        "duration",
+        "ci_width",
+        "ci_percentile",
+        "warmup",
+        "warmup_window",
+        "warmup_tolerance",
+        "concurrency",
+        "target_qps",
+        "arrival",
+        "max_lateness",
+        "histogram_digits",
+        "raw_samples",
+        "scoring",
+        "scoring_workers",
+        "preencode",
+        "on_error",
+        "write_qps",
+        "write_batch_size",
+        "delete_fraction",
+        "timeline_window",
+        "selectivity",
+        "recall_at",
+        "ordered",
+    }
+    RUNS_QUERIES = True
+    LATE_THRESHOLD = 0.001
+    MAX_WARMUP_WINDOWS = 30
+    CI_Z = 1.96
+    SATURATION_TOLERANCE = 0.05
+
     def __init__(
         self,
         deploy: dict | None = None,
@@ -76,6 +233,18 @@ class QueryBenchmark(Benchmark):
         self.group_config = group or {}
         self.query_config = query or {}
         self.logger = logging.getLogger(type(self).__module__)
+        self._workers: list[QueryBenchmark] = []
+        self._write_worker: QueryBenchmark | None = None
+        # The whole dataset and the number of its train vectors loaded, when the rest are held back for writes
+        self._held_back: tuple[Dataset, int] | None = None
+        self._write_position = 0
+        self._encoded_batches: tuple[str, list] | None = None
+        self._run_id = uuid.uuid4().hex[:8]
+        self._samples_dir: Path | None = None
+        # The data and group configuration of the query configuration being run, for naming sample files
+        self._current_configs: tuple[dict, dict] = ({}, {})
+        # Shared by workers, holds the spans of the batch being run by each thread
+        self._span_state = threading.local()
 
     @abstractmethod
     def run_deploy(self, **kwargs) -> dict:
@@ -91,18 +260,22 @@ class QueryBenchmark(Benchmark):
         """
 
     @abstractmethod
-    def load_data(self, dataset: Dataset, **kwargs):
+    def load_data(self, dataset: Dataset, **kwargs) -> dict | None:
         """Loads the data into the database.
 
         This method should clear the database and load the train data from the given dataset.
+        It may return a dictionary of statistics about the load, such as the build time or memory use
+        of an index, which is reported as the load_result of the data configuration.
         """
 
     @abstractmethod
-    def prepare_group(self, **kwargs):
+    def prepare_group(self, **kwargs) -> dict | None:
         """Does preparation at the start of a group.
 
         This method is called once for each group of queries.
         It can be used to make modifications to the database which don't require the data to be reloaded entirely.
+        It may return a dictionary of statistics about the preparation, such as the time taken to allocate
+        replicas, which is reported as the prepare_result of the group configuration.
         """
 
     @abstractmethod
@@ -127,152 +300,1036 @@ class QueryBenchmark(Benchmark):
             the corresponding row in the query.
         """
 
+    def write(
+        self,
+        ids: np.ndarray,
+        vectors: np.ndarray | None,
+        attributes: np.ndarray | None,
+        **kwargs,
+    ):
+        """Writes a batch of vectors for the write stream of the mixed read/write workload mode.
+
+        Subclasses that support writes override this method, and validate_config rejects "write_qps"
+        for those that do not.
+
+        Args:
+            ids: The train indices of the vectors to write.
+            vectors: The vectors to upsert under ids, or None to delete ids.
+            attributes: The attributes of the vectors (see Dataset.attributes), or None to delete ids.
+            **kwargs: Additional keyword arguments for the write.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support writes")
+
+    def encode_queries(self, queries: np.ndarray, k: int, **kwargs):
+        """Encodes a batch of queries into the payload given to query when "preencode" is set.
+
+        This method is called for every batch before a round is timed, with the same arguments as query.
+        By default, the payload is the query vectors themselves.
+        """
+        return queries
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Times the enclosed code as part of the named span of the current batch.
+
+        Spans recorded outside of a batch are ignored.
+        """
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(name, perf_counter() - start_time)
+
+    def record_span(self, name: str, seconds: float):
+        """Adds a time measured elsewhere, such as by the database, to the named span of the current batch."""
+        spans = getattr(self._span_state, "spans", None)
+        if spans is not None:
+            spans[name] = spans.get(name, 0.0) + seconds
+
+    def init_worker(self):
+        """Initializes a concurrent query worker.
+
+        This method is called on a shallow copy of the benchmark after init, once for each worker
+        needed when "concurrency" is greater than 1.
+        It should replace any connection state so that the worker does not share a connection with others.
+        """
+
     def deploy(self) -> dict:
         self.validate_config()
         return self._call_with_config(self.run_deploy, self.deploy_config)
 
-    def run(self, deploy_output: dict) -> dict:
+    def run(
+        self,
+        deploy_output: dict,
+        journal_path: Path | None = None,
+        samples_dir: Path | None = None,
+    ) -> dict:
+        """Runs the benchmark.
+
+        Args:
+            deploy_output: The output dictionary returned by the deploy method.
+            journal_path: A JSON lines file to append the results of each query configuration to as soon as
+                it completes, or of each group configuration if RUNS_QUERIES is False. Configurations that
+                already have results in the journal are skipped, so a run can be resumed after a failure.
+            samples_dir: The directory to save raw sample files to, by default a directory beside journal_path.
+                Each file is named by the run id, a hash of the configuration and the round, so resumed and
+                repeated runs never overwrite each other's samples.
+
+        Returns:
+            A dictionary containing the results of the benchmark.
+        """
         self._backfill_config(self.deploy_config, self.init)
         self._backfill_config(self.deploy_config, self.run_deploy)
         self._backfill_config(self.data_config, self.load_data)
         self._backfill_config(self.group_config, self.prepare_group)
-        self._backfill_config(self.query_config, self.prepare_query)
-        self._backfill_config(self.query_config, self.query)
+        if self.RUNS_QUERIES:
+            self._backfill_config(self.query_config, self.prepare_query)
+            self._backfill_config(self.query_config, self.query)
+            self._backfill_config(self.query_config, self.encode_queries)
+            if self.query_config.get("write_qps") is not None:
+                self._backfill_config(self.query_config, self.write)
 
         data_configs = self._produce_combinations(self.data_config)
         group_configs = self._produce_combinations(self.group_config)
-        query_configs = self._produce_combinations(self.query_config)
+        query_configs = (
+            self._produce_combinations(self.query_config) if self.RUNS_QUERIES else []
+        )
         self.logger.info(f"{len(data_configs)} data configuration(s)")
         self.logger.info(f"{len(group_configs)} group configuration(s)")
         self.logger.info(f"{len(query_configs)} query configuration(s)")
         self.logger.info(
             f"{len(data_configs) * len(group_configs) * len(query_configs)} total configuration(s)"
         )
+        journal = self._read_journal(journal_path) if journal_path else {}
+        if journal:
+            self.logger.info(
+                f"{len(journal)} configuration(s) already completed in {journal_path}"
+            )
+
+        self._run_id = uuid.uuid4().hex[:8]
+        if samples_dir is None and journal_path is not None:
+            samples_dir = journal_path.with_name(f"{journal_path.stem}_samples")
+        self._samples_dir = samples_dir
 
         self._call_with_config(
             self.init, self.deploy_config, deploy_output=deploy_output
         )
         results = []
         for data_config in data_configs:
-            self.logger.info(f"Running data configuration: {data_config}")
-            dataset_name = data_config["dataset"]
-            dataset = self._load_dataset(dataset_name)
-            self._call_with_config(self.load_data, (data_config | {"dataset": dataset}))
+            dataset = None
+            load_result = None
             group_results = []
             for group_config in group_configs:
-                self.logger.info(f"Running group configuration: {group_config}")
-                self._call_with_config(self.prepare_group, group_config)
+                group_prepared = False
+                prepare_result = None
                 query_results = []
                 for query_config in query_configs:
+                    key = self._journal_key(data_config, group_config, query_config)
+                    if key in journal:
+                        self.logger.info(
+                            f"Skipping completed query configuration: {query_config}"
+                        )
+                        query_results.extend(journal[key])
+                        continue
+                    if dataset is None:
+                        dataset, load_result = self._load_data_config(data_config)
+                    if not group_prepared:
+                        prepare_result = self._prepare_group_config(group_config)
+                        group_prepared = True
                     self.logger.info(f"Running query configuration: {query_config}")
-                    self.logger.info("Running warmup queries")
-                    self._do_queries(dataset, query_config | {"rounds": 1})
-                    self.logger.info("Running actual queries")
-                    query_result = self._do_queries(dataset, query_config)
-                    query_results.append(query_result)
+                    self._current_configs = (data_config, group_config)
+                    # Copy so that defaults filled in while running do not change the journal keys
+                    query_config = dict(query_config)
+                    if any(k.startswith("~") for k in query_config):
+                        new_results = self._search_query_config(dataset, query_config)
+                    else:
+                        new_results = [
+                            self._do_warmup_and_queries(dataset, query_config)
+                        ]
+                    if journal_path:
+                        self._append_journal(
+                            journal_path,
+                            key,
+                            [dataclasses.asdict(r) for r in new_results],
+                        )
+                    query_results.extend(new_results)
+                if not self.RUNS_QUERIES:
+                    key = self._journal_key(data_config, group_config, {})
+                    if key in journal:
+                        self.logger.info(
+                            f"Skipping completed group configuration: {group_config}"
+                        )
+                        (entry,) = journal[key]
+                        prepare_result = entry["prepare_result"]
+                        if dataset is None:
+                            load_result = entry["load_result"]
+                    else:
+                        if dataset is None:
+                            dataset, load_result = self._load_data_config(data_config)
+                        prepare_result = self._prepare_group_config(group_config)
+                        if journal_path:
+                            self._append_journal(
+                                journal_path,
+                                key,
+                                [
+                                    {
+                                        "load_result": load_result,
+                                        "prepare_result": prepare_result,
+                                    }
+                                ],
+                            )
                 group_results.append(
-                    GroupResult(group_config=group_config, queries=query_results)
+                    GroupResult(
+                        group_config=group_config,
+                        queries=query_results,
+                        prepare_result=prepare_result,
+                    )
+                )
+            results.append(
+                DataResult(
+                    data_config=data_config,
+                    groups=group_results,
+                    load_result=load_result,
                 )
-            results.append(DataResult(data_config=data_config, groups=group_results))
+            )
         return dataclasses.asdict(
             QueryBenchmarkResult(deploy_config=self.deploy_config, data=results)
         )
 
-    def _load_dataset(self, dataset: str) -> Dataset:
+    @staticmethod
+    def _journal_key(data_config: dict, group_config: dict, query_config: dict) -> str:
+        return json.dumps(
+            {"data": data_config, "group": group_config, "query": query_config},
+            sort_keys=True,
+        )
+
+    @staticmethod
+    def _read_journal(journal_path: Path) -> dict[str, list[dict]]:
+        journal = {}
+        if not journal_path.exists():
+            return journal
+        content = journal_path.read_bytes()
+        complete_length = content.rfind(b"\n") + 1
+        if complete_length < len(content):
+            # Drop a line left incomplete by an interrupted run so that new entries start on their own line
+            with open(journal_path, "r+b") as f:
+                f.truncate(complete_length)
+        for line in content[:complete_length].splitlines():
+            entry = json.loads(line)
+            journal[entry["key"]] = entry["results"]
+        return journal
+
+    @staticmethod
+    def _append_journal(journal_path: Path, key: str, results: list[dict]):
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"key": key, "results": results}
+        with open(journal_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load_data_config(self, data_config: dict) -> tuple[Dataset, dict | None]:
+        self.logger.info(f"Running data configuration: {data_config}")
+        dataset = self._load_dataset(
+            data_config["dataset"],
+            data_config.get("max_vectors"),
+            data_config.get("dataset_args"),
+        )
+        self._encoded_batches = None
+        # Workers are copies, so they are recreated to see the state set by load_data
+        self._workers = []
+        self._write_worker = None
+        self._write_position = 0
+        self._held_back = None
+        write_holdout = data_config.get("write_holdout")
+        if write_holdout is not None:
+            n_loaded = dataset.train.shape[0] - write_holdout
+            if not 0 < n_loaded < dataset.train.shape[0]:
+                raise ValueError(
+                    f"Expected write_holdout between 1 and {dataset.train.shape[0] - 1}"
+                )
+            self.logger.info(f"Holding back {write_holdout} vectors for writes")
+            self._held_back = (dataset, n_loaded)
+            dataset = dataset.head(n_loaded)
+        load_result = self._call_with_config(
+            self.load_data, (data_config | {"dataset": dataset})
+        )
+        return dataset, load_result
+
+    def _prepare_group_config(self, group_config: dict) -> dict | None:
+        self.logger.info(f"Running group configuration: {group_config}")
+        return self._call_with_config(self.prepare_group, group_config)
+
+    def _load_dataset(
+        self,
+        dataset: str,
+        max_vectors: int | None = None,
+        dataset_args: dict | None = None,
+    ) -> Dataset:
         self.logger.info(f"Loading dataset {dataset}")
-        return DATASETS[dataset]()
+        return load_dataset(dataset, max_vectors, dataset_args)
+
+    def _do_warmup_and_queries(
+        self, dataset: Dataset, query_config: dict
+    ) -> QueryResult:
+        if query_config.get("selectivity") is not None:
+            dataset = dataset.filtered(query_config["selectivity"])
+        self.logger.info("Running warmup queries")
+        self._do_warmup(dataset, query_config)
+        self.logger.info("Running actual queries")
+        return self._do_queries(dataset, query_config)
+
+    def _search_query_config(
+        self, dataset: Dataset, query_config: dict
+    ) -> list[QueryResult]:
+        """Searches for the smallest value of the search key that reaches each recall target.
+
+        Returns:
+            The results of the Pareto points reaching each target, in increasing order of the searched value.
+        """
+        search_keys = [k for k in query_config if k.startswith("~")]
+        if len(search_keys) > 1:
+            raise ValueError(f"Expected at most one search key, got {search_keys}")
+        search_key = search_keys[0]
+        key = search_key[1:]
+        spec = query_config[search_key]
+        min_value = spec["min"]
+        max_value = spec["max"]
+        tolerance = spec.get("tolerance", 0.05)
+        targets = spec["target_recall"]
+        if not isinstance(targets, list):
+            targets = [targets]
+        is_int = isinstance(min_value, int) and isinstance(max_value, int)
+        base_config = {k: v for k, v in query_config.items() if k != search_key}
+        probes: dict[float, QueryResult] = {}
+
+        def probe(value) -> float:
+            if value not in probes:
+                self.logger.info(f"Probing {key} = {value}")
+                probes[value] = self._do_warmup_and_queries(
+                    dataset, base_config | {key: value}
+                )
+            return probes[value].recall["mean"]
+
+        reached: dict[float, list[float]] = {}
+        for target in sorted(targets):
+            if probe(max_value) < target:
+                self.logger.info(
+                    f"Recall target {target} is not reached with {key} = {max_value}"
+                )
+                continue
+            # Narrow the bracket using every earlier probe
+            lower = max((v for v in probes if probe(v) < target), default=min_value)
+            upper = min(v for v in probes if probe(v) >= target)
+            if lower == min_value and probe(min_value) >= target:
+                upper = min_value
+            while upper - lower > tolerance * upper and (
+                not is_int or upper - lower > 1
+            ):
+                if lower > 0:
+                    mid = (lower * upper) ** 0.5
+                else:
+                    mid = (lower + upper) / 2
+                if is_int:
+                    mid = min(max(round(mid), lower + 1), upper - 1)
+                if probe(mid) >= target:
+                    upper = mid
+                else:
+                    lower = mid
+            self.logger.info(f"Recall target {target} is reached with {key} = {upper}")
+            reached.setdefault(upper, []).append(target)
+
+        results = []
+        best_recall = -np.inf
+        for value in sorted(reached):
+            result = probes[value]
+            if result.recall["mean"] <= best_recall:
+                continue
+            best_recall = result.recall["mean"]
+            result.search = {"key": key, "target_recall": reached[value]}
+            results.append(result)
+        if sum(len(t) for t in reached.values()) < len(targets):
+            result = probes[max_value]
+            if result.search is None:
+                result.search = {"key": key, "target_recall": []}
+                results.append(result)
+        self.logger.info(
+            f"Searched {len(probes)} values of {key} for {len(targets)} recall target(s)"
+        )
+        return results
+
+    def _do_warmup(self, dataset: Dataset, query_config: dict):
+        warmup = query_config.setdefault("warmup", 1)
+        if warmup != "auto":
+            for i in range(warmup):
+                self.logger.info(f"Running warmup round {i + 1}/{warmup}")
+                self._do_query_round(dataset, query_config, score=False)
+            return
+        window = query_config.setdefault("warmup_window", 10.0)
+        tolerance = query_config.setdefault("warmup_tolerance", 0.05)
+        self._call_with_config(self.prepare_query, query_config)
+        first_batch = 0
+        previous = None
+        for i in range(self.MAX_WARMUP_WINDOWS):
+            result = self._do_query_round(
+                dataset,
+                query_config,
+                deadline=perf_counter() + window,
+                first_batch=first_batch,
+                prepare=False,
+                score=False,
+            )
+            first_batch += result.n_batches
+            current = np.percentile(result.latency, [50, 99])
+            self.logger.info(
+                f"Warmup window {i + 1}: p50 {current[0]:.6f}s, p99 {current[1]:.6f}s"
+            )
+            if previous is not None and np.all(
+                np.abs(current - previous) <= tolerance * previous
+            ):
+                self.logger.info("Latency is stable, finishing warmup")
+                return
+            previous = current
+        self.logger.warning(
+            f"Latency did not stabilize within {self.MAX_WARMUP_WINDOWS} warmup windows"
+        )
 
     def _do_queries(self, dataset: Dataset, query_config: dict) -> QueryResult:
         rounds = query_config.setdefault("rounds", 1)
         if rounds < 1:
             raise ValueError("Expected at least 1 round")
-        results = []
-        for i in range(rounds):
-            self.logger.info(f"Running query round {i + 1}/{rounds}")
-            results.append(self._do_query_round(dataset, query_config))
-        latency = np.concatenate([r.latency for r in results])
-        recall = np.concatenate([r.recall for r in results])
-        relative_error = np.concatenate([r.relative_error for r in results])
+        duration = query_config.get("duration")
+        ci_width = query_config.get("ci_width")
+        ci_percentile = None
+        if ci_width is not None:
+            ci_percentile = query_config.setdefault("ci_percentile", 99)
+        histogram_digits = query_config.setdefault("histogram_digits", 3)
+        raw_samples = query_config.setdefault("raw_samples", False)
+        if raw_samples and self._samples_dir is None:
+            raise ValueError("raw_samples requires a samples directory or journal path")
+        latency = Histogram(histogram_digits)
+        recall = Histogram(histogram_digits)
+        relative_error = Histogram(histogram_digits)
+        spans: dict[str, Histogram] = {}
+        rank_metrics: dict[str, Histogram] = {}
+        qps = []
+        scheduled_qps = []
+        sent_qps = []
+        late = []
+        dropped = []
+        errors = []
+        write_latency = Histogram(histogram_digits)
+        writes = []
+        timelines = []
+        samples = []
+        latency_ci_width = None
+        deadline = None if duration is None else perf_counter() + duration
+        with self._create_scoring_pool(dataset, query_config) as scoring_pool:
+            for i in itertools.count():
+                if deadline is None:
+                    if i >= rounds:
+                        break
+                    self.logger.info(f"Running query round {i + 1}/{rounds}")
+                else:
+                    if i > 0 and perf_counter() >= deadline:
+                        break
+                    self.logger.info(f"Running query round {i + 1}")
+                result = self._do_query_round(
+                    dataset, query_config, deadline=deadline, scoring_pool=scoring_pool
+                )
+                latency.record_many(result.latency)
+                recall.record_many(result.recall)
+                relative_error.record_many(result.relative_error)
+                for name, values in result.spans.items():
+                    spans.setdefault(name, Histogram(histogram_digits)).record_many(
+                        values
+                    )
+                for name, values in result.rank_metrics.items():
+                    rank_metrics.setdefault(
+                        name, Histogram(histogram_digits)
+                    ).record_many(values)
+                qps.append(result.n_queries / result.duration)
+                if result.scheduled_qps is not None:
+                    scheduled_qps.append(result.scheduled_qps)
+                    sent_qps.append(result.sent_qps)
+                late.append(result.late)
+                dropped.append(result.dropped)
+                errors.append(result.errors)
+                write_latency.record_many(result.write_latency)
+                writes.append(result.writes)
+                if result.timeline is not None:
+                    timelines.append(result.timeline)
+                if raw_samples:
+                    samples.append(self._save_raw_samples(query_config, i, result))
+                if ci_width is not None:
+                    latency_ci_width = self._calc_ci_width(latency, ci_percentile)
+                    self.logger.info(
+                        f"p{ci_percentile} latency confidence interval relative half-width: {latency_ci_width:.4f}"
+                    )
+                    if latency_ci_width <= ci_width:
+                        break
+        saturated = None
+        if query_config.get("target_qps") is not None:
+            saturated = bool(
+                (
+                    scheduled_qps
+                    and np.mean(sent_qps)
+                    < np.mean(scheduled_qps) * (1 - self.SATURATION_TOLERANCE)
+                )
+                or any(dropped)
+            )
+            if saturated:
+                self.logger.info(
+                    f"Saturated at a target of {query_config['target_qps']} QPS"
+                )
         return QueryResult(
             query_config=query_config,
-            latency=latency.tolist(),
-            recall=recall.tolist(),
-            relative_error=relative_error.tolist(),
+            latency=latency.summary(),
+            recall=recall.summary(),
+            relative_error=relative_error.summary(),
+            spans={name: h.summary() for name, h in spans.items()},
+            qps=qps,
+            scheduled_qps=scheduled_qps or None,
+            late=late,
+            dropped=dropped,
+            errors=errors,
+            saturated=saturated,
+            latency_ci_width=latency_ci_width,
+            raw_samples=samples if raw_samples else None,
+            rank_metrics=(
+                {name: h.summary() for name, h in rank_metrics.items()}
+                if query_config["recall_at"] is not None
+                else None
+            ),
+            write_latency=(
+                None
+                if query_config.get("write_qps") is None
+                else write_latency.summary()
+            ),
+            writes=None if query_config.get("write_qps") is None else writes,
+            timeline=timelines or None,
         )
 
-    def _do_query_round(self, dataset: Dataset, query_config: dict) -> QueryRoundResult:
-        epsilon = 1e-3
+    @staticmethod
+    def _create_scoring_pool(
+        dataset: Dataset, query_config: dict
+    ) -> contextlib.AbstractContextManager[Executor | None]:
+        scoring = query_config.setdefault("scoring", "deferred")
+        if scoring == "deferred":
+            return contextlib.nullcontext()
+        if scoring == "process":
+            # Leave a CPU for each query worker, so scoring competes less with the timed queries
+            scoring_workers = query_config.setdefault(
+                "scoring_workers",
+                max(1, os.cpu_count() - query_config.get("concurrency", 1)),
+            )
+            # Forked processes share the dataset arrays with the parent instead of pickling them
+            pool = ProcessPoolExecutor(
+                max_workers=scoring_workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=init_scoring_process,
+                initargs=(dataset,),
+            )
+            # Processes are forked on the first submit, which is done now, before any query worker
+            # threads exist whose locks the children could inherit while held
+            pool.submit(os.getpid).result()
+            return pool
+        raise ValueError(f"Unknown scoring mode: {scoring}")
+
+    def _save_raw_samples(
+        self, query_config: dict, round_index: int, result: QueryRoundResult
+    ) -> str:
+        """Saves the samples of a round to a compressed .npz file in the samples directory.
+
+        Returns:
+            The path of the file.
+        """
+        data_config, group_config = self._current_configs
+        config_hash = hashlib.sha256(
+            self._journal_key(data_config, group_config, query_config).encode()
+        ).hexdigest()[:16]
+        self._samples_dir.mkdir(parents=True, exist_ok=True)
+        path = self._samples_dir / f"{self._run_id}_{config_hash}_{round_index}.npz"
+        np.savez_compressed(
+            path,
+            latency=result.latency,
+            recall=result.recall,
+            relative_error=result.relative_error,
+        )
+        return str(path)
+
+    def _get_workers(self, concurrency: int) -> list[QueryBenchmark]:
+        if concurrency == 1:
+            return [self]
+        while len(self._workers) < concurrency:
+            self.logger.info(f"Initializing query worker {len(self._workers) + 1}")
+            worker = copy.copy(self)
+            worker.init_worker()
+            self._workers.append(worker)
+        return self._workers[:concurrency]
+
+    def _do_query_round(
+        self,
+        dataset: Dataset,
+        query_config: dict,
+        deadline: float | None = None,
+        first_batch: int = 0,
+        prepare: bool = True,
+        score: bool = True,
+        scoring_pool: Executor | None = None,
+    ) -> QueryRoundResult:
+        """Runs a round of queries over the test set.
+
+        Args:
+            dataset: The dataset to query.
+            query_config: The query configuration.
+            deadline: The perf_counter time after which no more batches are sent.
+            first_batch: The batch of the test set to start at, wrapping around to cover every batch once.
+            prepare: Whether to call prepare_query before the round.
+            score: Whether to calculate recall and relative error.
+            scoring_pool: A pool initialized with init_scoring_process to score batches in as they complete,
+                instead of after the timed phase.
+
+        Returns:
+            The results of the batches completed in the round.
+        """
         batch_size = query_config.setdefault("batch_size", 100)
         k = query_config.setdefault(
             "k", self._get_default_args(self.query).get("k", 10)
         )
-        train = dataset.train
+        concurrency = query_config.setdefault("concurrency", 1)
+        if concurrency < 1:
+            raise ValueError("Expected a concurrency of at least 1")
+        on_error = query_config.setdefault("on_error", "raise")
+        if on_error not in ("raise", "count"):
+            raise ValueError(f"Unknown error mode: {on_error}")
+        recall_at = query_config.setdefault("recall_at", None)
+        if recall_at is not None and not all(1 <= c <= k for c in recall_at):
+            raise ValueError(f"Expected recall_at cutoffs between 1 and k ({k})")
+        ordered = query_config.setdefault("ordered", True)
         test = dataset.test
-        dists = dataset.distances
         n_test = test.shape[0]
         n_batches = n_test // batch_size
+        batch_order = (first_batch + np.arange(n_batches)) % max(n_batches, 1)
+        workers = self._get_workers(concurrency)
+        send_offsets = None
+        max_lateness = None
+        if query_config.get("target_qps") is not None:
+            send_offsets = self._get_send_offsets(
+                n_batches,
+                query_config["target_qps"] / batch_size,
+                query_config.setdefault("arrival", "poisson"),
+            )
+            max_lateness = query_config.setdefault("max_lateness", None)
 
-        self.logger.info("Preparing for queries")
-        self._call_with_config(self.prepare_query, query_config)
+        if prepare:
+            self.logger.info("Preparing for queries")
+            self._call_with_config(self.prepare_query, query_config)
+        # Resolved once, since inspecting the signature of query on each batch would be timed
+        query_args = self._get_config_args(
+            self.query, query_config, exclude=["queries"]
+        )
+        encoded_batches = None
+        if query_config.setdefault("preencode", False):
+            encoded_batches = self._encode_batches(test, n_batches, query_config)
+        write_qps = query_config.get("write_qps")
+        if write_qps is not None:
+            if write_qps <= 0:
+                raise ValueError("Expected a positive write_qps")
+            write_batch_size = query_config.setdefault("write_batch_size", 100)
+            delete_fraction = query_config.setdefault("delete_fraction", 0.0)
+            write_args = self._get_config_args(
+                self.write, query_config, exclude=["ids", "vectors", "attributes"]
+            )
+            source, n_loaded = self._held_back
+            write_holdout = source.train.shape[0] - n_loaded
+            write_worker = self._get_write_worker()
+        timeline_window = query_config.setdefault(
+            "timeline_window", None if write_qps is None else 1.0
+        )
 
         self.logger.info(
-            f"Running {n_test} queries in {n_batches} batches of {batch_size}"
+            f"Running {n_test} queries in {n_batches} batches of {batch_size} with {concurrency} worker(s)"
         )
+        # Batch results are indexed by position in batch_order, query results by test index
         latency = np.zeros(n_batches)
-        recall = np.zeros(n_test)
-        relative_error = np.zeros(n_test)
-        for batch_i in range(n_batches):
-            start = batch_i * batch_size
-            end = (batch_i + 1) * batch_size
-            queries = test[start:end]
-            start_time = perf_counter()
-            response = self._call_with_config(self.query, query_config, queries=queries)
-            latency[batch_i] = perf_counter() - start_time
-            assert (
-                len(response) == queries.shape[0]
-            ), f"Expected {queries.shape[0]} responses, got {len(response)}"
-            assert (
-                len(response[0]) == k
-            ), f"Expected {k} neighbors, got {len(response[0])}"
-            for i, neighbor_ids in enumerate(response, start=start):
-                result_vectors = train[neighbor_ids]
-                true_dists = dists[i]
-                query_vector = test[i]
-                result_dists = np.array(
-                    [
-                        dataset.metric(query_vector, result_vector)
-                        for result_vector in result_vectors
-                    ]
+        send_times = np.zeros(n_batches)
+        actual_send_times = np.zeros(n_batches)
+        sent = np.zeros(n_batches, dtype=bool)
+        late = np.zeros(n_batches, dtype=bool)
+        dropped = np.zeros(n_batches, dtype=bool)
+        failed = np.zeros(n_batches, dtype=bool)
+        responses: list[np.ndarray | None] = [None] * n_batches
+        batch_spans: list[dict[str, float] | None] = [None] * n_batches
+        scored = [None] * n_batches
+        positions = iter(range(n_batches))
+        positions_lock = threading.Lock()
+
+        def run_worker(worker: QueryBenchmark):
+            while True:
+                with positions_lock:
+                    position = next(positions, None)
+                if position is None:
+                    return
+                if deadline is not None and perf_counter() >= deadline:
+                    return
+                start = batch_order[position] * batch_size
+                end = start + batch_size
+                queries = test[start:end]
+                if send_offsets is None:
+                    start_time = perf_counter()
+                else:
+                    start_time = round_start_time + send_offsets[position]
+                    behind = perf_counter() - start_time
+                    if behind < 0:
+                        time.sleep(-behind)
+                    elif max_lateness is not None and behind > max_lateness:
+                        dropped[position] = True
+                        continue
+                    elif behind > self.LATE_THRESHOLD:
+                        late[position] = True
+                self._span_state.spans = {}
+                query_start_time = perf_counter()
+                actual_send_times[position] = query_start_time - round_start_time
+                try:
+                    response = worker.query(
+                        queries=(
+                            queries
+                            if encoded_batches is None
+                            else encoded_batches[batch_order[position]]
+                        ),
+                        **query_args,
+                    )
+                except Exception:
+                    if on_error == "raise":
+                        raise
+                    self.logger.debug(f"Batch {position} failed", exc_info=True)
+                    failed[position] = True
+                    self._span_state.spans = None
+                    continue
+                end_time = perf_counter()
+                latency[position] = end_time - start_time
+                send_times[position] = start_time - round_start_time
+                sent[position] = True
+                batch_spans[position] = self._span_state.spans
+                batch_spans[position]["query"] = end_time - query_start_time
+                self._span_state.spans = None
+                assert (
+                    len(response) == queries.shape[0]
+                ), f"Expected {queries.shape[0]} responses, got {len(response)}"
+                assert (
+                    len(response[0]) == k
+                ), f"Expected {k} neighbors, got {len(response[0])}"
+                if not score:
+                    continue
+                if scoring_pool is None:
+                    responses[position] = np.asarray(response)
+                else:
+                    scored[position] = scoring_pool.submit(
+                        score_batch_in_process,
+                        start,
+                        np.asarray(response),
+                        k,
+                        recall_at=recall_at,
+                        ordered=ordered,
+                    )
+
+        write_offsets: list[float] = []
+        write_latency: list[float] = []
+        write_sizes: list[int] = []
+        stop_writes = threading.Event()
+
+        def run_writes():
+            rng = np.random.default_rng()
+            for i in itertools.count():
+                # Writes are sent at a constant rate, or as fast as possible when behind
+                wait = (
+                    round_start_time + i * write_batch_size / write_qps - perf_counter()
+                )
+                if stop_writes.wait(max(wait, 0)):
+                    return
+                # The number of held-back vectors written, counting those written again
+                position = self._write_position
+                delete = position > 0 and rng.random() < delete_fraction
+                if delete:
+                    # The batch written last is deleted and inserted again
+                    start = (position - 1) % write_holdout
+                    start -= start % write_batch_size
+                else:
+                    start = position % write_holdout
+                    if position == write_holdout:
+                        self.logger.info(
+                            "Every held-back vector is written, writing them again as updates"
+                        )
+                ids = n_loaded + np.arange(
+                    start, min(start + write_batch_size, write_holdout)
                 )
-                recall[i] = self._calc_recall(k, true_dists, result_dists, epsilon)
-                relative_error[i] = self._calc_relative_error(
-                    k, true_dists, result_dists, epsilon
+                if not delete:
+                    self._write_position = position + len(ids)
+                write_start_time = perf_counter()
+                if delete:
+                    write_worker.write(
+                        ids=ids, vectors=None, attributes=None, **write_args
+                    )
+                write_worker.write(
+                    ids=ids,
+                    vectors=source.train[ids],
+                    attributes=source.attributes[ids],
+                    **write_args,
                 )
+                write_latency.append(perf_counter() - write_start_time)
+                write_offsets.append(write_start_time - round_start_time)
+                write_sizes.append(len(ids))
 
+        round_start_time = perf_counter()
+        with ThreadPoolExecutor(max_workers=1) as write_executor:
+            writes = None if write_qps is None else write_executor.submit(run_writes)
+            try:
+                if len(workers) == 1:
+                    run_worker(workers[0])
+                else:
+                    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+                        for future in [executor.submit(run_worker, w) for w in workers]:
+                            future.result()
+            finally:
+                stop_writes.set()
+            duration = perf_counter() - round_start_time
+            if writes is not None:
+                writes.result()
+                self.logger.info(
+                    f"Wrote {sum(write_sizes) / duration:.1f} vectors per second"
+                )
+        n_queries = int(np.sum(sent)) * batch_size
+        self.logger.info(f"Achieved {n_queries / duration:.1f} QPS")
+        scheduled_qps = None
+        sent_qps = None
+        attempted = sent | failed
+        if send_offsets is not None and np.sum(attempted) > 1:
+            # Rates from the first to the last batch sent, by schedule and in practice
+            n_attempted = int(np.sum(attempted)) * batch_size
+            scheduled_qps = n_attempted / np.max(send_offsets[attempted])
+            sent_qps = n_attempted / np.max(actual_send_times[attempted])
+            self.logger.info(
+                f"Sent {sent_qps:.1f} QPS on a schedule of {scheduled_qps:.1f} QPS"
+            )
+        if send_offsets is not None:
+            self.logger.info(
+                f"{np.sum(late)} late and {np.sum(dropped)} dropped of {n_batches} batches"
+            )
+        if np.any(failed):
+            self.logger.warning(f"{np.sum(failed)} of {n_batches} batches failed")
+
+        spans: dict[str, list[float]] = {}
+        for position in np.flatnonzero(sent):
+            for name, seconds in batch_spans[position].items():
+                spans.setdefault(name, []).append(seconds)
+
+        completed = np.zeros(n_test, dtype=bool)
+        recall = np.zeros(n_test)
+        relative_error = np.zeros(n_test)
+        rank_metrics: dict[str, np.ndarray] = {}
+        batch_recall = np.full(n_batches, np.nan)
+        for position in np.flatnonzero(sent):
+            start = batch_order[position] * batch_size
+            end = start + batch_size
+            completed[start:end] = True
+            if not score:
+                continue
+            if scoring_pool is None:
+                batch_scores = score_batch(
+                    dataset,
+                    start,
+                    responses[position],
+                    k,
+                    recall_at=recall_at,
+                    ordered=ordered,
+                )
+            else:
+                batch_scores = scored[position].result()
+            recall[start:end], relative_error[start:end], batch_metrics = batch_scores
+            for name, values in batch_metrics.items():
+                rank_metrics.setdefault(name, np.zeros(n_test))[start:end] = values
+            batch_recall[position] = np.mean(recall[start:end])
+        timeline = None
+        if timeline_window is not None:
+            timeline = self._get_timeline(
+                timeline_window,
+                send_times[sent],
+                latency[sent],
+                batch_recall[sent],
+                np.array(write_offsets),
+                np.array(write_latency),
+                np.array(write_sizes, dtype=np.int64),
+            )
         return QueryRoundResult(
-            latency=latency,
-            recall=recall,
-            relative_error=relative_error,
+            latency=latency[sent],
+            recall=recall[completed],
+            relative_error=relative_error[completed],
+            spans={name: np.array(values) for name, values in spans.items()},
+            n_batches=int(np.sum(sent | dropped | failed)),
+            n_queries=n_queries,
+            duration=duration,
+            late=int(np.sum(late)),
+            dropped=int(np.sum(dropped)),
+            errors=int(np.sum(failed)),
+            scheduled_qps=scheduled_qps,
+            sent_qps=sent_qps,
+            rank_metrics={
+                name: values[completed] for name, values in rank_metrics.items()
+            },
+            write_latency=np.array(write_latency),
+            writes=sum(write_sizes),
+            timeline=timeline,
         )
 
-    def _calc_recall(
-        self, k: int, true_dists: np.ndarray, result_dists: np.ndarray, epsilon: float
-    ) -> float:
-        threshold_dist = true_dists[k - 1] * (1 + epsilon)
-        return np.sum(result_dists <= threshold_dist) / k
-
-    def _calc_relative_error(
-        self, k: int, true_dists: np.ndarray, result_dists: np.ndarray, epsilon: float
-    ) -> float:
-        true_total_dist = np.sum(true_dists[:k])
-        result_total_dist = np.sum(result_dists)
-        relative_error = (result_total_dist - true_total_dist) / true_total_dist
-        assert (
-            relative_error >= -epsilon
-        ), f"Relative error is negative: {relative_error}"
-        if relative_error < 0:
-            return 0
-        return relative_error
+    def _get_write_worker(self) -> QueryBenchmark:
+        if self._write_worker is None:
+            self.logger.info("Initializing write worker")
+            self._write_worker = copy.copy(self)
+            self._write_worker.init_worker()
+        return self._write_worker
+
+    @staticmethod
+    def _get_timeline(
+        window: float,
+        send_times: np.ndarray,
+        latency: np.ndarray,
+        batch_recall: np.ndarray,
+        write_offsets: np.ndarray,
+        write_latency: np.ndarray,
+        write_sizes: np.ndarray,
+    ) -> list[dict]:
+        """Summarizes the batches and writes of a round in windows of window seconds by their send time.
+
+        Returns:
+            For each window from the start of the round, the number of batches and their p50 and p99 latency
+            and mean recall, and the number of vectors written and the mean latency of the writes, with
+            None for the statistics of empty windows.
+        """
+        if window <= 0:
+            raise ValueError("Expected a positive timeline_window")
+        batch_windows = (send_times // window).astype(np.int64)
+        write_windows = (write_offsets // window).astype(np.int64)
+        n_windows = (
+            max(batch_windows.max(initial=-1), write_windows.max(initial=-1)) + 1
+        )
+        timeline = []
+        for i in range(n_windows):
+            in_window = batch_windows == i
+            writes_in_window = write_windows == i
+            has_batches = bool(np.any(in_window))
+            has_recall = has_batches and not np.all(np.isnan(batch_recall[in_window]))
+            timeline.append(
+                {
+                    "start": i * window,
+                    "batches": int(np.sum(in_window)),
+                    "latency_p50": (
+                        float(np.percentile(latency[in_window], 50))
+                        if has_batches
+                        else None
+                    ),
+                    "latency_p99": (
+                        float(np.percentile(latency[in_window], 99))
+                        if has_batches
+                        else None
+                    ),
+                    "recall_mean": (
+                        float(np.nanmean(batch_recall[in_window]))
+                        if has_recall
+                        else None
+                    ),
+                    "writes": int(np.sum(write_sizes[writes_in_window])),
+                    "write_latency_mean": (
+                        float(np.mean(write_latency[writes_in_window]))
+                        if np.any(writes_in_window)
+                        else None
+                    ),
+                }
+            )
+        return timeline
+
+    def _encode_batches(
+        self, test: np.ndarray, n_batches: int, query_config: dict
+    ) -> list:
+        """Encodes each batch of the test set with encode_queries, reusing the last payloads if still valid.
+
+        Returns:
+            The payload of each batch, indexed by batch.
+        """
+        batch_size = query_config["batch_size"]
+        arg_names = self._get_arg_names(self.encode_queries)
+        key = json.dumps(
+            {k: v for k, v in query_config.items() if k in arg_names}
+            | {"batch_size": batch_size, "n_batches": n_batches},
+            sort_keys=True,
+        )
+        if self._encoded_batches is None or self._encoded_batches[0] != key:
+            self.logger.info(f"Encoding {n_batches} batches")
+            # Release the previous payloads before encoding the new ones
+            self._encoded_batches = None
+            self._encoded_batches = (
+                key,
+                [
+                    self._call_with_config(
+                        self.encode_queries,
+                        query_config,
+                        queries=test[i * batch_size : (i + 1) * batch_size],
+                    )
+                    for i in range(n_batches)
+                ],
+            )
+        return self._encoded_batches[1]
+
+    @staticmethod
+    def _get_send_offsets(
+        n_batches: int, batch_rate: float, arrival: Literal["poisson", "constant"]
+    ) -> np.ndarray:
+        """Produces the intended send time of each batch, relative to the start of the round.
+
+        Args:
+            n_batches: The number of batches to schedule.
+            batch_rate: The target number of batches per second.
+            arrival: "constant" for evenly spaced batches, or "poisson" for exponentially distributed gaps.
+
+        Returns:
+            The send offsets in seconds, with shape (n_batches,).
+        """
+        if batch_rate <= 0:
+            raise ValueError("Expected a positive target_qps")
+        if arrival == "constant":
+            return np.arange(n_batches) / batch_rate
+        if arrival == "poisson":
+            gaps = np.random.default_rng().exponential(1 / batch_rate, n_batches)
+            return np.cumsum(gaps) - gaps[:1]
+        raise ValueError(f"Unknown arrival schedule: {arrival}")
+
+    def _calc_ci_width(self, latency: Histogram, percentile: float) -> float:
+        """Calculates the relative half-width of the confidence interval of a latency percentile.
+
+        The interval is between the order statistics whose ranks are CI_Z standard deviations
+        of the binomial distribution away from the rank of the percentile.
+
+        Returns:
+            The relative half-width, or infinity if there are too few samples for either end of the
+            interval to be within the samples, or if the percentile is zero.
+        """
+        n = latency.count
+        p = percentile / 100
+        rank_deviation = self.CI_Z * np.sqrt(n * p * (1 - p))
+        if n == 0 or n * p - rank_deviation < 0 or n * p + rank_deviation > n:
+            self.logger.info(
+                f"Too few samples ({n}) for the p{percentile} latency confidence interval, not stopping early"
+            )
+            return np.inf
+        value = latency.percentile(percentile)
+        if value <= 0:
+            self.logger.info(
+                f"p{percentile} latency is {value}, not stopping early on its confidence interval"
+            )
+            return np.inf
+        lower = latency.percentile((n * p - rank_deviation) / n * 100)
+        upper = latency.percentile((n * p + rank_deviation) / n * 100)
+        return (upper - lower) / (2 * value)
 
     @staticmethod
     def _produce_combinations(config: dict) -> list[dict]:
@@ -309,8 +1366,17 @@ class QueryBenchmark(Benchmark):
         ]
 
     def validate_config(self):
-        if any(k.startswith("*") for k in self.deploy_config.keys()):
-            raise ValueError("Starred keys are not allowed in deploy configuration")
+        if any(k.startswith(("*", "~")) for k in self.deploy_config.keys()):
+            raise ValueError(
+                "Starred and search keys are not allowed in deploy configuration"
+            )
+        if any(
+            k.startswith("~")
+            for k in itertools.chain(self.data_config, self.group_config)
+        ):
+            raise ValueError("Search keys are only allowed in query configuration")
+        if not self.RUNS_QUERIES and self.query_config:
+            raise ValueError(f"{type(self).__name__} does not run queries")
         self._validate_config_has_required_keys(
             self.deploy_config,
             self._get_required_arg_names(self.run_deploy)
@@ -328,7 +1394,9 @@ class QueryBenchmark(Benchmark):
             self.data_config, self._get_required_arg_names(self.load_data), "data"
         )
         self._validate_all_config_values_used(
-            self.data_config, self._get_arg_names(self.load_data), "data"
+            self.data_config,
+            self.DATA_OPTIONS | self._get_arg_names(self.load_data),
+            "data",
         )
 
         self._validate_config_has_required_keys(
@@ -349,23 +1417,35 @@ class QueryBenchmark(Benchmark):
         )
         self._validate_all_config_values_used(
             self.query_config,
-            {"batch_size", "rounds"}
+            self.QUERY_OPTIONS
             | self._get_arg_names(self.query)
+            | self._get_arg_names(self.encode_queries)
+            | self._get_arg_names(self.write)
             | self._get_arg_names(self.prepare_query),
             "query",
         )
+        if any(
+            k.lstrip("*~") == "selectivity" for k in self.query_config
+        ) and "selectivity" not in self._get_arg_names(self.query):
+            raise ValueError(f"{type(self).__name__} does not support filtered queries")
+        if any(k.lstrip("*~") == "write_qps" for k in self.query_config):
+            if type(self).write is QueryBenchmark.write:
+                raise ValueError(f"{type(self).__name__} does not support writes")
+            if not any(k.lstrip("*") == "write_holdout" for k in self.data_config):
+                raise ValueError(
+                    "Writes need vectors held back from the load, set data.write_holdout"
+                )
 
     @classmethod
     def _call_with_config(cls, f, config: dict, **kwargs):
+        return f(**cls._get_config_args(f, config, exclude=kwargs.keys()), **kwargs)
+
+    @classmethod
+    def _get_config_args(cls, f, config: dict, exclude=()) -> dict:
+        """Backfills config with the defaults of f and returns the values of config that f accepts."""
         cls._backfill_config(config, f)
-        return f(
-            **{
-                k: v
-                for k, v in config.items()
-                if k in cls._get_arg_names(f) and k not in kwargs
-            },
-            **kwargs,
-        )
+        arg_names = cls._get_arg_names(f) - set(exclude)
+        return {k: v for k, v in config.items() if k in arg_names}
 
     @classmethod
     def _backfill_config(cls, config: dict, f):
@@ -373,6 +1453,7 @@ class QueryBenchmark(Benchmark):
             if (
                 k not in config
                 and f"*{k}" not in config
+                and f"~{k}" not in config
                 and cls._is_json_serializable(v)
             ):
                 config[k] = v
@@ -412,7 +1493,7 @@ class QueryBenchmark(Benchmark):
     def _validate_config_has_required_keys(
         config: dict, required: set[str], prefix: str
     ):
-        missing = required - set(config.keys())
+        missing = required - set(k.lstrip("*~") for k in config.keys())
         if missing:
             raise ValueError(
                 f"Missing required configuration values: {prefix}.({', '.join(missing)})"
@@ -420,7 +1501,7 @@ class QueryBenchmark(Benchmark):
 
     @staticmethod
     def _validate_all_config_values_used(config: dict, used: set[str], prefix: str):
-        unused = set(k[1:] if k.startswith("*") else k for k in config.keys()) - used
+        unused = set(k.lstrip("*~") for k in config.keys()) - used
         if unused:
             raise ValueError(
                 f"Unused configuration values: {prefix}.({', '.join(unused)})"
@@ -437,20 +1518,36 @@ class QueryBenchmarkResult:
 class DataResult:
     data_config: dict
     groups: list[GroupResult]
+    load_result: dict | None = None
 
 
 @dataclass
 class GroupResult:
     group_config: dict
     queries: list[QueryResult]
+    prepare_result: dict | None = None
 
 
 @dataclass
 class QueryResult:
     query_config: dict
-    latency: list[float]
-    recall: list[float]
-    relative_error: list[float]
+    latency: dict
+    recall: dict
+    relative_error: dict
+    spans: dict[str, dict]
+    qps: list[float]
+    late: list[int]
+    dropped: list[int]
+    errors: list[int]
+    saturated: bool | None
+    latency_ci_width: float | None
+    raw_samples: list[str] | None
+    scheduled_qps: list[float] | None = None
+    rank_metrics: dict[str, dict] | None = None
+    write_latency: dict | None = None
+    writes: list[int] | None = None
+    timeline: list[list[dict]] | None = None
+    search: dict | None = None
 
 
 @dataclass
@@ -458,3 +1555,16 @@ class QueryRoundResult:
     latency: np.ndarray
     recall: np.ndarray
     relative_error: np.ndarray
+    spans: dict[str, np.ndarray]
+    n_batches: int
+    n_queries: int
+    duration: float
+    late: int
+    dropped: int
+    errors: int
+    scheduled_qps: float | None
+    sent_qps: float | None
+    rank_metrics: dict[str, np.ndarray]
+    write_latency: np.ndarray
+    writes: int
+    timeline: list[dict] | None
@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from typing import Literal
+
+import numpy as np
+
+from vdbbench.benchmarks.query_benchmark import QueryBenchmark
+from vdbbench.datasets import Dataset
+from vdbbench.terraform import DatabaseDeployment, apply_terraform
+
+
+class SimulatedFailure(RuntimeError):
+    pass
+
+
+class QuerySimulated(QueryBenchmark):
+    """A simulated backend with known latency, recall and failure distributions.
+
+    Each batch is answered from the ground truth of the dataset after sleeping for a service time drawn from
+    the "latency_distribution": "constant" (always latency), "lognormal" (median latency and shape
+    latency_sigma, so mean latency * exp(latency_sigma ** 2 / 2)), or "bimodal" (latency, or slow_latency
+    with probability slow_fraction). With probability spike_probability, spike_latency is added as a tail spike.
+
+    Each query returns its nearest true neighbors with the rest replaced by distractors drawn at random from
+    the other train vectors, so that the mean recall is "recall" (unless the dataset has ties at the k-th
+    distance). With probability failure_probability, a batch raises SimulatedFailure instead.
+
+    With "capacity" set at deploy, at most that many batches are served at once across all workers and the
+    others wait in a queue, as in an M/G/c queue when combined with an open-loop "target_qps". The waiting
+    and serving times are recorded as the "queue" and "service" spans.
+    """
+
+    capacity: threading.Semaphore | None
+    neighbors: np.ndarray
+    test_ids: dict[bytes, int]
+    rng: np.random.Generator
+
+    def run_deploy(self, runner: bool = False, capacity: int = 0) -> dict:
+        output = apply_terraform(DatabaseDeployment.RUNNER_ONLY) if runner else {}
+        return output | {"capacity": capacity}
+
+    def init(self, deploy_output: dict):
+        capacity = deploy_output["capacity"]
+        self.capacity = threading.Semaphore(capacity) if capacity > 0 else None
+
+    def init_worker(self):
+        # Generators are not thread safe, so each worker draws from its own stream
+        self.rng = self.rng.spawn(1)[0]
+
+    def load_data(self, dataset: Dataset, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.n_train = dataset.train.shape[0]
+        self.neighbors = dataset.neighbors
+        self.test_ids = {row.tobytes(): i for i, row in enumerate(dataset.test)}
+
+    def prepare_group(self):
+        pass
+
+    def prepare_query(self):
+        pass
+
+    def query(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        latency_distribution: Literal["constant", "lognormal", "bimodal"] = "lognormal",
+        latency: float = 0.01,
+        latency_sigma: float = 0.5,
+        slow_latency: float = 0.1,
+        slow_fraction: float = 0.1,
+        spike_probability: float = 0.0,
+        spike_latency: float = 1.0,
+        recall: float = 1.0,
+        failure_probability: float = 0.0,
+    ) -> list[list[int]]:
+        if not 0 <= recall <= 1:
+            raise ValueError("Expected a recall between 0 and 1")
+        service_time = self._sample_latency(
+            latency_distribution, latency, latency_sigma, slow_latency, slow_fraction
+        )
+        if self.rng.random() < spike_probability:
+            service_time += spike_latency
+        failed = self.rng.random() < failure_probability
+
+        with self.span("queue"):
+            if self.capacity is not None:
+                self.capacity.acquire()
+        try:
+            with self.span("service"):
+                time.sleep(service_time)
+        finally:
+            if self.capacity is not None:
+                self.capacity.release()
+        if failed:
+            raise SimulatedFailure("Simulated failure")
+
+        # Keep floor(recall * k) true neighbors, plus one more with the remaining probability
+        n_true = math.floor(recall * k) + (
+            self.rng.random(len(queries)) < recall * k - math.floor(recall * k)
+        )
+        results = []
+        for query, n in zip(queries, n_true):
+            true_neighbors = self.neighbors[self.test_ids[query.tobytes()], :k]
+            results.append(
+                true_neighbors[:n].tolist()
+                + self._sample_distractors(true_neighbors, k - n)
+            )
+        return results
+
+    def _sample_latency(
+        self,
+        distribution: str,
+        latency: float,
+        sigma: float,
+        slow_latency: float,
+        slow_fraction: float,
+    ) -> float:
+        if distribution == "constant":
+            return latency
+        if distribution == "lognormal":
+            return self.rng.lognormal(math.log(latency), sigma)
+        if distribution == "bimodal":
+            return slow_latency if self.rng.random() < slow_fraction else latency
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+
+    def _sample_distractors(self, true_neighbors: np.ndarray, n: int) -> list[int]:
+        excluded = set(true_neighbors.tolist())
+        if self.n_train - len(excluded) < n:
+            raise ValueError("Not enough train vectors for distractors")
+        distractors = []
+        while len(distractors) < n:
+            candidate = int(self.rng.integers(self.n_train))
+            if candidate not in excluded:
+                excluded.add(candidate)
+                distractors.append(candidate)
+        return distractors
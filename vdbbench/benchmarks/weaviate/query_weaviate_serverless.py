@@ -23,9 +23,18 @@ class QueryWeaviateServerless(QueryBenchmark):
         if not wcs_api_key:
             raise ValueError("wcs_api_key is required")
 
-        self.client = weaviate.connect_to_wcs(
-            cluster_url=wcs_url,
-            auth_credentials=weaviate.auth.AuthApiKey(api_key=wcs_api_key),
+        self.wcs_url = wcs_url
+        self.wcs_api_key = wcs_api_key
+        self.client = self._connect()
+
+    def init_worker(self):
+        self.client = self._connect()
+        self.collection = self.client.collections.get(name=self.COLLECTION_NAME)
+
+    def _connect(self) -> WeaviateClient:
+        return weaviate.connect_to_wcs(
+            cluster_url=self.wcs_url,
+            auth_credentials=weaviate.auth.AuthApiKey(api_key=self.wcs_api_key),
         )
 
     def load_data(self, dataset: Dataset, ef_construction: int = 100, m: int = 16, ef: int = -1):
@@ -47,7 +56,10 @@ class QueryWeaviateServerless(QueryBenchmark):
                 max_connections=m,
                 distance_metric={
                     DistanceMetric.Euclidean: wc.VectorDistances.L2_SQUARED,
+                    DistanceMetric.SquaredEuclidean: wc.VectorDistances.L2_SQUARED,
                     DistanceMetric.Angular: wc.VectorDistances.COSINE,
+                    DistanceMetric.InnerProduct: wc.VectorDistances.DOT,
+                    DistanceMetric.Hamming: wc.VectorDistances.HAMMING,
                 }[dataset.metric],
             ),
         )
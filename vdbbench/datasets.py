@@ -1,16 +1,34 @@
+import hashlib
+import inspect
+import json
 import logging
+import re
+import time
 from pathlib import Path
-from typing import Callable, TypeAlias
+from typing import Callable, Literal, TypeAlias
 
 import h5py
 import numpy as np
 import requests
 
 from vdbbench.distance import DistanceMetric
+from vdbbench.groundtruth import load_or_compute_ground_truth
 
 logger = logging.getLogger(__name__)
 
 DOWNLOAD_DIR = Path("/tmp/vdbbench/datasets")
+GROUND_TRUTH_DIR = DOWNLOAD_DIR / "ground_truth"
+
+BIGANN_URL = "https://dl.fbaipublicfiles.com/billion-scale-ann-benchmarks"
+DEEP_URL = "https://storage.yandexcloud.net/yandex-research/ann-datasets"
+SPACEV_URL = (
+    "https://comp21storage.blob.core.windows.net/publiccontainer/comp21/spacev1b"
+)
+BIGANN_DTYPES = {
+    ".fbin": np.float32,
+    ".u8bin": np.uint8,
+    ".i8bin": np.int8,
+}
 
 
 DATASETS = {
@@ -39,44 +57,639 @@ DATASETS = {
         "https://ann-benchmarks.com/fashion-mnist-784-euclidean.hdf5",
         DistanceMetric.Euclidean,
     ),
+    "bigann-10M": lambda max_vectors=10_000_000, stride=1: load_from_bigann(
+        "bigann",
+        f"{BIGANN_URL}/bigann/base.1B.u8bin",
+        f"{BIGANN_URL}/bigann/query.public.10K.u8bin",
+        f"{BIGANN_URL}/bigann/GT.public.1B.ibin",
+        DistanceMetric.Euclidean,
+        max_vectors=max_vectors,
+        stride=stride,
+    ),
+    "bigann-1B": lambda max_vectors=None, stride=1: load_from_bigann(
+        "bigann",
+        f"{BIGANN_URL}/bigann/base.1B.u8bin",
+        f"{BIGANN_URL}/bigann/query.public.10K.u8bin",
+        f"{BIGANN_URL}/bigann/GT.public.1B.ibin",
+        DistanceMetric.Euclidean,
+        max_vectors=max_vectors,
+        stride=stride,
+    ),
+    "deep-10M": lambda max_vectors=10_000_000, stride=1: load_from_bigann(
+        "deep",
+        f"{DEEP_URL}/DEEP/base.1B.fbin",
+        f"{DEEP_URL}/DEEP/query.public.10K.fbin",
+        f"{DEEP_URL}/deep_new_groundtruth.public.10K.bin",
+        DistanceMetric.Euclidean,
+        max_vectors=max_vectors,
+        stride=stride,
+    ),
+    "deep-1B": lambda max_vectors=None, stride=1: load_from_bigann(
+        "deep",
+        f"{DEEP_URL}/DEEP/base.1B.fbin",
+        f"{DEEP_URL}/DEEP/query.public.10K.fbin",
+        f"{DEEP_URL}/deep_new_groundtruth.public.10K.bin",
+        DistanceMetric.Euclidean,
+        max_vectors=max_vectors,
+        stride=stride,
+    ),
+    "msspacev-10M": lambda max_vectors=10_000_000, stride=1: load_from_bigann(
+        "msspacev",
+        f"{SPACEV_URL}/spacev1b_base.i8bin",
+        f"{SPACEV_URL}/query.i8bin",
+        f"{SPACEV_URL}/public_query_gt100.bin",
+        DistanceMetric.Euclidean,
+        max_vectors=max_vectors,
+        stride=stride,
+    ),
+    "msspacev-1B": lambda max_vectors=None, stride=1: load_from_bigann(
+        "msspacev",
+        f"{SPACEV_URL}/spacev1b_base.i8bin",
+        f"{SPACEV_URL}/query.i8bin",
+        f"{SPACEV_URL}/public_query_gt100.bin",
+        DistanceMetric.Euclidean,
+        max_vectors=max_vectors,
+        stride=stride,
+    ),
+    "synthetic": lambda **kwargs: load_synthetic(**kwargs),
 }
 
 
 class Dataset:
+    """A dataset of train vectors, test queries and the true nearest neighbors of each query.
+
+    Each array can be given either in memory or as the path of a .npy file, which is memory-mapped
+    read-only the first time it is accessed.
+
+    Each train vector also has a synthetic integer attribute for filtered queries, drawn uniformly from
+    [0, ATTRIBUTE_VALUES) with ATTRIBUTE_SEED, so a filter on the attribute being below attribute_limit
+    of a selectivity matches that fraction of the train vectors.
+    """
+
     def __init__(
         self,
         metric: DistanceMetric,
-        train: np.ndarray,
-        test: np.ndarray,
-        distances: np.ndarray,
-        neighbors: np.ndarray,
+        train: np.ndarray | Path,
+        test: np.ndarray | Path,
+        distances: np.ndarray | Path,
+        neighbors: np.ndarray | Path,
     ):
         self.metric = metric
-        self.train = train
-        self.test = test
-        self.distances = distances
-        self.neighbors = neighbors
+        self._arrays = {
+            "train": train,
+            "test": test,
+            "distances": distances,
+            "neighbors": neighbors,
+        }
+        self._filtered: dict[float, Dataset] = {}
+
+    @property
+    def train(self) -> np.ndarray:
+        return self._get_array("train")
+
+    @property
+    def test(self) -> np.ndarray:
+        return self._get_array("test")
+
+    @property
+    def distances(self) -> np.ndarray:
+        return self._get_array("distances")
+
+    @property
+    def neighbors(self) -> np.ndarray:
+        return self._get_array("neighbors")
 
     @property
     def dims(self):
         return self.train.shape[1]
 
+    @property
+    def attributes(self) -> np.ndarray:
+        if "attributes" not in self._arrays:
+            self._arrays["attributes"] = synthetic_attributes(self.train.shape[0])
+        return self._arrays["attributes"]
+
+    def filtered(self, selectivity: float) -> "Dataset":
+        """Creates a dataset whose ground truth only includes the train vectors matching a filter.
+
+        The filter matches the train vectors whose attribute is below attribute_limit(selectivity).
+        The train vectors, attributes and test set are the same as this dataset's, so the neighbor
+        ids are still indices of the whole train set. The ground truth is computed over the matching
+        train vectors, gathered a block at a time, or loaded from GROUND_TRUTH_DIR if it was computed before.
+
+        Raises:
+            ValueError: If fewer train vectors match than there are neighbors in the ground truth.
+        """
+        if selectivity not in self._filtered:
+            k = self.neighbors.shape[1]
+            matching = np.flatnonzero(self.attributes < attribute_limit(selectivity))
+            if matching.shape[0] < k:
+                raise ValueError(
+                    f"Only {matching.shape[0]} train vectors match a selectivity of {selectivity}, expected at least {k}"
+                )
+            distances, neighbors = load_or_compute_ground_truth(
+                self.train, self.test, self.metric, GROUND_TRUTH_DIR, k, matching
+            )
+            dataset = Dataset(self.metric, self.train, self.test, distances, neighbors)
+            dataset._arrays["attributes"] = self.attributes
+            self._filtered[selectivity] = dataset
+        return self._filtered[selectivity]
+
+    def subset(self, max_vectors: int | None = None, stride: int = 1) -> "Dataset":
+        """Creates a dataset of every stride-th train vector, up to max_vectors of them, with the same test set.
+
+        The train vectors are a view of this dataset's, and the ground truth is recomputed for them,
+        or loaded from GROUND_TRUTH_DIR if it was computed before.
+        """
+        train = self.train[::stride][:max_vectors]
+        if train.shape[0] == self.train.shape[0]:
+            return self
+        distances, neighbors = load_or_compute_ground_truth(
+            train,
+            self.test,
+            self.metric,
+            GROUND_TRUTH_DIR,
+            k=self.neighbors.shape[1],
+        )
+        return Dataset(self.metric, train, self.test, distances, neighbors)
+
+    def head(self, n: int) -> "Dataset":
+        """Creates a dataset of the first n train vectors and their attributes, with the same test set.
+
+        The ground truth is recomputed for them, or loaded from GROUND_TRUTH_DIR if it was computed before.
+        """
+        dataset = self.subset(n)
+        if dataset is not self:
+            dataset._arrays["attributes"] = self.attributes[:n]
+        return dataset
 
-DatasetLoader: TypeAlias = Callable[[], Dataset]
+    def _get_array(self, name: str) -> np.ndarray:
+        array = self._arrays[name]
+        if isinstance(array, Path):
+            array = np.load(array, mmap_mode="r")
+            self._arrays[name] = array
+        return array
 
 
-def load_from_hdf5(name: str, url: str, metric: DistanceMetric) -> Dataset:
+DatasetLoader: TypeAlias = Callable[..., Dataset]
+
+_loaded_datasets: dict[tuple[str, str, int | None], Dataset] = {}
+
+ARRAY_NAMES = ("train", "test", "distances", "neighbors")
+CONVERT_CHUNK_BYTES = 64 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+DOWNLOAD_ATTEMPTS = 5
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_LOG_INTERVAL = 10
+SYNTHETIC_CHUNK_ROWS = 65536
+SYNTHETIC_CENTER_SPREAD = 4.0
+SYNTHETIC_NOISE = 0.01
+ATTRIBUTE_VALUES = 1000
+ATTRIBUTE_SEED = 0
+
+
+def load_dataset(
+    name: str, max_vectors: int | None = None, dataset_args: dict | None = None
+) -> Dataset:
+    """Loads a dataset from DATASETS, reusing the dataset already loaded in this process if there is one.
+
+    Args:
+        name: The name of the dataset.
+        max_vectors: The number of train vectors to keep, with ground truth recomputed for them.
+            For loaders that take max_vectors themselves, it limits theirs instead, so that the ground
+            truth is only computed for the final subset.
+        dataset_args: Keyword arguments for the loader of parameterized datasets, such as "synthetic", or
+            "max_vectors" and "stride" for the big-ann-benchmarks datasets, which select the base vectors in
+            load_from_bigann, downloading only the needed prefix of the base file when stride is 1.
+    """
+    dataset_args = dataset_args or {}
+    key = (name, json.dumps(dataset_args, sort_keys=True), max_vectors)
+    if key not in _loaded_datasets:
+        parameters = inspect.signature(DATASETS[name]).parameters
+        if max_vectors is None:
+            _loaded_datasets[key] = DATASETS[name](**dataset_args)
+        elif "max_vectors" in parameters:
+            limit = dataset_args.get("max_vectors", parameters["max_vectors"].default)
+            if limit is not None:
+                max_vectors = min(max_vectors, limit)
+            _loaded_datasets[key] = load_dataset(
+                name, dataset_args=dataset_args | {"max_vectors": max_vectors}
+            )
+        else:
+            _loaded_datasets[key] = load_dataset(
+                name, dataset_args=dataset_args
+            ).subset(max_vectors)
+    return _loaded_datasets[key]
+
+
+def load_from_hdf5(
+    name: str, url: str, metric: DistanceMetric, sha256: str | None = None
+) -> Dataset:
     DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
     dl_file = DOWNLOAD_DIR / name
-    if dl_file.exists():
-        logger.info(f"Using existing dataset file {dl_file}")
-    else:
-        response = requests.get(url)
+    npy_dir = dl_file.with_suffix(".npy.d")
+    if npy_dir.exists():
+        logger.info(f"Using existing converted dataset {npy_dir}")
+        return load_from_npy(npy_dir, metric)
+    download_file(url, dl_file, sha256)
+    convert_hdf5_to_npy(dl_file, npy_dir)
+    return load_from_npy(npy_dir, metric)
+
+
+def download_file(
+    url: str, path: Path, sha256: str | None = None, size: int | None = None
+):
+    """Downloads a file unless it already exists, verifying its SHA-256 digest if one is given.
+
+    With size given, only the first size bytes of the file are downloaded.
+
+    The file is streamed to a .part file next to it and renamed once complete, so an interrupted
+    download never leaves a partial file at path. An existing .part file is resumed with an HTTP range
+    request, and failed attempts are resumed up to DOWNLOAD_ATTEMPTS times. The response is only appended
+    if it is a 206 whose Content-Range and Content-Length cover the missing bytes, and otherwise the
+    download restarts from the beginning.
+
+    Raises:
+        ValueError: If the digest of the downloaded file does not match sha256, or a partial response
+            to a fresh download does not start at the beginning of the file.
+    """
+    if path.exists():
+        if sha256 is None or _file_sha256(path) == sha256:
+            logger.info(f"Using existing file {path}")
+            return
+        logger.warning(
+            f"Existing file {path} does not match its checksum, replacing it"
+        )
+        path.unlink()
+    part_file = path.with_name(path.name + ".part")
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        try:
+            _download_to_part_file(url, part_file, size)
+            break
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as e:
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+            logger.warning(f"Download of {url} failed ({e}), resuming")
+    digest = _file_sha256(part_file)
+    if sha256 is not None and digest != sha256:
+        part_file.unlink()
+        raise ValueError(
+            f"Checksum mismatch for {url}: expected {sha256}, got {digest}"
+        )
+    if sha256 is None:
+        logger.info(f"Downloaded {url} with SHA-256 {digest}")
+    part_file.rename(path)
+    logger.info(f"Downloaded file {path}")
+
+
+def _download_to_part_file(url: str, part_file: Path, size: int | None = None):
+    offset = part_file.stat().st_size if part_file.exists() else 0
+    if size is not None and offset >= size:
+        return
+    headers = {}
+    if size is not None:
+        headers["Range"] = f"bytes={offset}-{size - 1}"
+    elif offset:
+        headers["Range"] = f"bytes={offset}-"
+    with requests.get(
+        url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+    ) as response:
+        if offset and response.status_code == 416:
+            # The range starts at the end of the file, so the previous attempt was complete
+            return
         response.raise_for_status()
-        with open(dl_file, "wb") as f:
-            f.write(response.content)
-        logger.info(f"Downloaded dataset file {dl_file}")
-    f = h5py.File(dl_file, "r")
-    return Dataset(
-        metric, f["train"][()], f["test"][()], f["distances"][()], f["neighbors"][()]
+        length = response.headers.get("Content-Length")
+        length = int(length) if length is not None else None
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range")
+            if not _is_expected_range(content_range, length, offset, size):
+                if not offset:
+                    raise ValueError(
+                        f"Unexpected Content-Range {content_range} for {url}"
+                    )
+                logger.warning(
+                    f"Unexpected Content-Range {content_range} when resuming {url} "
+                    f"at {offset} bytes, restarting"
+                )
+                offset = None
+        elif offset:
+            logger.info(f"Server does not support resuming {url}, restarting")
+            offset = 0
+        if offset is not None:
+            _write_response(url, response, part_file, offset, length, size)
+    if offset is None:
+        part_file.unlink()
+        _download_to_part_file(url, part_file, size)
+
+
+def _is_expected_range(
+    content_range: str | None, length: int | None, offset: int, size: int | None
+) -> bool:
+    """Checks that the Content-Range of a partial response starts at offset and ends within size,
+    and that it agrees with the Content-Length if there is one."""
+    match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range or "")
+    if match is None:
+        return False
+    first, last = int(match[1]), int(match[2])
+    return (
+        first == offset
+        and last >= first
+        and (size is None or last < size)
+        and (length is None or length == last - first + 1)
     )
+
+
+def _write_response(
+    url: str,
+    response: requests.Response,
+    part_file: Path,
+    offset: int,
+    length: int | None,
+    size: int | None,
+):
+    """Appends the body of response to part_file at offset, or overwrites it if offset is 0."""
+    if offset:
+        logger.info(f"Resuming download of {url} at {offset} bytes")
+    total = length + offset if length is not None else None
+    if size is not None:
+        total = size if total is None else min(total, size)
+    downloaded = offset
+    start_time = last_log_time = time.monotonic()
+    with open(part_file, "ab" if offset else "wb") as f:
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+            if size is not None:
+                # Servers without range support send the whole file
+                chunk = chunk[: size - downloaded]
+            f.write(chunk)
+            downloaded += len(chunk)
+            if size is not None and downloaded >= size:
+                break
+            now = time.monotonic()
+            if now - last_log_time >= DOWNLOAD_LOG_INTERVAL:
+                last_log_time = now
+                rate = (downloaded - offset) / (now - start_time) / 1e6
+                progress = f"{downloaded / 1e6:.1f}"
+                if total is not None:
+                    progress += f"/{total / 1e6:.1f}"
+                logger.info(f"Downloaded {progress} MB of {url} ({rate:.1f} MB/s)")
+    if total is not None and downloaded < total:
+        raise requests.ConnectionError(
+            f"Connection closed after {downloaded} of {total} bytes"
+        )
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_from_bigann(
+    name: str,
+    base_url: str,
+    query_url: str,
+    ground_truth_url: str,
+    metric: DistanceMetric,
+    max_vectors: int | None = None,
+    stride: int = 1,
+    sha256: dict[str, str] | None = None,
+) -> Dataset:
+    """Loads a dataset in the big-ann-benchmarks binary format, optionally as a subset of the base vectors.
+
+    The vector files (.fbin, .u8bin or .i8bin) and the ground truth file are memory-mapped.
+    The subset is every stride-th base vector, up to max_vectors of them. For a prefix subset
+    (stride 1), only the needed part of the base file is downloaded.
+    The published ground truth is only valid for the full base set, so for a subset it is not downloaded,
+    and the ground truth is computed instead, or loaded from GROUND_TRUTH_DIR under the name, max_vectors
+    and stride of the subset if it was computed before. The distances of the published ground truth are
+    recomputed with metric, as the published ones may be squared or otherwise scaled.
+    The "base", "query" and "ground_truth" digests of sha256 are verified by download_file, except
+    for the base file when only a prefix of it is downloaded.
+    """
+    sha256 = sha256 or {}
+    dl_dir = DOWNLOAD_DIR / name
+    dl_dir.mkdir(parents=True, exist_ok=True)
+    suffix = Path(base_url).suffix
+    dtype = BIGANN_DTYPES[suffix]
+
+    header_file = dl_dir / "base.header"
+    download_file(base_url, header_file, size=8)
+    n_total, dims = np.fromfile(header_file, dtype=np.uint32, count=2)
+    if max_vectors is not None and stride == 1 and max_vectors < n_total:
+        base_file = dl_dir / f"base.{max_vectors}{suffix}"
+        row_bytes = int(dims) * np.dtype(dtype).itemsize
+        download_file(base_url, base_file, size=8 + max_vectors * row_bytes)
+    else:
+        base_file = dl_dir / f"base{suffix}"
+        download_file(base_url, base_file, sha256.get("base"))
+    query_file = dl_dir / f"query{suffix}"
+    download_file(query_url, query_file, sha256.get("query"))
+
+    train = read_bigann_vectors(base_file, dtype)[::stride][:max_vectors]
+    test = read_bigann_vectors(query_file, dtype)
+    if train.shape[0] == n_total:
+        ground_truth_file = dl_dir / "ground_truth.ibin"
+        download_file(ground_truth_url, ground_truth_file, sha256.get("ground_truth"))
+        neighbors, _ = read_bigann_ground_truth(ground_truth_file)
+        distances = np.concatenate(
+            [
+                metric.batch(
+                    test[start : start + 1000, np.newaxis, :],
+                    train[neighbors[start : start + 1000]],
+                )
+                for start in range(0, test.shape[0], 1000)
+            ]
+        )
+    else:
+        distances, neighbors = load_or_compute_ground_truth(
+            train,
+            test,
+            metric,
+            GROUND_TRUTH_DIR,
+            key=f"{name}.{train.shape[0]}.{stride}",
+        )
+    return Dataset(metric, train, test, distances, neighbors)
+
+
+def read_bigann_vectors(path: Path, dtype: np.dtype) -> np.ndarray:
+    """Memory-maps a big-ann-benchmarks vector file.
+
+    The file has a header of the number of vectors and dimensions as uint32, followed by the vectors.
+    A file truncated to a prefix of the vectors is read up to its last complete vector.
+    """
+    n, dims = np.fromfile(path, dtype=np.uint32, count=2)
+    row_bytes = int(dims) * np.dtype(dtype).itemsize
+    n = min(int(n), (path.stat().st_size - 8) // row_bytes)
+    return np.memmap(path, dtype=dtype, mode="r", offset=8, shape=(n, int(dims)))
+
+
+def read_bigann_ground_truth(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Memory-maps a big-ann-benchmarks ground truth file.
+
+    The file has a header of the number of queries and neighbors per query as uint32, followed by
+    the neighbor ids as int32 and then their distances as float32.
+
+    Returns:
+        The neighbor ids and distances, each with shape (n_queries, k).
+    """
+    n, k = (int(x) for x in np.fromfile(path, dtype=np.uint32, count=2))
+    neighbors = np.memmap(path, dtype=np.int32, mode="r", offset=8, shape=(n, k))
+    distances = np.memmap(
+        path, dtype=np.float32, mode="r", offset=8 + n * k * 4, shape=(n, k)
+    )
+    return neighbors, distances
+
+
+def load_synthetic(
+    n: int = 1_000_000,
+    dims: int = 128,
+    clusters: int = 100,
+    intrinsic_dims: int | None = None,
+    n_queries: int = 10_000,
+    distribution: Literal["gaussian", "anisotropic"] = "gaussian",
+    metric: str = "Euclidean",
+    k: int = 100,
+    seed: int = 0,
+) -> Dataset:
+    """Generates a dataset of clustered vectors, with test queries drawn from the same distribution.
+
+    Vectors are drawn from a mixture of clusters in an intrinsic_dims-dimensional space, with unit
+    variance ("gaussian") or a random variance between 0.01 and 1 along each axis ("anisotropic"),
+    around centers with SYNTHETIC_CENTER_SPREAD standard deviation. They are then embedded in dims
+    dimensions with a random orthonormal projection, and SYNTHETIC_NOISE isotropic noise is added.
+
+    The vectors are generated in chunks of SYNTHETIC_CHUNK_ROWS straight into .npy files under
+    DOWNLOAD_DIR, which are reused for the same arguments, and the exact ground truth is computed with
+    load_or_compute_ground_truth.
+
+    Args:
+        n: The number of train vectors.
+        dims: The number of dimensions of the vectors.
+        clusters: The number of clusters.
+        intrinsic_dims: The number of dimensions of the space the clusters are drawn in, at most dims.
+            Defaults to dims.
+        n_queries: The number of test vectors.
+        distribution: The shape of each cluster.
+        metric: The name of the DistanceMetric.
+        k: The number of nearest neighbors in the ground truth.
+        seed: The random seed.
+    """
+    intrinsic_dims = intrinsic_dims or dims
+    if intrinsic_dims > dims:
+        raise ValueError("Expected intrinsic_dims to be at most dims")
+    if distribution not in ("gaussian", "anisotropic"):
+        raise ValueError(f"Unknown distribution: {distribution}")
+    params = {
+        "n": n,
+        "dims": dims,
+        "clusters": clusters,
+        "intrinsic_dims": intrinsic_dims,
+        "n_queries": n_queries,
+        "distribution": distribution,
+        "seed": seed,
+    }
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    npy_dir = DOWNLOAD_DIR / "synthetic" / digest[:16]
+    if npy_dir.exists():
+        logger.info(f"Using existing synthetic dataset {npy_dir}")
+    else:
+        logger.info(f"Generating synthetic dataset {params}")
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(
+            scale=SYNTHETIC_CENTER_SPREAD, size=(clusters, intrinsic_dims)
+        )
+        if distribution == "anisotropic":
+            scales = np.exp(
+                rng.uniform(np.log(0.1), 0, size=(clusters, intrinsic_dims))
+            )
+        else:
+            scales = np.ones((clusters, intrinsic_dims))
+        projection = np.linalg.qr(rng.normal(size=(dims, intrinsic_dims)))[0].T
+        tmp_dir = npy_dir.with_name(npy_dir.name + ".tmp")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for name, rows, stream in (("train", n, 0), ("test", n_queries, 1)):
+            target = np.lib.format.open_memmap(
+                tmp_dir / f"{name}.npy", mode="w+", dtype=np.float32, shape=(rows, dims)
+            )
+            for chunk, start in enumerate(range(0, rows, SYNTHETIC_CHUNK_ROWS)):
+                chunk_rng = np.random.default_rng([seed, stream, chunk])
+                m = min(SYNTHETIC_CHUNK_ROWS, rows - start)
+                labels = chunk_rng.integers(clusters, size=m)
+                z = (
+                    centers[labels]
+                    + chunk_rng.normal(size=(m, intrinsic_dims)) * (scales[labels])
+                )
+                target[start : start + m] = z @ projection + chunk_rng.normal(
+                    scale=SYNTHETIC_NOISE, size=(m, dims)
+                )
+            target.flush()
+            del target
+        tmp_dir.rename(npy_dir)
+    metric = DistanceMetric[metric]
+    train = np.load(npy_dir / "train.npy", mmap_mode="r")
+    test = np.load(npy_dir / "test.npy", mmap_mode="r")
+    distances, neighbors = load_or_compute_ground_truth(
+        train, test, metric, GROUND_TRUTH_DIR, k
+    )
+    return Dataset(metric, train, test, distances, neighbors)
+
+
+def synthetic_attributes(n: int, seed: int = ATTRIBUTE_SEED) -> np.ndarray:
+    """Draws n attributes uniformly from [0, ATTRIBUTE_VALUES)."""
+    return np.random.default_rng(seed).integers(
+        ATTRIBUTE_VALUES, size=n, dtype=np.int16
+    )
+
+
+def attribute_limit(selectivity: float) -> int:
+    """Returns the attribute value below which a filter matches the given fraction of train vectors.
+
+    Raises:
+        ValueError: If selectivity is not in (0, 1], or is too small to match any attribute value.
+    """
+    if not 0 < selectivity <= 1:
+        raise ValueError(f"Expected a selectivity in (0, 1], got {selectivity}")
+    limit = round(selectivity * ATTRIBUTE_VALUES)
+    if limit < 1:
+        raise ValueError(
+            f"Expected a selectivity of at least {1 / ATTRIBUTE_VALUES}, got {selectivity}"
+        )
+    return limit
+
+
+def load_from_npy(npy_dir: Path, metric: DistanceMetric) -> Dataset:
+    """Loads a dataset from a directory with a .npy file for each array, memory-mapping the arrays lazily."""
+    return Dataset(metric, *(npy_dir / f"{name}.npy" for name in ARRAY_NAMES))
+
+
+def convert_hdf5_to_npy(hdf5_file: Path, npy_dir: Path):
+    """Converts the arrays of an ann-benchmarks HDF5 file to a directory of .npy files.
+
+    Arrays are copied in chunks of up to CONVERT_CHUNK_BYTES, so they never need to fit in memory.
+    The directory is written under a temporary name and renamed once complete.
+    """
+    logger.info(f"Converting {hdf5_file} to {npy_dir}")
+    tmp_dir = npy_dir.with_name(npy_dir.name + ".tmp")
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    with h5py.File(hdf5_file, "r") as f:
+        for name in ARRAY_NAMES:
+            source = f[name]
+            target = np.lib.format.open_memmap(
+                tmp_dir / f"{name}.npy",
+                mode="w+",
+                dtype=source.dtype,
+                shape=source.shape,
+            )
+            row_bytes = max(source.dtype.itemsize * int(np.prod(source.shape[1:])), 1)
+            chunk_rows = max(CONVERT_CHUNK_BYTES // row_bytes, 1)
+            for start in range(0, source.shape[0], chunk_rows):
+                target[start : start + chunk_rows] = source[start : start + chunk_rows]
+            target.flush()
+            del target
+    tmp_dir.rename(npy_dir)
@@ -1,17 +1,161 @@
 from enum import Enum
-from typing import Callable
+from typing import Callable, Iterator
 
 import numpy as np
 
 
+def _as_float32(x: np.ndarray) -> np.ndarray:
+    return np.asarray(x, dtype=np.float32)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = _as_float32(x)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+
+def _squared_norms(x: np.ndarray) -> np.ndarray:
+    return np.einsum("...i,...i->...", x, x)
+
+
+def _euclidean_batch(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    return np.linalg.norm(x - y, axis=-1)
+
+
+def _euclidean_matrix(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    return np.sqrt(_squared_euclidean_matrix(x, y, normalized))
+
+
+def _squared_euclidean_batch(
+    x: np.ndarray, y: np.ndarray, normalized: bool
+) -> np.ndarray:
+    return _squared_norms(x - y)
+
+
+def _squared_euclidean_matrix(
+    x: np.ndarray, y: np.ndarray, normalized: bool
+) -> np.ndarray:
+    dists = _squared_norms(x)[:, np.newaxis] + _squared_norms(y)[np.newaxis, :]
+    dists -= 2 * (x @ y.T)
+    return np.maximum(dists, 0, out=dists)
+
+
+def _angular_batch(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    if normalized:
+        return 1 - np.sum(x * y, axis=-1)
+    return 1 - np.sum(x * y, axis=-1) / (
+        np.linalg.norm(x, axis=-1) * np.linalg.norm(y, axis=-1)
+    )
+
+
+def _angular_matrix(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    if not normalized:
+        x = _normalize(x)
+        y = _normalize(y)
+    return 1 - x @ y.T
+
+
+def _inner_product_batch(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    return -np.sum(x * y, axis=-1)
+
+
+def _inner_product_matrix(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    return -(x @ y.T)
+
+
+def _hamming_batch(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    return np.sum(x != y, axis=-1, dtype=np.float32)
+
+
+def _hamming_matrix(x: np.ndarray, y: np.ndarray, normalized: bool) -> np.ndarray:
+    # For 0/1 vectors, |x - y|^2 counts the differing components, and float32 is exact below 2^24 dims
+    return _squared_euclidean_matrix(x, y, normalized)
+
+
 class DistanceMetric(Enum):
-    def __init__(self, calc: Callable[[np.ndarray, np.ndarray], float]):
-        self.calc = calc
+    """A distance between vectors, where smaller values mean closer vectors.
+
+    Every metric computes in float32 and offers scalar, broadcast, one-to-many,
+    many-to-many and blocked pairwise kernels. Inputs that are not float32 are converted first.
+
+    Vectors passed through normalize may be given to the kernels with normalized=True, which lets
+    Angular skip recomputing norms. Other metrics accept the flag and ignore it.
+    Hamming expects binary vectors with components of 0 and 1.
+    """
+
+    def __init__(
+        self,
+        batch_calc: Callable[[np.ndarray, np.ndarray, bool], np.ndarray],
+        matrix_calc: Callable[[np.ndarray, np.ndarray, bool], np.ndarray],
+    ):
+        self.batch_calc = batch_calc
+        self.matrix_calc = matrix_calc
 
     def __call__(self, x: np.ndarray, y: np.ndarray) -> float:
         assert x.shape == y.shape
         assert x.ndim == 1
-        return self.calc(x, y)
+        return float(self.batch_calc(_as_float32(x), _as_float32(y), False))
+
+    def normalize(self, x: np.ndarray) -> np.ndarray:
+        """Converts vectors to the float32 form expected by the kernels with normalized=True.
+
+        For Angular this scales each vector to unit length, for other metrics it only converts the dtype.
+        """
+        if self is DistanceMetric.Angular:
+            return _normalize(x)
+        return _as_float32(x)
+
+    def batch(
+        self, x: np.ndarray, y: np.ndarray, normalized: bool = False
+    ) -> np.ndarray:
+        """Computes distances along the last axis, broadcasting the leading axes.
+
+        For example, x of shape (batch, 1, dims) and y of shape (batch, k, dims)
+        produce distances of shape (batch, k).
+        """
+        assert x.shape[-1] == y.shape[-1]
+        return self.batch_calc(_as_float32(x), _as_float32(y), normalized)
+
+    def one_to_many(
+        self, x: np.ndarray, ys: np.ndarray, normalized: bool = False
+    ) -> np.ndarray:
+        """Computes the distances from a vector of shape (dims,) to each row of ys, with shape (n,)."""
+        assert x.ndim == 1
+        return self.many_to_many(x[np.newaxis, :], ys, normalized)[0]
+
+    def many_to_many(
+        self, xs: np.ndarray, ys: np.ndarray, normalized: bool = False
+    ) -> np.ndarray:
+        """Computes the distance matrix of shape (m, n) between the rows of xs (m, dims) and ys (n, dims)."""
+        assert xs.ndim == 2 and ys.ndim == 2
+        assert xs.shape[1] == ys.shape[1]
+        return self.matrix_calc(_as_float32(xs), _as_float32(ys), normalized)
+
+    def pairwise_blocked(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        block_size: int = 65536,
+        normalized: bool = False,
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """Computes the distance matrix between xs and ys in blocks of rows of ys.
+
+        This bounds memory use to (m, block_size) when ys is large or memory-mapped.
+
+        Yields:
+            Tuples of the index of the first row of ys in the block and the (m, block) distance matrix.
+        """
+        xs = _as_float32(xs)
+        if self is DistanceMetric.Angular and not normalized:
+            xs = _normalize(xs)
+        for start in range(0, ys.shape[0], block_size):
+            block = ys[start : start + block_size]
+            if self is DistanceMetric.Angular and not normalized:
+                block = _normalize(block)
+            yield start, self.many_to_many(xs, block, normalized=True)
 
-    Euclidean = (lambda x, y: np.linalg.norm(x - y),)
-    Angular = (lambda x, y: 1 - np.dot(x, y) / (np.linalg.norm(x) * np.linalg.norm(y)),)
+    Euclidean = (_euclidean_batch, _euclidean_matrix)
+    SquaredEuclidean = (_squared_euclidean_batch, _squared_euclidean_matrix)
+    Angular = (_angular_batch, _angular_matrix)
+    InnerProduct = (_inner_product_batch, _inner_product_matrix)
+    Hamming = (_hamming_batch, _hamming_matrix)
@@ -0,0 +1,259 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from vdbbench.distance import DistanceMetric
+
+logger = logging.getLogger(__name__)
+
+GROUND_TRUTH_BLOCK_SIZE = 16384
+GROUND_TRUTH_QUERY_BLOCK_SIZE = 1024
+TASKS_PER_WORKER = 4
+FINGERPRINT_SAMPLE_ROWS = 1024
+
+_process_train: np.ndarray | None = None
+_process_test: np.ndarray | None = None
+_process_metric: DistanceMetric | None = None
+_process_rows: np.ndarray | None = None
+
+
+def compute_ground_truth(
+    train: np.ndarray,
+    test: np.ndarray,
+    metric: DistanceMetric,
+    k: int = 100,
+    block_size: int = GROUND_TRUTH_BLOCK_SIZE,
+    workers: int | None = None,
+    normalized: bool = False,
+    rows: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the exact k nearest train vectors of each test vector by brute force.
+
+    The distances are computed in float32 tiles of up to GROUND_TRUTH_QUERY_BLOCK_SIZE test vectors by
+    block_size train vectors, keeping only the best k of each test vector so far, so memory use is
+    bounded and train may be memory-mapped and larger than memory.
+    With rows given, only those train vectors are searched, gathered one tile at a time.
+    With more than one worker, ranges of train vectors are scanned by a pool of forked processes,
+    which share train and test with this process, and their results are merged.
+
+    Args:
+        train: The train vectors, with shape (n, dims).
+        test: The test vectors, with shape (n_test, dims).
+        metric: The distance metric.
+        k: The number of neighbors to find, limited to n.
+        block_size: The number of train vectors in each tile.
+        workers: The number of processes to use, by default the number of CPUs.
+        normalized: Whether train and test were passed through metric.normalize already.
+        rows: The indices of the train vectors to search, by default all of them.
+
+    Returns:
+        The distances and train indices of the nearest neighbors of each test vector in increasing
+        order of distance, each with shape (n_test, k).
+    """
+    n = train.shape[0] if rows is None else rows.shape[0]
+    k = min(k, n)
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        return _sort_top_k(
+            *_top_k_of_range(train, test, metric, 0, n, k, block_size, normalized, rows)
+        )
+    n_tasks = workers * TASKS_PER_WORKER
+    task_size = -(-n // n_tasks)
+    # Round ranges to whole tiles, so that each task has full tiles except the last
+    task_size = -(-task_size // block_size) * block_size
+    best_dists = np.full((test.shape[0], 0), np.inf, dtype=np.float32)
+    best_ids = np.full((test.shape[0], 0), -1, dtype=np.int64)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_ground_truth_process,
+        initargs=(train, test, metric, rows),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _top_k_of_range_in_process,
+                start,
+                min(start + task_size, n),
+                k,
+                block_size,
+                normalized,
+            )
+            for start in range(0, n, task_size)
+        ]
+        for i, future in enumerate(futures):
+            dists, ids = future.result()
+            best_dists, best_ids = _merge_top_k(best_dists, best_ids, dists, ids, k)
+            logger.info(f"Ground truth: {i + 1}/{len(futures)} train ranges done")
+    return _sort_top_k(best_dists, best_ids)
+
+
+def load_or_compute_ground_truth(
+    train: np.ndarray,
+    test: np.ndarray,
+    metric: DistanceMetric,
+    cache_dir: Path,
+    k: int = 100,
+    rows: np.ndarray | None = None,
+    key: str | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Runs compute_ground_truth, caching the results in cache_dir under the fingerprint of the inputs.
+
+    Args:
+        rows: The indices of the train vectors to search, by default all of them.
+        key: A name that identifies the inputs, such as how the train vectors were selected from a
+            published dataset, to cache the results under instead of the fingerprint, which avoids
+            reading train vectors to fingerprint them.
+
+    Returns:
+        The distances and train indices of the nearest neighbors of each test vector.
+    """
+    if key is None:
+        fingerprint = fingerprint_vectors(train, test, metric, k, rows)
+    else:
+        fingerprint = f"{key}.{metric.name}.k{k}"
+    cache_file = cache_dir / f"{fingerprint}.npz"
+    if not cache_file.exists():
+        n = train.shape[0] if rows is None else rows.shape[0]
+        logger.info(
+            f"Computing ground truth for {test.shape[0]} queries over {n} vectors"
+        )
+        distances, neighbors = compute_ground_truth(train, test, metric, k, rows=rows)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(f"{fingerprint}.tmp.npz")
+        np.savez(tmp_file, distances=distances, neighbors=neighbors)
+        tmp_file.rename(cache_file)
+    else:
+        logger.info(f"Using cached ground truth {cache_file}")
+    with np.load(cache_file) as f:
+        return f["distances"], f["neighbors"]
+
+
+def fingerprint_vectors(
+    train: np.ndarray,
+    test: np.ndarray,
+    metric: DistanceMetric,
+    k: int,
+    rows: np.ndarray | None = None,
+) -> str:
+    """Computes a fingerprint of a ground truth problem.
+
+    It covers the shapes and dtypes of the vectors, the metric, k, all test vectors, all rows if given, and
+    FINGERPRINT_SAMPLE_ROWS evenly spaced train vectors including the first and last,
+    so that large memory-mapped train sets do not need to be read in full.
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        repr(
+            (metric.name, k, train.shape, train.dtype.str, test.shape, test.dtype.str)
+        ).encode()
+    )
+    digest.update(np.ascontiguousarray(test).tobytes())
+    sample = np.unique(
+        np.linspace(0, train.shape[0] - 1, FINGERPRINT_SAMPLE_ROWS).astype(np.int64)
+    )
+    digest.update(np.ascontiguousarray(train[sample]).tobytes())
+    if rows is not None:
+        digest.update(np.ascontiguousarray(rows, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:32]
+
+
+def _init_ground_truth_process(
+    train: np.ndarray,
+    test: np.ndarray,
+    metric: DistanceMetric,
+    rows: np.ndarray | None,
+):
+    global _process_train, _process_test, _process_metric, _process_rows
+    _process_train = train
+    _process_test = test
+    _process_metric = metric
+    _process_rows = rows
+
+
+def _top_k_of_range_in_process(
+    start: int, end: int, k: int, block_size: int, normalized: bool
+) -> tuple[np.ndarray, np.ndarray]:
+    return _top_k_of_range(
+        _process_train,
+        _process_test,
+        _process_metric,
+        start,
+        end,
+        k,
+        block_size,
+        normalized,
+        _process_rows,
+    )
+
+
+def _top_k_of_range(
+    train: np.ndarray,
+    test: np.ndarray,
+    metric: DistanceMetric,
+    start: int,
+    end: int,
+    k: int,
+    block_size: int,
+    normalized: bool = False,
+    rows: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the unsorted k nearest vectors of train[start:end], or of train[rows[start:end]], to each test vector."""
+    k = min(k, end - start)
+    best_dists = np.empty((test.shape[0], k), dtype=np.float32)
+    best_ids = np.empty((test.shape[0], k), dtype=np.int64)
+    for query_start in range(0, test.shape[0], GROUND_TRUTH_QUERY_BLOCK_SIZE):
+        queries = slice(query_start, query_start + GROUND_TRUTH_QUERY_BLOCK_SIZE)
+        query_vectors = test[queries] if normalized else metric.normalize(test[queries])
+        dists = np.full((query_vectors.shape[0], 0), np.inf, dtype=np.float32)
+        ids = np.full((query_vectors.shape[0], 0), -1, dtype=np.int64)
+        for block_start in range(start, end, block_size):
+            block_end = min(block_start + block_size, end)
+            if rows is None:
+                block = train[block_start:block_end]
+                block_ids = np.arange(block_start, block_end)
+            else:
+                block_ids = rows[block_start:block_end]
+                block = train[block_ids]
+            if not normalized:
+                block = metric.normalize(block)
+            block_dists = metric.many_to_many(query_vectors, block, normalized=True)
+            dists, ids = _merge_top_k(
+                dists,
+                ids,
+                block_dists,
+                np.broadcast_to(block_ids, block_dists.shape),
+                k,
+            )
+        best_dists[queries] = dists
+        best_ids[queries] = ids
+    return best_dists, best_ids
+
+
+def _merge_top_k(
+    dists: np.ndarray,
+    ids: np.ndarray,
+    new_dists: np.ndarray,
+    new_ids: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    merged_dists = np.concatenate([dists, new_dists], axis=1)
+    merged_ids = np.concatenate([ids, new_ids], axis=1)
+    if merged_dists.shape[1] <= k:
+        return merged_dists, merged_ids
+    top = np.argpartition(merged_dists, k - 1, axis=1)[:, :k]
+    return (
+        np.take_along_axis(merged_dists, top, axis=1),
+        np.take_along_axis(merged_ids, top, axis=1),
+    )
+
+
+def _sort_top_k(dists: np.ndarray, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(dists, axis=1, kind="stable")
+    return np.take_along_axis(dists, order, axis=1), np.take_along_axis(
+        ids, order, axis=1
+    )
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+SUMMARY_PERCENTILES = {
+    "p25": 25,
+    "p50": 50,
+    "p75": 75,
+    "p90": 90,
+    "p95": 95,
+    "p99": 99,
+    "p999": 99.9,
+}
+
+
+class Histogram:
+    """A compact, mergeable histogram of non-negative values with bounded relative error.
+
+    Values are counted in log-linear buckets in the style of HdrHistogram: values below
+    2 * 10^significant_digits * lowest are counted in linear buckets of width lowest, and larger
+    values in buckets whose width is at most 10^-significant_digits of the value.
+    The count, sum, sum of squares, minimum and maximum are tracked exactly.
+
+    Histograms with the same precision can be merged, so results from rounds, workers and runners
+    can be combined without keeping every sample.
+
+    Args:
+        significant_digits: The number of significant decimal digits to preserve.
+        lowest: The resolution of the smallest values, in the unit of the recorded values.
+    """
+
+    def __init__(self, significant_digits: int = 3, lowest: float = 1e-6):
+        if significant_digits < 1:
+            raise ValueError("Expected at least 1 significant digit")
+        if lowest <= 0:
+            raise ValueError("Expected a positive lowest value")
+        self.significant_digits = significant_digits
+        self.lowest = lowest
+        self._sub_bucket_bits = math.ceil(math.log2(2 * 10**significant_digits))
+        self._sub_bucket_count = 2**self._sub_bucket_bits
+        self._sub_bucket_half = self._sub_bucket_count // 2
+        self.counts = np.zeros(self._sub_bucket_count, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float):
+        self.record_many(np.array([value]))
+
+    def record_many(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        indices = self._index_of(values)
+        if indices.max() >= len(self.counts):
+            self.counts = np.pad(self.counts, (0, indices.max() + 1 - len(self.counts)))
+        self.counts += np.bincount(indices, minlength=len(self.counts))
+        self.count += values.size
+        self.total += float(np.sum(values))
+        self.total_squares += float(np.sum(values**2))
+        self.min = min(self.min, float(np.min(values)))
+        self.max = max(self.max, float(np.max(values)))
+
+    def merge(self, other: Histogram) -> Histogram:
+        """Adds the counts of another histogram with the same precision to this one.
+
+        Returns:
+            This histogram.
+        """
+        if (self.significant_digits, self.lowest) != (
+            other.significant_digits,
+            other.lowest,
+        ):
+            raise ValueError("Cannot merge histograms with different precision")
+        if len(other.counts) > len(self.counts):
+            self.counts = np.pad(self.counts, (0, len(other.counts) - len(self.counts)))
+        self.counts[: len(other.counts)] += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return math.nan
+        return self.total / self.count
+
+    @property
+    def std(self) -> float:
+        if self.count == 0:
+            return math.nan
+        return math.sqrt(max(self.total_squares / self.count - self.mean**2, 0))
+
+    def percentile(self, percentile: float) -> float:
+        """Finds the value at a percentile, between 0 and 100.
+
+        The value is the midpoint of the bucket containing the percentile, clipped to the recorded range.
+        """
+        if self.count == 0:
+            return math.nan
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        lower, upper = self._bounds_of(index)
+        return min(max((lower + upper) / 2, self.min), self.max)
+
+    def summary(self) -> dict:
+        """Summarizes the histogram as a dictionary of statistics and percentiles, including the histogram itself."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min if self.count else math.nan,
+            "max": self.max if self.count else math.nan,
+            **{k: self.percentile(p) for k, p in SUMMARY_PERCENTILES.items()},
+            "histogram": self.to_dict(),
+        }
+
+    def to_dict(self) -> dict:
+        """Serializes the histogram, storing only the non-empty buckets."""
+        (indices,) = np.nonzero(self.counts)
+        return {
+            "significant_digits": self.significant_digits,
+            "lowest": self.lowest,
+            "count": self.count,
+            "total": self.total,
+            "total_squares": self.total_squares,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "buckets": indices.tolist(),
+            "counts": self.counts[indices].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Histogram:
+        histogram = cls(data["significant_digits"], data["lowest"])
+        if data["buckets"]:
+            histogram.counts = np.pad(
+                histogram.counts,
+                (0, max(max(data["buckets"]) + 1 - len(histogram.counts), 0)),
+            )
+            histogram.counts[data["buckets"]] = data["counts"]
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.total_squares = data["total_squares"]
+        if data["count"]:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        return histogram
+
+    def _index_of(self, values: np.ndarray) -> np.ndarray:
+        units = np.maximum(values / self.lowest, 0)
+        indices = np.floor(units).astype(np.int64)
+        large = units >= self._sub_bucket_count
+        if np.any(large):
+            # Within [2^(e - 1), 2^e) * sub_bucket_count, buckets have width 2^e
+            mantissa, exponent = np.frexp(units[large])
+            e = exponent - self._sub_bucket_bits
+            sub_bucket = np.floor(mantissa * self._sub_bucket_count).astype(np.int64)
+            indices[large] = (
+                self._sub_bucket_count
+                + (e - 1) * self._sub_bucket_half
+                + (sub_bucket - self._sub_bucket_half)
+            )
+        return indices
+
+    def _bounds_of(self, index: int) -> tuple[float, float]:
+        if index < self._sub_bucket_count:
+            return index * self.lowest, (index + 1) * self.lowest
+        e = (index - self._sub_bucket_count) // self._sub_bucket_half + 1
+        sub_bucket = (
+            index - self._sub_bucket_count
+        ) % self._sub_bucket_half + self._sub_bucket_half
+        return (
+            math.ldexp(sub_bucket, e) * self.lowest,
+            math.ldexp(sub_bucket + 1, e) * self.lowest,
+        )
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -15,7 +16,6 @@ def plot_result(
     y_label: str,
 ):
     f, ax = plt.subplots()
-    df = df.explode(x)
     sns.lineplot(
         data=df,
         x=x,
@@ -50,7 +50,7 @@ def plot_recall_latency(
 ):
     out_dir.mkdir(exist_ok=True)
     df, config_columns = parse_query_results(data)
-    df["latency"] = df["latency"] * 1000  # Convert from s to ms
+    df["latency_mean"] = df["latency_mean"] * 1000  # Convert from s to ms
     series_columns = [
         c
         for c in config_columns
@@ -74,7 +74,7 @@ def plot_recall_latency(
         f = plot_result(
             group,
             plot_name,
-            "latency",
+            "latency_mean",
             "Mean Latency (ms)",
             "recall_mean",
             "Mean Recall",
@@ -98,14 +98,61 @@ def parse_query_results(data: dict) -> tuple[pd.DataFrame, list[str]]:
         for group in data_config["groups"]:
             for query in group["queries"]:
                 row = {}
-                row.update(data_config["data_config"])
-                row.update(group["group_config"])
-                row.update(query["query_config"])
+                row.update(_config_values(data_config["data_config"]))
+                row.update(_config_values(group["group_config"]))
+                row.update(_config_values(query["query_config"]))
                 for k, v in query.items():
                     if k == "query_config":
                         continue
-                    row[k] = np.array(v)
-                    row[f"{k}_mean"] = row[k].mean()
+                    if isinstance(v, dict):
+                        # Histogram summaries, see vdbbench.histogram.Histogram.summary
+                        for stat, value in v.items():
+                            if stat == "histogram":
+                                continue
+                            if isinstance(value, dict):
+                                # Span summaries, keyed by span name
+                                for span_stat, span_value in value.items():
+                                    if span_stat != "histogram":
+                                        row[f"{k}_{stat}_{span_stat}"] = span_value
+                            else:
+                                row[f"{k}_{stat}"] = value
+                    elif isinstance(v, list):
+                        row[k] = np.array(v)
+                        row[f"{k}_mean"] = row[k].mean()
+                    else:
+                        row[k] = v
                 rows.append(row)
 
     return pd.DataFrame(rows), config_columns
+
+
+def parse_load_results(data: dict) -> tuple[pd.DataFrame, list[str]]:
+    """Parses the load and prepare results of each data and group configuration, such as those of elasticsearch-ingest."""
+    data = data["data"]
+    config_columns = []
+    config_columns.extend(data[0]["data_config"].keys())
+    config_columns.extend(data[0]["groups"][0]["group_config"].keys())
+
+    rows = []
+    for data_config in data:
+        for group in data_config["groups"]:
+            row = {}
+            row.update(_config_values(data_config["data_config"]))
+            row.update(_config_values(group["group_config"]))
+            row.update(data_config["load_result"] or {})
+            for k, v in (group["prepare_result"] or {}).items():
+                row[f"group_{k}"] = v
+            rows.append(row)
+
+    return pd.DataFrame(rows), config_columns
+
+
+def _config_values(config: dict) -> dict:
+    """Converts the list and dict values of a configuration, such as recall_at or dataset_args, to JSON strings.
+
+    Config columns are grouped and compared, which needs hashable values.
+    """
+    return {
+        k: json.dumps(v, sort_keys=True) if isinstance(v, (list, dict)) else v
+        for k, v in config.items()
+    }
@@ -1,3 +1,4 @@
+import hashlib
 import io
 import json
 import logging
@@ -13,6 +14,8 @@ from vdbbench import PROJECT_DIR
 
 logger = logging.getLogger(__name__)
 
+JOURNAL_DIR = "/tmp/vdbbench_journals"
+
 
 def package_vdbbench():
     """Creates a tarball of all Python files and the requirements-runner.txt file.
@@ -38,6 +41,9 @@ def retry_execute_runner(
     deploy_outputs: dict,
     timeout: int = 300,
     interval: int = 5,
+    samples_dir: Path | None = None,
+    journal_file: Path | None = None,
+    resume: bool = False,
 ) -> dict:
     """Retries the execution of the benchmark on the runner instance until it becomes available or the timeout is reached.
 
@@ -47,6 +53,9 @@ def retry_execute_runner(
         deploy_outputs: The output dictionary returned by the deploy method of the benchmark.
         timeout: The maximum time to wait for the runner to become available.
         interval: The time to wait between retries.
+        samples_dir: The local directory to copy any raw sample files written by the benchmark to.
+        journal_file: The local file to copy the benchmark's result journal to while it runs.
+        resume: Whether to resume from the journal left on the runner by an earlier run of the same configuration.
 
     Returns:
         The result of the benchmark execution.
@@ -54,19 +63,33 @@ def retry_execute_runner(
     start_time = time.monotonic()
     while time.monotonic() - start_time < timeout:
         try:
-            return execute_runner(name, config, deploy_outputs)
+            return execute_runner(
+                name, config, deploy_outputs, samples_dir, journal_file, resume
+            )
         except paramiko.ssh_exception.NoValidConnectionsError:
             time.sleep(interval)
     raise TimeoutError("Runner did not become available within the timeout.")
 
 
-def execute_runner(name: str, config: dict, deploy_outputs: dict) -> dict:
+def execute_runner(
+    name: str,
+    config: dict,
+    deploy_outputs: dict,
+    samples_dir: Path | None = None,
+    journal_file: Path | None = None,
+    resume: bool = False,
+    poll_interval: int = 30,
+) -> dict:
     """Executes the benchmark with the given name on the runner instance.
 
     Args:
         name: The name of the benchmark to run.
         config: The configuration for the benchmark.
         deploy_outputs: The output dictionary returned by the deploy method of the benchmark.
+        samples_dir: The local directory to copy any raw sample files written by the benchmark to.
+        journal_file: The local file to copy the benchmark's result journal to while it runs.
+        resume: Whether to resume from the journal left on the runner by an earlier run of the same configuration.
+        poll_interval: The time between copies of the journal.
 
     Returns:
         The result of the benchmark execution.
@@ -97,8 +120,18 @@ def execute_runner(name: str, config: dict, deploy_outputs: dict) -> dict:
               tar -xzf {remote_tar_path} -C /tmp/vdbbench",
         )
 
+        journal_path = get_journal_path(name, config)
+        samples_path = get_samples_path(journal_path)
+        if not resume:
+            conn.run(f"rm -rf {journal_path} {samples_path}")
+
         config_json = json.dumps(
-            {"deploy_outputs": deploy_outputs, "config": config["config"]}
+            {
+                "deploy_outputs": deploy_outputs,
+                "config": config["config"],
+                "journal_path": journal_path,
+                "samples_path": samples_path,
+            }
         )
         config_json_path = "/tmp/vdbbench/config.json"
         conn.put(io.BytesIO(config_json.encode()), config_json_path)
@@ -109,17 +142,102 @@ def execute_runner(name: str, config: dict, deploy_outputs: dict) -> dict:
             conn.run("touch /tmp/init_done")
 
         conn.run("python3 -m venv /tmp/vdbbench/venv")
-        conn.run(
+        promise = conn.run(
             f". /tmp/vdbbench/venv/bin/activate && \
             pip install -r /tmp/vdbbench/requirements-runner.txt && \
             cd /tmp/vdbbench && \
             python -m vdbbench run-bench {name} {config_json_path}",
+            asynchronous=True,
         )
+        journal_offset = 0
+        while not promise.runner.process_is_finished:
+            time.sleep(poll_interval)
+            if journal_file is not None:
+                journal_offset = pull_journal(
+                    conn, journal_path, journal_file, journal_offset
+                )
+        promise.join()
+        if journal_file is not None:
+            pull_journal(conn, journal_path, journal_file, journal_offset)
+
+        if (
+            samples_dir is not None
+            and conn.run(f"test -d {samples_path}", warn=True).ok
+        ):
+            fetch_samples(conn, samples_path, samples_dir)
 
         output_path = "/tmp/vdbbench/output.json"
         if conn.run(f"test -f {output_path}", warn=True).ok:
-            return json.loads(conn.run(f"cat {output_path}", hide=True).stdout)
+            buff = io.BytesIO()
+            conn.get(output_path, buff)
+            return json.loads(buff.getvalue())
         else:
             raise FileNotFoundError(
                 "Benchmark output (output.json) not found on the runner.",
             )
+
+
+def get_journal_path(name: str, config: dict) -> str:
+    """Gets the path of the result journal on the runner instance for a benchmark configuration.
+
+    The path outlives the benchmark's working directory and is the same for identical configurations,
+    so that a later run can resume from it.
+    """
+    digest = hashlib.sha256(
+        json.dumps({"name": name, "config": config["config"]}, sort_keys=True).encode()
+    ).hexdigest()
+    return f"{JOURNAL_DIR}/{name}_{digest[:16]}.jsonl"
+
+
+def get_samples_path(journal_path: str) -> str:
+    """Gets the directory of the raw sample files on the runner instance, beside the result journal.
+
+    Like the journal, it outlives the benchmark's working directory, so the samples of a resumed run's
+    completed configurations are still fetched.
+    """
+    return f"{journal_path.removesuffix('.jsonl')}_samples"
+
+
+def pull_journal(
+    conn: Connection, journal_path: str, journal_file: Path, offset: int
+) -> int:
+    """Appends the complete lines added to the result journal on the runner instance since offset to a local file.
+
+    Args:
+        conn: The connection to the runner instance.
+        journal_path: The path of the journal on the runner instance.
+        journal_file: The local file to append to.
+        offset: The number of bytes of the journal already copied.
+
+    Returns:
+        The new number of bytes of the journal copied.
+    """
+    new_content = conn.run(
+        f"tail -c +{offset + 1} {journal_path}", hide=True, warn=True
+    ).stdout.encode()
+    new_content = new_content[: new_content.rfind(b"\n") + 1]
+    if new_content:
+        with open(journal_file, "ab") as f:
+            f.write(new_content)
+        n_results = new_content.count(b"\n")
+        logger.info(f"Copied {n_results} new result(s) to {journal_file}")
+    return offset + len(new_content)
+
+
+def fetch_samples(conn: Connection, samples_path: str, samples_dir: Path):
+    """Copies the raw sample files written by a benchmark from the runner instance.
+
+    Args:
+        conn: The connection to the runner instance.
+        samples_path: The directory of the sample files on the runner instance.
+        samples_dir: The local directory to copy the sample files to.
+    """
+    remote_tar_path = "/tmp/vdbbench_samples.tar"
+    conn.run(f"tar -cf {remote_tar_path} -C {samples_path} .")
+    buff = io.BytesIO()
+    conn.get(remote_tar_path, buff)
+    buff.seek(0)
+    samples_dir.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(mode="r", fileobj=buff) as tar_file:
+        tar_file.extractall(samples_dir)
+    logger.info(f"Raw samples saved to {samples_dir}")
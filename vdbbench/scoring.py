@@ -0,0 +1,173 @@
+import numpy as np
+
+from vdbbench.datasets import Dataset
+
+EPSILON = 1e-3
+
+_process_dataset: Dataset | None = None
+
+
+def score_batch(
+    dataset: Dataset,
+    start: int,
+    neighbor_ids: np.ndarray,
+    k: int,
+    epsilon: float = EPSILON,
+    recall_at: list[int] | None = None,
+    ordered: bool = True,
+) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """Scores the neighbors returned for a batch of consecutive test queries.
+
+    Args:
+        dataset: The dataset that was queried.
+        start: The index of the first query of the batch in the test set.
+        neighbor_ids: The train indices of the returned neighbors, with shape (batch, k).
+        k: The number of nearest neighbors requested.
+        epsilon: The relative distance tolerance used by calc_recall and calc_relative_error.
+        recall_at: Cutoffs of at most k to also score the queries at, as if only that many neighbors were requested.
+        ordered: Whether the neighbors are returned in increasing order of distance, so that calc_mrr and
+            calc_ndcg can be calculated for them.
+
+    Returns:
+        The recall and relative error of each query, each with shape (batch,), and the metrics at each
+        cutoff of recall_at, keyed by names like "recall@10", "relative_error@10", "ndcg@10" and "mrr".
+    """
+    end = start + neighbor_ids.shape[0]
+    queries = dataset.test[start:end]
+    result_vectors = dataset.train[neighbor_ids]
+    result_dists = dataset.metric.batch(queries[:, np.newaxis, :], result_vectors)
+    true_dists = dataset.distances[start:end]
+    metrics = {}
+    if recall_at:
+        # The closest neighbors returned are the ones a query for fewer neighbors would keep
+        closest_dists = np.sort(result_dists, axis=-1)
+        for cutoff in recall_at:
+            metrics[f"recall@{cutoff}"] = calc_recall(
+                cutoff, true_dists, closest_dists[:, :cutoff], epsilon
+            )
+            metrics[f"relative_error@{cutoff}"] = calc_relative_error(
+                cutoff, true_dists, closest_dists[:, :cutoff], epsilon
+            )
+            if ordered:
+                metrics[f"ndcg@{cutoff}"] = calc_ndcg(
+                    cutoff, true_dists, result_dists[:, :cutoff], epsilon
+                )
+        if ordered:
+            metrics["mrr"] = calc_mrr(true_dists, result_dists, epsilon)
+    return (
+        calc_recall(k, true_dists, result_dists, epsilon),
+        calc_relative_error(k, true_dists, result_dists, epsilon),
+        metrics,
+    )
+
+
+def init_scoring_process(dataset: Dataset):
+    """Initializes a scoring process pool worker to score against the given dataset."""
+    global _process_dataset
+    _process_dataset = dataset
+
+
+def score_batch_in_process(
+    start: int,
+    neighbor_ids: np.ndarray,
+    k: int,
+    epsilon: float = EPSILON,
+    recall_at: list[int] | None = None,
+    ordered: bool = True,
+) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """Runs score_batch against the dataset given to init_scoring_process."""
+    return score_batch(
+        _process_dataset, start, neighbor_ids, k, epsilon, recall_at, ordered
+    )
+
+
+def calc_recall(
+    k: int, true_dists: np.ndarray, result_dists: np.ndarray, epsilon: float
+) -> np.ndarray:
+    """Calculates the recall of each query in a batch.
+
+    Args:
+        k: The number of nearest neighbors requested.
+        true_dists: The true nearest neighbor distances, with shape (batch, >= k).
+        result_dists: The distances of the returned neighbors, with shape (batch, k).
+        epsilon: The relative tolerance for a returned neighbor to count as a true neighbor.
+
+    Returns:
+        The recall of each query, with shape (batch,).
+    """
+    threshold_dist = _tolerance(true_dists[:, k - 1], epsilon)
+    return np.sum(result_dists <= threshold_dist[:, np.newaxis], axis=-1) / k
+
+
+def calc_relative_error(
+    k: int, true_dists: np.ndarray, result_dists: np.ndarray, epsilon: float
+) -> np.ndarray:
+    """Calculates the relative error of the total neighbor distance of each query in a batch.
+
+    The error is relative to the magnitude of the true total distance, so it stays non-negative for
+    metrics like InnerProduct whose distances can be negative.
+
+    Args:
+        k: The number of nearest neighbors requested.
+        true_dists: The true nearest neighbor distances, with shape (batch, >= k).
+        result_dists: The distances of the returned neighbors, with shape (batch, k).
+        epsilon: The relative tolerance below zero allowed before the error is considered invalid.
+
+    Returns:
+        The relative error of each query, with shape (batch,), clipped to be non-negative.
+    """
+    true_total_dist = np.sum(true_dists[:, :k], axis=-1)
+    result_total_dist = np.sum(result_dists, axis=-1)
+    relative_error = (result_total_dist - true_total_dist) / np.abs(true_total_dist)
+    assert np.all(
+        relative_error >= -epsilon
+    ), f"Relative error is negative: {relative_error.min()}"
+    return np.maximum(relative_error, 0)
+
+
+def calc_mrr(
+    true_dists: np.ndarray, result_dists: np.ndarray, epsilon: float
+) -> np.ndarray:
+    """Calculates the reciprocal rank of the true nearest neighbor of each query in a batch.
+
+    Args:
+        true_dists: The true nearest neighbor distances, with shape (batch, >= 1).
+        result_dists: The distances of the returned neighbors in the order returned, with shape (batch, k).
+        epsilon: The relative tolerance for a returned neighbor to count as the true nearest neighbor.
+
+    Returns:
+        The reciprocal of the 1-based rank of the first returned neighbor within the tolerance of the
+        nearest neighbor distance for each query, or 0 if there is none, with shape (batch,).
+    """
+    is_nearest = result_dists <= _tolerance(true_dists[:, 0], epsilon)[:, np.newaxis]
+    ranks = np.argmax(is_nearest, axis=-1) + 1
+    return np.where(np.any(is_nearest, axis=-1), 1 / ranks, 0.0)
+
+
+def calc_ndcg(
+    k: int, true_dists: np.ndarray, result_dists: np.ndarray, epsilon: float
+) -> np.ndarray:
+    """Calculates the normalized discounted cumulative gain of each query in a batch.
+
+    A returned neighbor is relevant if it counts as one of the k true nearest neighbors as in calc_recall,
+    and its gain is discounted by the log2 of its 1-based rank plus one, relative to the gain of returning
+    all k true nearest neighbors.
+
+    Args:
+        k: The number of nearest neighbors requested.
+        true_dists: The true nearest neighbor distances, with shape (batch, >= k).
+        result_dists: The distances of the returned neighbors in the order returned, with shape (batch, k).
+        epsilon: The relative tolerance for a returned neighbor to count as a true neighbor.
+
+    Returns:
+        The nDCG of each query, with shape (batch,).
+    """
+    threshold_dist = _tolerance(true_dists[:, k - 1], epsilon)
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    relevant = result_dists <= threshold_dist[:, np.newaxis]
+    return relevant @ discounts / np.sum(discounts)
+
+
+def _tolerance(dists: np.ndarray, epsilon: float) -> np.ndarray:
+    """Returns the largest distances within a relative tolerance of the given distances, which may be negative."""
+    return dists + epsilon * np.abs(dists)